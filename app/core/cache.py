@@ -0,0 +1,89 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ExtractionCache
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def prompt_version(prompt: str, model: str) -> str:
+    """Short fingerprint of the prompt/model pair; changing either invalidates the cache"""
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(pdf_sha256: str, version: str) -> str:
+    return hashlib.sha256(f"{pdf_sha256}:{version}".encode("utf-8")).hexdigest()
+
+
+def lookup(cache_key: str) -> Optional[dict]:
+    """Return the cached extraction for this key, or None on a miss/expired entry"""
+    db = SessionLocal()
+    try:
+        entry = db.get(ExtractionCache, cache_key)
+        if entry is None:
+            return None
+        now = datetime.utcnow()
+        if entry.created_at and entry.created_at < now - timedelta(days=settings.EXTRACTION_CACHE_TTL_DAYS):
+            db.delete(entry)
+            db.commit()
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = now
+        db.commit()
+        return json.loads(entry.data)
+    finally:
+        db.close()
+
+
+def store(cache_key: str, pdf_sha256: str, version: str, data: dict):
+    db = SessionLocal()
+    try:
+        entry = db.get(ExtractionCache, cache_key)
+        if entry is None:
+            entry = ExtractionCache(cache_key=cache_key, pdf_sha256=pdf_sha256, prompt_version=version)
+            db.add(entry)
+        entry.data = json.dumps(data)
+        entry.created_at = datetime.utcnow()
+        entry.last_used_at = entry.created_at
+        db.commit()
+    except Exception:
+        # A concurrent job may have stored the same document first
+        db.rollback()
+    finally:
+        db.close()
+
+
+def evict() -> int:
+    """
+    Drop entries older than EXTRACTION_CACHE_TTL_DAYS, then trim the least
+    recently used entries beyond EXTRACTION_CACHE_MAX_ENTRIES.
+
+    Returns the number of entries removed.
+    """
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=settings.EXTRACTION_CACHE_TTL_DAYS)
+        removed = db.query(ExtractionCache).filter(ExtractionCache.created_at < cutoff).delete(
+            synchronize_session=False
+        )
+
+        overflow = db.query(ExtractionCache).count() - settings.EXTRACTION_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale_keys = [
+                key for (key,) in db.query(ExtractionCache.cache_key)
+                .order_by(ExtractionCache.last_used_at.asc())
+                .limit(overflow)
+            ]
+            removed += db.query(ExtractionCache).filter(ExtractionCache.cache_key.in_(stale_keys)).delete(
+                synchronize_session=False
+            )
+        db.commit()
+        return removed
+    finally:
+        db.close()
@@ -10,6 +10,51 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     EXTRACT_DIR: str = "extracted"
     OUTPUT_XLSX: str = "output/output.xlsx"
+    EXPORT_CACHE_DIR: str = "output/export_cache"
+    EXPORT_CACHE_MAX_FILES: int = 200
+    EXPORT_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    MAX_UPLOAD_BYTES: int = 2 * 1024 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 8 * 1024 * 1024
+    PDF_WORKERS: int = 2
+    LLM_CONCURRENCY: int = 4  # starting number of LLM requests in flight; adapts up to LLM_MAX_CONCURRENCY
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_RPM_LIMIT: int = 500  # per worker process; 0 disables the budget
+    LLM_TPM_LIMIT: int = 200000  # per worker process; 0 disables the budget
+    LLM_MAX_RETRIES: int = 6
+    LLM_TIMEOUT_SECONDS: float = 120.0
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 60.0
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = 600  # answer tokens counted against LLM_TPM_LIMIT up front
+    LLM_STRUCTURED_OUTPUT: bool = True  # JSON-schema response_format; turn off for servers without it
+    LLM_FIELD_RETRIES: int = 2  # re-asks for fields missing/invalid after local JSON repair
+    LLM_STATS_INTERVAL_SECONDS: float = 2.0  # how often LLM throughput/queue depth is pushed to /progress
+    WRITE_QUEUE_SIZE: int = 16
+    WRITE_BATCH_SIZE: int = 50
+    OPENAI_MODEL: str = "gpt-4o"
+    LLM_PROVIDER: str = "openai"  # "openai" (also any OpenAI-compatible server, e.g. the local stub)
+    LLM_BASE_URL: str = ""  # e.g. http://127.0.0.1:8900/v1 for app.scripts.llm_stub_server
+    LLM_BATCH_DOCS: int = 1  # documents packed into one chat completion; 1 disables batching
+    LLM_BATCH_MAX_DOC_TOKENS: int = 1500  # only documents this short are packed together
+    LLM_BATCH_WAIT_SECONDS: float = 0.5  # how long a partial batch waits for more documents
+    LLM_BATCH_DIR: str = "output/llm_batches"  # manifests of offline batch jobs
+    PROMPT_TOKEN_BUDGET: int = 3000  # document tokens sent per extraction
+    EXTRACTION_CACHE_TTL_DAYS: int = 365
+    EXTRACTION_CACHE_MAX_ENTRIES: int = 50000
+    PROGRESS_BACKEND: str = "db"  # "db", "redis" or "memory" (single worker only)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    PROGRESS_TTL_SECONDS: int = 300  # how long finished jobs stay visible
+    PROGRESS_ACTIVE_TTL_SECONDS: int = 86400  # upper bound for jobs whose worker died
+    SSE_HEARTBEAT_SECONDS: int = 15
+    PROGRESS_POLL_SECONDS: float = 2.0  # db backend without PostgreSQL LISTEN/NOTIFY: how often other workers' jobs are re-read
+    JOB_HEARTBEAT_SECONDS: float = 15.0  # running ingest jobs touch heartbeat_at this often
+    JOB_STALE_SECONDS: float = 90.0  # a running job without a heartbeat this long is resumed elsewhere
+    INGEST_IN_WEB: bool = True  # False: /upload only enqueues; run `python -m app.ingest worker` (shared UPLOAD_DIR)
+    RESOLVE_CARD_IDS: bool = True  # match issuer_id/card_id from the issuers/cards tables when writing cards
+    NAME_MATCH_MIN_SCORE: float = 0.6  # 0..1 similarity below which a name is left unresolved
+    NAME_INDEX_REFRESH_SECONDS: float = 300.0  # how often new issuers/cards rows are picked up
+    NAME_INDEX_RELOAD_SECONDS: float = 3600.0  # full reload, for renamed or deleted rows
     YEAR_DEFAULT: int = int(os.getenv("DEFAULT_YEAR", __import__("datetime").datetime.now().year))
 
     class Config:
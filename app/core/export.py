@@ -0,0 +1,144 @@
+import csv
+import glob
+import io
+import os
+import re
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import xlsxwriter
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.crud import CARD_API_FIELDS, data_version, iter_filtered_rows
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+SHEET_NAME = "Credit Card Data"
+EXPORT_BATCH_SIZE = 2000
+
+
+def export_filename(quarter: str = "", year: int = 0, extension: str = "xlsx") -> str:
+    return f"extracted_data_{f'Q{quarter}_' if quarter else ''}{year if year else 'all'}.{extension}"
+
+
+def write_cards_xlsx(db: Session, path: str, quarter: str = "", year: int = 0) -> int:
+    """
+    Write the filtered cards to an .xlsx file with constant memory use.
+
+    Rows are read EXPORT_BATCH_SIZE at a time and flushed to disk one by one
+    (xlsxwriter constant_memory mode), so no DataFrame or full result list is built.
+    Returns the number of data rows written.
+    """
+    fields = list(CARD_API_FIELDS)
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": os.path.dirname(path) or None})
+    try:
+        worksheet = workbook.add_worksheet(SHEET_NAME)
+        worksheet.write_row(0, 0, fields)
+        count = 0
+        for count, row in enumerate(iter_filtered_rows(db, quarter, year, batch_size=EXPORT_BATCH_SIZE), 1):
+            worksheet.write_row(count, 0, [row[f] for f in fields])
+        return count
+    finally:
+        workbook.close()
+
+
+def new_export_path(directory: Optional[str] = None, suffix: str = ".xlsx") -> str:
+    """Unique file for one export so concurrent requests never share an output path"""
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
+
+
+def iter_cards_csv(db: Session, quarter: str = "", year: int = 0) -> Iterator[str]:
+    """Yield the filtered cards as CSV text, a batch of rows per chunk"""
+    fields = list(CARD_API_FIELDS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for i, row in enumerate(iter_filtered_rows(db, quarter, year, batch_size=EXPORT_BATCH_SIZE), 1):
+        writer.writerow([row[f] for f in fields])
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _slice_key(quarter: str = "", year: int = 0) -> str:
+    quarter = re.sub(r"[^A-Za-z0-9]", "", quarter or "") or "all"
+    return f"{quarter}_{year or 'all'}"
+
+
+def xlsx_export_etag(version: str) -> str:
+    """ETag of the workbook built for a slice at this data_version()"""
+    return f'"{version}"'
+
+
+def cached_xlsx_export(db: Session, quarter: str = "", year: int = 0, version: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Return (path, etag) of the workbook for this slice, building it only if needed.
+
+    Files live in EXPORT_CACHE_DIR named by slice and data_version(), so a
+    closed quarter is generated once and served from disk until its rows change.
+    Pass version when the caller already has the slice's data_version().
+    """
+    if version is None:
+        version = data_version(db, quarter, year)
+    os.makedirs(settings.EXPORT_CACHE_DIR, exist_ok=True)
+    path = os.path.join(settings.EXPORT_CACHE_DIR, f"{_slice_key(quarter, year)}_{version}.xlsx")
+    etag = xlsx_export_etag(version)
+
+    if os.path.exists(path):
+        os.utime(path)  # mtime doubles as the LRU timestamp
+        return path, etag
+
+    # Build under a temp name so concurrent requests/workers never see a partial file
+    tmp_path = new_export_path(settings.EXPORT_CACHE_DIR, suffix=".partial")
+    try:
+        write_cards_xlsx(db, tmp_path, quarter, year)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict_export_cache()
+    return path, etag
+
+
+def evict_export_cache() -> int:
+    """Drop least recently used workbooks beyond EXPORT_CACHE_MAX_FILES / EXPORT_CACHE_MAX_BYTES"""
+    entries = []
+    for path in glob.glob(os.path.join(settings.EXPORT_CACHE_DIR, "*.xlsx")):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)
+
+    removed = 0
+    total_bytes = 0
+    for i, (_, size, path) in enumerate(entries):
+        total_bytes += size
+        if i >= settings.EXPORT_CACHE_MAX_FILES or total_bytes > settings.EXPORT_CACHE_MAX_BYTES:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def invalidate_export_cache(quarter: str = "", year: int = 0) -> int:
+    """Remove cached workbooks for every slice that contains (quarter, year)"""
+    removed = 0
+    for key in {_slice_key(quarter, year), _slice_key("", year), _slice_key(quarter, 0), _slice_key("", 0)}:
+        for path in glob.glob(os.path.join(settings.EXPORT_CACHE_DIR, f"{key}_*.xlsx")):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
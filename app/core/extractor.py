@@ -1,106 +1,390 @@
 import os
 import zipfile
 import shutil
-import fitz  # PyMuPDF
 import json
 import time
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Dict, Any, List, Optional
-from openai import OpenAI
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
 from app.core.config import settings
+from app.core import cache as extraction_cache
+from app.core.progress import ProgressStore
+from app.core import jobs
+from app.core import metrics
+from app.core import structured
+from app.core.llm import get_llm_provider
+from app.core.pdf_text import count_tokens, extract_pages, prepare_document
+from app.core.schumer import PARSER_VERSION as SCHUMER_PARSER_VERSION
+from app.core.scoring import rescore_written
+from app.core.export import invalidate_export_cache
+from app.core.response_cache import data_cache
 from app.db.database import SessionLocal
 from sqlalchemy.orm import Session
 from app.db.models import ExtractedCard
-from app.core.utils import get_card_and_issuer_ids
+from app.db.crud import upsert_cards
 
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+llm_provider = get_llm_provider()
+_pdf_pool: Optional[ProcessPoolExecutor] = None
 
 class ProcessingStats:
     def __init__(self, total_files: int):
         self.total_files = total_files
         self.processed_files = 0
+        self.succeeded_files = 0
+        self.failed_files = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.resumed_files = 0
         self.start_time = time.time()
         self.last_update = self.start_time
+
+    def resume_from(self, written: int, failed: int):
+        """Count files finished by an earlier run of the same job"""
+        self.processed_files = self.resumed_files = written + failed
+        self.succeeded_files = written
+        self.failed_files = failed
     
-    def update_progress(self, current_file: str = "") -> Dict[str, Any]:
-        """Update progress and return current stats"""
+    def update_progress(self, current_file: str = "", failed: bool = False) -> Dict[str, Any]:
+        """Record one finished file (written or failed) and return current stats"""
         self.processed_files += 1
+        if failed:
+            self.failed_files += 1
+        else:
+            self.succeeded_files += 1
         progress = min(100, int((self.processed_files / self.total_files) * 100))
         
-        # Calculate ETA
+        # Calculate ETA from the observed completion rate of the pipeline
         current_time = time.time()
         time_elapsed = current_time - self.start_time
-        time_per_file = time_elapsed / self.processed_files if self.processed_files > 0 else 0
+        processed_now = self.processed_files - self.resumed_files
+        time_per_file = time_elapsed / processed_now if processed_now > 0 else 0
         files_remaining = self.total_files - self.processed_files
         eta_seconds = int(files_remaining * time_per_file)
+        self.last_update = current_time
         
-        # Only update if significant time has passed or it's the last file
-        if current_time - self.last_update > 1 or self.processed_files == self.total_files:
-            self.last_update = current_time
-            
-            return {
-                "status": "processing" if self.processed_files < self.total_files else "completed",
-                "progress": progress,
-                "total_files": self.total_files,
-                "processed_files": self.processed_files,
-                "current_file": current_file,
-                "eta_seconds": eta_seconds,
-                "message": f"Processing {self.processed_files} of {self.total_files} files" + 
-                          (f" - {current_file}" if current_file else "")
-            }
+        return {
+            "status": "processing",
+            "progress": progress,
+            "total_files": self.total_files,
+            "processed_files": self.processed_files,
+            "failed_files": self.failed_files,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "current_file": current_file,
+            "eta_seconds": eta_seconds,
+            "message": f"Processed {self.processed_files} of {self.total_files} files" + 
+                      (f" - {current_file}" if current_file else "")
+        }
+
+def extract_text_from_pdf(source: Union[str, bytes]) -> str:
+    """Extract the full text of a PDF given its path or its raw bytes"""
+    return "".join(extract_pages(source))
+
+# Extracted field -> extracted_cards column. Drives the prompt, the structured
+# output schema and build_card_record.
+FIELD_COLUMNS = {
+    "Issuer": "issuer",
+    "Card Name": "card_name",
+    "Min APR (%)": "min_apr",
+    "Max APR (%)": "max_apr",
+    "Penalty APR (%)": "penalty_apr",
+    "Cash Advance APR (%)": "cash_advance_apr",
+    "Annual Fee ($)": "annual_fee",
+    "Late Fee ($)": "late_fee",
+    "Foreign Transaction Fee (%)": "foreign_txn_fee",
+    "Cash Advance Fee (%)": "cash_advance_fee",
+    "Balance Transfer Fee (%)": "balance_transfer_fee",
+    "Minimum Interest Charge ($)": "min_interest_charge",
+    "Rewards Structure": "rewards",
+    "Notable Exclusions": "exclusions",
+    "Card type": "card_type",
+    "Institution type": "institution_type",
+    "Change Description": "change_description",
+    "Change type": "change_type",
+    "Fee structure": "fee_structure",
+    "Rewards structure": "rewards_structure",
+}
+EXTRACTION_FIELDS = list(FIELD_COLUMNS)
+
+def build_extraction_prompt(fields: List[str]) -> str:
+    return (
+        "Extract the following fields from this credit card agreement:\n"
+        + "\n".join(f"- {field}" for field in fields)
+        + '\n\nReturn only a JSON object. Use "Not disclosed" for missing fields.'
+    )
+
+EXTRACTION_PROMPT = build_extraction_prompt(EXTRACTION_FIELDS)
+
+# Which path produced a record's fields; stored in the cached data and on extracted_cards
+EXTRACTION_METHOD_KEY = "_extraction_method"
+# The Schumer box parser never reads the issuer or card name, so the LLM is always asked
+METHOD_RULES_LLM = "rules+llm"  # parser fields, LLM for the rest
+METHOD_LLM = "llm"              # parser found nothing
+
+# Part of every extraction cache key: editing the prompt, model, page budget or
+# Schumer box rules invalidates old entries
+PROMPT_VERSION = extraction_cache.prompt_version(
+    f"{EXTRACTION_PROMPT}\ntoken_budget={settings.PROMPT_TOKEN_BUDGET}\nschumer_parser={SCHUMER_PARSER_VERSION}"
+    f"\nstructured_output={settings.LLM_STRUCTURED_OUTPUT}",
+    settings.OPENAI_MODEL,
+)
+
+# Answers that needed a JSON repair, and fields that had to be asked for again
+parse_stats = {"repaired": 0, "reasked_fields": 0}
+
+def llm_progress() -> Dict[str, Any]:
+    """Scheduler figures plus answer repairs, for the progress stream"""
+    return {**llm_provider.snapshot(), **parse_stats}
+
+def _column_descriptions() -> Dict[str, str]:
+    columns = ExtractedCard.__table__.columns
+    return {field: f"extracted_cards.{column} ({columns[column].type})" for field, column in FIELD_COLUMNS.items()}
+
+def extraction_response_format(fields: List[str]) -> Optional[Dict[str, Any]]:
+    """Structured-output schema for one document's answer (None when LLM_STRUCTURED_OUTPUT is off)"""
+    if not settings.LLM_STRUCTURED_OUTPUT:
+        return None
+    return structured.response_format("card_extraction", structured.field_schema(fields, _column_descriptions()))
+
+def batch_response_format(fields: List[str], count: int) -> Optional[Dict[str, Any]]:
+    if not settings.LLM_STRUCTURED_OUTPUT:
         return None
+    document = structured.field_schema(fields, _column_descriptions())
+    keys = [str(i) for i in range(1, count + 1)]
+    schema = {
+        "type": "object",
+        "properties": {key: document for key in keys},
+        "required": keys,
+        "additionalProperties": False,
+    }
+    return structured.response_format("card_extraction_batch", schema)
+
+def extraction_messages(text: str, fields: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    prompt = EXTRACTION_PROMPT if fields is None else build_extraction_prompt(fields)
+    return [
+        {"role": "system", "content": "You are a document parser."},
+        {"role": "user", "content": prompt + "\n\n" + text}
+    ]
+
+async def ask_openai(text: str, fields: Optional[List[str]] = None) -> dict:
+    """
+    text is expected to be budgeted already (see pdf_text.prepare_document).
+    fields narrows the request to a subset of EXTRACTION_FIELDS.
 
-def extract_text_from_pdf(path: str) -> str:
-    text = ""
-    doc = fitz.open(path)
-    for page in doc:
-        text += page.get_text()
-    doc.close()
-    return text
-
-def ask_openai(text: str) -> dict:
-    prompt = """Extract the following fields from this credit card agreement:
-- Issuer
-- Card Name
-- Min APR (%)
-- Max APR (%)
-- Penalty APR (%)
-- Cash Advance APR (%)
-- Annual Fee ($)
-- Late Fee ($)
-- Foreign Transaction Fee (%)
-- Cash Advance Fee (%)
-- Balance Transfer Fee (%)
-- Minimum Interest Charge ($)
-- Rewards Structure
-- Notable Exclusions
-- Card type
-- Institution type
-- Change Description
-- Change type
-- Fee structure
-- Rewards structure
-
-Return only a JSON object. Use "Not disclosed" for missing fields."""
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are a document parser."},
-            {"role": "user", "content": prompt + "\n\n" + text[:12000]}
-        ],
-        temperature=0
+    The answer is requested as structured output and validated per field.
+    Malformed JSON is repaired locally first; only fields still missing or
+    invalid are asked for again (see reask_failed_fields).
+    """
+    fields = fields or EXTRACTION_FIELDS
+    content = await llm_provider.complete(
+        extraction_messages(text, fields), response_format=extraction_response_format(fields)
     )
-    content = response.choices[0].message.content.strip()
-    # strip markdown fences
-    if content.startswith("```"):
-        content = content.split("```")[1].strip()
-    # strip leading "json"
-    if content.lower().startswith("json"):
-        content = content[4:].strip()
-    return json.loads(content)
+    data, failed, repairs = structured.parse_fields(content, fields)
+    if repairs:
+        parse_stats["repaired"] += 1
+    return await reask_failed_fields(text, data, failed)
+
+async def reask_failed_fields(text: str, data: Dict[str, Any], failed: List[str]) -> dict:
+    """
+    Re-request just the failed fields, up to LLM_FIELD_RETRIES times.
+
+    Fields that never come back valid are recorded as "Not disclosed"; if not a
+    single field is valid the document fails instead of writing an empty row.
+    """
+    for _ in range(settings.LLM_FIELD_RETRIES):
+        if not failed:
+            break
+        parse_stats["reasked_fields"] += len(failed)
+        content = await llm_provider.complete(
+            extraction_messages(text, failed), response_format=extraction_response_format(failed)
+        )
+        more, failed, repairs = structured.parse_fields(content, failed)
+        if repairs:
+            parse_stats["repaired"] += 1
+        data.update(more)
+    if not data:
+        raise ValueError("LLM answer had no valid fields")
+    if failed:
+        print(f"No valid answer for {', '.join(failed)}; recording as not disclosed")
+        data.update({field: "Not disclosed" for field in failed})
+    return data
+
+def build_batch_prompt(fields: List[str], count: int) -> str:
+    return (
+        f"Extract the following fields from each of the {count} credit card agreements below:\n"
+        + "\n".join(f"- {field}" for field in fields)
+        + f'\n\nReturn only a JSON object with one key per document number ("1" to "{count}"), '
+        'each holding that document\'s fields as a JSON object. Use "Not disclosed" for missing fields.'
+    )
+
+async def ask_openai_batch(documents: List[Tuple[str, Optional[List[str]]]]) -> List[Optional[dict]]:
+    """
+    Extract several short documents with one chat completion.
+
+    documents are (text, fields) pairs as for ask_openai; the request asks for
+    the union of their fields. Returns one dict per document, or None where the
+    answer has no usable entry for it. A document whose entry is only partly
+    valid gets its failed fields re-requested on their own.
+    """
+    if any(fields is None for _, fields in documents):
+        fields = EXTRACTION_FIELDS
+    else:
+        wanted = {field for _, doc_fields in documents for field in doc_fields}
+        fields = [field for field in EXTRACTION_FIELDS if field in wanted]
+    body = "\n\n".join(f"=== Document {i} ===\n{text}" for i, (text, _) in enumerate(documents, 1))
+    content = await llm_provider.complete([
+        {"role": "system", "content": "You are a document parser."},
+        {"role": "user", "content": build_batch_prompt(fields, len(documents)) + "\n\n" + body},
+    ], response_format=batch_response_format(fields, len(documents)))
+    answer, repairs = structured.load_json(content)
+    if repairs:
+        parse_stats["repaired"] += 1
+    if not isinstance(answer, dict):
+        return [None] * len(documents)
+    results: List[Optional[dict]] = []
+    for i, (text, doc_fields) in enumerate(documents, 1):
+        entry = answer.get(str(i))
+        if not isinstance(entry, dict):
+            results.append(None)
+            continue
+        data, failed = structured.validate_fields(entry, doc_fields or EXTRACTION_FIELDS)
+        results.append(await reask_failed_fields(text, data, failed) if data else None)
+    return results
+
+class LLMBatcher:
+    """
+    Coalesce short documents from concurrent pipeline workers into packed requests.
+
+    ask() has the signature of ask_openai. Documents longer than max_doc_tokens
+    (or every document when max_docs <= 1) are sent on their own. Short ones wait
+    up to wait_seconds for a batch of max_docs to fill. A document missing from a
+    batched answer, or a failed batch, falls back to its own request, so batching
+    never costs a file. Concurrency and rate limits are left to the provider's
+    LLMScheduler.
+    """
+
+    def __init__(self, max_docs: int, max_doc_tokens: int, wait_seconds: float):
+        self.max_docs = max_docs
+        self.max_doc_tokens = max_doc_tokens
+        self.wait_seconds = wait_seconds
+        self._pending: List[Tuple[str, Optional[List[str]], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.requests = 0
+
+    async def ask(self, text: str, fields: Optional[List[str]] = None) -> dict:
+        if self.max_docs <= 1 or count_tokens(text) > self.max_doc_tokens:
+            return await self._single(text, fields)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, fields, future))
+        if len(self._pending) >= self.max_docs:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.wait_seconds, self._flush)
+        return await future
+
+    async def _single(self, text: str, fields: Optional[List[str]]) -> dict:
+        self.requests += 1
+        return await ask_openai(text, fields)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, Optional[List[str]], asyncio.Future]]):
+        results: List[Optional[dict]] = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                self.requests += 1
+                results = await ask_openai_batch([(text, fields) for text, fields, _ in batch])
+            except Exception as e:
+                print(f"Batched LLM request for {len(batch)} documents failed, retrying one by one: {str(e)}")
+
+        async def settle(text, fields, future, result):
+            try:
+                if result is None:
+                    result = await self._single(text, fields)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+        await asyncio.gather(*(
+            settle(text, fields, future, result) for (text, fields, future), result in zip(batch, results)
+        ))
+
+async def complete_extraction(text: str, parsed_fields: Dict[str, str], ask=None) -> dict:
+    """
+    Merge the Schumer box fields with an LLM answer for the fields still missing.
+
+    The LLM is only asked for what the parser left unresolved. Parsed values
+    win over the LLM's. ask is ask_openai (the default) or LLMBatcher.ask.
+    """
+    ask = ask or ask_openai
+    with metrics.INGEST_STAGE_SECONDS.labels("llm").time():
+        if parsed_fields:
+            data, method = await ask(text, missing_fields(parsed_fields)), METHOD_RULES_LLM
+        else:
+            data, method = await ask(text), METHOD_LLM
+    return merge_extraction(data, parsed_fields, method)
+
+def missing_fields(parsed_fields: Dict[str, str]) -> List[str]:
+    return [field for field in EXTRACTION_FIELDS if field not in parsed_fields]
+
+def merge_extraction(data: dict, parsed_fields: Dict[str, str], method: str) -> dict:
+    data = dict(data)
+    data.update(parsed_fields)
+    data[EXTRACTION_METHOD_KEY] = method
+    return data
+
+def list_pdf_members(zip_path: str) -> List[str]:
+    """Names of the PDF members in the archive (read from the central directory only)"""
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        return [
+            info.filename for info in z.infolist()
+            if not info.is_dir()
+            and info.filename.endswith(".pdf")
+            and not os.path.basename(info.filename).startswith("._")
+        ]
+
+# A member that cannot be read yields its error in place of the bytes, so one
+# corrupt entry fails only its own file and the rest of the archive is still read
+PdfSource = Tuple[str, Union[bytes, Exception]]
+
+def iter_zip_pdfs(zip_path: str, members: List[str]) -> Iterator[PdfSource]:
+    """Yield (filename, pdf bytes or read error) one member at a time without extracting to disk"""
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        for name in members:
+            try:
+                pdf_bytes = z.read(name)
+            except Exception as e:  # bad CRC, truncated or unsupported entry
+                yield os.path.basename(name), e
+                continue
+            yield os.path.basename(name), pdf_bytes
+
+def iter_dir_pdfs(directory: str) -> Iterator[PdfSource]:
+    """Yield (filename, pdf bytes or read error) for the PDFs under a directory, like iter_zip_pdfs"""
+    for root, _, names in sorted(os.walk(directory)):
+        for name in sorted(names):
+            if name.endswith(".pdf") and not name.startswith("._"):
+                try:
+                    with open(os.path.join(root, name), "rb") as f:
+                        pdf_bytes = f.read()
+                except OSError as e:
+                    yield name, e
+                    continue
+                yield name, pdf_bytes
 
 def clean_field(val):
     if isinstance(val, list):
@@ -109,15 +393,253 @@ def clean_field(val):
         return json.dumps(val)
     return val or "Not disclosed"
 
-async def process_zip_with_progress(zip_path: str, quarter: str, year: int, upload_id: str, progress_store: Dict[str, Any]):
-    """Process zip file with progress tracking"""
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Lazily create the process pool used for PyMuPDF text extraction"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        # spawn rather than fork: the parent is a threaded uvicorn worker
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pdf_pool
+
+def reset_pdf_pool(broken: ProcessPoolExecutor):
+    """Drop a pool whose worker died, so the next get_pdf_pool() starts a fresh one"""
+    global _pdf_pool
+    # Every file in flight sees the same broken pool; only the first one replaces it
+    if _pdf_pool is broken:
+        _pdf_pool = None
+    broken.shutdown(wait=False)
+
+async def extract_pdf_text(pdf_bytes: bytes) -> Tuple[str, Dict[str, Any]]:
+    """
+    prepare_document in the PDF pool.
+
+    A worker process that dies (out of memory, a crash inside MuPDF) breaks
+    the whole pool, so the pool is rebuilt and the file tried once more. If
+    that fails too the pool is rebuilt again for the next files and the
+    error is raised for this one.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_pdf_pool()
+        try:
+            return await loop.run_in_executor(pool, prepare_document, pdf_bytes)
+        except BrokenProcessPool:
+            reset_pdf_pool(pool)
+            if attempt:
+                raise
+            print("PDF worker process died; restarting the pool and retrying")
+
+async def run_extraction_pipeline(
+    pdf_sources: Iterable[PdfSource],
+    total_files: int,
+    quarter: str,
+    year: int,
+    db: Session,
+    upload_id: str,
+    progress_store: ProgressStore,
+    job_files: Optional[jobs.JobFiles] = None,
+    stats: Optional[ProcessingStats] = None,
+) -> ProcessingStats:
+    """
+    Process PDFs through three stages:
+
+    0. a producer reads (filename, bytes) pairs from ``pdf_sources`` into a
+       bounded queue, so work starts with the first member; a pair carrying
+       a read error instead of bytes fails that file only,
+    1. text extraction, page selection and the Schumer box parser in a process pool,
+    2. LLM calls, for the fields the parser left unresolved, paced by the
+       provider's LLMScheduler (rate budgets, adaptive concurrency, retries);
+       with LLM_BATCH_DOCS > 1 short documents are packed several to a
+       request (see LLMBatcher),
+    3. batched DB upserts from a single writer task (the session is not shared).
+
+    Files whose bytes were already extracted with the current prompt/model are
+    served from the extraction cache and skip stages 1 and 2. Blocking work
+    (PyMuPDF, SQLAlchemy) never runs on the event loop.
+
+    A failure in any stage only affects its own file. Should a stage itself
+    die (the archive becomes unreadable, the job store is unreachable), the
+    other stages are cancelled and the error is raised. With ``job_files`` each
+    file's state is checkpointed (extracting, llm, written, failed) so an
+    interrupted job can resume; ``stats`` carries over counts from earlier runs.
+    """
+    stats = stats or ProcessingStats(total_files)
+    batcher = LLMBatcher(settings.LLM_BATCH_DOCS, settings.LLM_BATCH_MAX_DOC_TOKENS, settings.LLM_BATCH_WAIT_SECONDS)
+    # Enough workers to fill the scheduler's largest window with LLM_BATCH_DOCS documents per request
+    workers = max(1, min(settings.LLM_MAX_CONCURRENCY * max(1, settings.LLM_BATCH_DOCS), total_files))
+    pending: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WRITE_QUEUE_SIZE)
+
+    async def mark(filenames: List[str], state: str, error: Optional[str] = None):
+        if job_files is not None:
+            await job_files.mark(filenames, state, error)
+
+    async def report(filename: str, failed: bool = False):
+        fields = stats.update_progress(filename, failed=failed)
+        fields["llm"] = llm_progress()
+        await set_progress(progress_store, upload_id, fields)
+
+    async def monitor():
+        # Throughput and queue depth change while files wait on rate limits or
+        # backoff, between file completions; publish them when they move
+        last = None
+        while True:
+            await asyncio.sleep(settings.LLM_STATS_INTERVAL_SECONDS)
+            snapshot = llm_progress()
+            if snapshot != last:
+                await set_progress(progress_store, upload_id, {"llm": snapshot})
+                last = snapshot
+
+    async def fail(filename: str, error: Exception):
+        metrics.INGEST_FILES.labels("failed").inc()
+        print(f"Error processing {filename}: {str(error)}")
+        await mark([filename], jobs.FILE_FAILED, str(error))
+        await report(filename, failed=True)
+
+    async def producer():
+        iterator = iter(pdf_sources)
+        while True:
+            with metrics.INGEST_STAGE_SECONDS.labels("read").time():
+                item = await asyncio.to_thread(next, iterator, None)
+            if item is None:
+                break
+            filename, pdf_bytes = item
+            if isinstance(pdf_bytes, Exception):
+                await fail(filename, pdf_bytes)
+                continue
+            await pending.put(item)
+        for _ in range(workers):
+            await pending.put(None)
+
+    async def extract_worker():
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            filename, pdf_bytes = item
+            await mark([filename], jobs.FILE_EXTRACTING)
+            try:
+                pdf_sha256 = await asyncio.to_thread(extraction_cache.hash_bytes, pdf_bytes)
+                cache_key = extraction_cache.make_cache_key(pdf_sha256, PROMPT_VERSION)
+                data = await asyncio.to_thread(extraction_cache.lookup, cache_key)
+                if data is not None:
+                    stats.cache_hits += 1
+                    metrics.EXTRACTION_CACHE_LOOKUPS.labels("hit").inc()
+                    await write_queue.put((filename, data, None))
+                    continue
+                stats.cache_misses += 1
+                metrics.EXTRACTION_CACHE_LOOKUPS.labels("miss").inc()
+                with metrics.INGEST_STAGE_SECONDS.labels("pdf_text").time():
+                    text, parsed_fields = await extract_pdf_text(pdf_bytes)
+                await mark([filename], jobs.FILE_LLM)
+                data = await complete_extraction(text, parsed_fields, batcher.ask)
+            except Exception as e:
+                await fail(filename, e)
+                continue
+            await write_queue.put((filename, data, (cache_key, pdf_sha256)))
+
+    async def flush(batch: List[Tuple[str, dict, Optional[Tuple[str, str]]]]):
+        records = [build_card_record(data, quarter, year, filename) for filename, data, _ in batch]
+        with metrics.INGEST_STAGE_SECONDS.labels("db_write").time():
+            failures = dict(await asyncio.to_thread(upsert_cards, db, records))
+        metrics.INGEST_FILES.labels("written").inc(len(batch) - len(failures))
+        metrics.INGEST_FILES.labels("failed").inc(len(failures))
+        written.extend(r for i, r in enumerate(records) if i not in failures)
+        await mark([filename for i, (filename, _, _) in enumerate(batch) if i not in failures], jobs.FILE_WRITTEN)
+        if len(failures) < len(batch):
+            await asyncio.to_thread(invalidate_export_cache, quarter, year)
+            data_cache.invalidate(quarter, year)
+        for index, (filename, data, cache_entry) in enumerate(batch):
+            if index in failures:
+                print(f"Error saving {filename}: {str(failures[index])}")
+                await mark([filename], jobs.FILE_FAILED, str(failures[index]))
+                await report(filename, failed=True)
+                continue
+            if cache_entry is not None:
+                cache_key, pdf_sha256 = cache_entry
+                await asyncio.to_thread(extraction_cache.store, cache_key, pdf_sha256, PROMPT_VERSION, data)
+            await report(filename)
+
+    async def writer():
+        # Accumulate up to WRITE_BATCH_SIZE records, flushing early whenever the
+        # queue runs dry so progress keeps moving while the LLM stage is slow
+        batch = []
+        while True:
+            item = await write_queue.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= settings.WRITE_BATCH_SIZE or write_queue.empty()):
+                await flush(batch)
+                batch = []
+            if item is None:
+                return
+
+    async def until_done_or_writer_died(awaitable):
+        # A dead writer never drains write_queue: waiting on a put to it could block forever
+        task = asyncio.ensure_future(awaitable)
+        await asyncio.wait([task, writer_task], return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            writer_task.result()  # the writer only returns after the final None, so it raised
+        return task.result()
+
+    written: List[Dict[str, Any]] = []
+    writer_task = asyncio.create_task(writer())
+    monitor_task = asyncio.create_task(monitor())
+    stage_tasks = [asyncio.create_task(producer())] + [asyncio.create_task(extract_worker()) for _ in range(workers)]
+    try:
+        # gather() finishes as soon as any stage raises
+        await until_done_or_writer_died(asyncio.gather(*stage_tasks))
+    finally:
+        # After a failure or cancellation no stage is left running or blocked on a queue
+        for task in stage_tasks:
+            task.cancel()
+        await asyncio.gather(*stage_tasks, return_exceptions=True)
+        monitor_task.cancel()
+        # Files already extracted are still written, unless the writer is what died
+        if not writer_task.done():
+            await until_done_or_writer_died(write_queue.put(None))
+        await writer_task
+    # Only the cards this job touched, from this quarter on, can score differently
+    if written:
+        await asyncio.to_thread(rescore_written, db, written, quarter, year)
+    return stats
+
+async def set_progress(progress_store: ProgressStore, upload_id: str, fields: Dict[str, Any]):
+    await asyncio.to_thread(progress_store.update, upload_id, fields)
+
+async def keep_job_alive(upload_id: str):
+    """Heartbeat a running ingest job so no other worker resumes it"""
+    while True:
+        await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+        try:
+            if not await asyncio.to_thread(jobs.heartbeat, upload_id):
+                print(f"Ingest job {upload_id} was taken over by another worker")
+                return
+        except Exception as e:
+            print(f"Error updating heartbeat of job {upload_id}: {str(e)}")
+
+async def process_zip_with_progress(zip_path: str, quarter: str, year: int, upload_id: str, progress_store: ProgressStore):
+    """
+    Process an uploaded archive as a durable ingest job.
+
+    The job and each of its PDFs are checkpointed in ingest_jobs/ingest_files
+    (app.core.jobs). Running it again for the same upload_id, after its worker
+    died or after /jobs/{upload_id}/retry, only processes the files that are
+    neither written nor failed. The archive is kept until no file is left to retry.
+    """
     db = None
+    keep_archive = True
+    heartbeat_task = None
     try:
         db = SessionLocal()
-        os.makedirs(settings.EXTRACT_DIR, exist_ok=True)
         
         # Initialize progress tracking
-        progress_store[upload_id] = {
+        initial_state = {
             "status": "processing",
             "progress": 0,
             "total_files": 0,
@@ -127,279 +649,163 @@ async def process_zip_with_progress(zip_path: str, quarter: str, year: int, uplo
             "message": "Starting file extraction...",
             "start_time": time.time()
         }
+        # /upload normally created the job already; keep its event sequence going
+        if await asyncio.to_thread(progress_store.update, upload_id, initial_state) is None:
+            await asyncio.to_thread(progress_store.create, upload_id, initial_state)
+        await asyncio.to_thread(jobs.ensure_job, upload_id, zip_path, quarter, year)
+        heartbeat_task = asyncio.create_task(keep_job_alive(upload_id))
+        metrics.INGEST_JOBS_RUNNING.inc()
         
-        # Extract ZIP file
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            z.extractall(settings.EXTRACT_DIR)
+        # Expire old extraction cache entries before this job adds new ones
+        await asyncio.to_thread(extraction_cache.evict)
         
-        # Find all PDF files
-        pdf_files = []
-        for root, _, files in os.walk(settings.EXTRACT_DIR):
-            for fname in files:
-                if fname.endswith(".pdf") and not fname.startswith("._"):
-                    pdf_files.append(os.path.join(root, fname))
+        # Find all PDF members; they are read straight from the archive later
+        pdf_members = await asyncio.to_thread(list_pdf_members, zip_path)
         
-        total_files = len(pdf_files)
-        if total_files == 0:
-            progress_store[upload_id].update({
+        if not pdf_members:
+            keep_archive = False
+            await asyncio.to_thread(jobs.finish_job, upload_id, jobs.JOB_FAILED)
+            await set_progress(progress_store, upload_id, {
                 "status": "failed",
                 "progress": 100,
                 "message": "No PDF files found in the archive"
             })
             return
         
+        # Files written or failed by an earlier run of this job are not redone
+        await asyncio.to_thread(jobs.register_files, upload_id, pdf_members)
+        states = await asyncio.to_thread(jobs.file_states, upload_id)
+        remaining = [m for m in pdf_members if m in states and states[m] not in jobs.FILE_DONE_STATES]
+        total_files = len(states)
+        stats = ProcessingStats(total_files)
+        written = sum(1 for state in states.values() if state == jobs.FILE_WRITTEN)
+        stats.resume_from(written, total_files - len(remaining) - written)
+        
         # Update progress with file count
-        progress_store[upload_id].update({
+        message = f"Found {total_files} PDF files to process..."
+        if stats.resumed_files:
+            message = f"Resuming: {stats.resumed_files} of {total_files} files already done..."
+        await set_progress(progress_store, upload_id, {
             "total_files": total_files,
-            "message": f"Found {total_files} PDF files to process..."
+            "processed_files": stats.processed_files,
+            "progress": int(stats.processed_files / total_files * 100),
+            "message": message
         })
         
-        # Process each PDF
-        processed_files = 0
-        start_time = time.time()
-        
-        for i, pdf_path in enumerate(pdf_files, 1):
-            try:
-                filename = os.path.basename(pdf_path)
-                
-                # Calculate progress
-                progress = int((i - 1) / total_files * 100)
-                elapsed = time.time() - start_time
-                eta = (elapsed / i) * (total_files - i) if i > 0 else 0
-                
-                # Update progress
-                progress_store[upload_id].update({
-                    "status": "processing",
-                    "progress": progress,
-                    "current_file": filename,
-                    "processed_files": i - 1,
-                    "eta_seconds": int(eta),
-                    "message": f"Processing {i} of {total_files}: {filename}"
-                })
-                
-                # Process the file
-                process_pdf_file(pdf_path, quarter, year, db, filename)
-                processed_files += 1
-                
-                # Small delay to allow UI updates
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error processing {pdf_path}: {str(e)}")
-                db.rollback()
-                # Continue with next file
-                continue
+        # Run the staged extraction pipeline
+        if remaining:
+            stats = await run_extraction_pipeline(
+                iter_zip_pdfs(zip_path, remaining), total_files, quarter, year, db, upload_id, progress_store,
+                job_files=jobs.JobFiles(upload_id), stats=stats,
+            )
+        await asyncio.to_thread(jobs.finish_job, upload_id, jobs.JOB_COMPLETED)
+        keep_archive = stats.failed_files > 0
         
         # Mark as completed
-        progress_store[upload_id].update({
+        await set_progress(progress_store, upload_id, {
             "status": "completed",
             "progress": 100,
-            "processed_files": processed_files,
+            "processed_files": stats.processed_files,
+            "failed_files": stats.failed_files,
+            "cache_hits": stats.cache_hits,
+            "cache_misses": stats.cache_misses,
             "current_file": "",
-            "message": f"Successfully processed {processed_files} of {total_files} files.",
+            "message": f"Successfully processed {stats.succeeded_files} of {total_files} files.",
             "eta_seconds": 0
         })
         
     except Exception as e:
         print(f"Error in process_zip_with_progress: {str(e)}")
-        if upload_id in progress_store:
-            progress_store[upload_id].update({
-                "status": "failed",
-                "message": f"Processing failed: {str(e)}",
-                "progress": 0
-            })
+        await asyncio.to_thread(jobs.finish_job, upload_id, jobs.JOB_FAILED)
+        await set_progress(progress_store, upload_id, {
+            "status": "failed",
+            "message": f"Processing failed: {str(e)}",
+            "progress": 0
+        })
     finally:
         # Clean up resources
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+            metrics.INGEST_JOBS_RUNNING.dec()
         if db:
-            db.close()
-            
-        # Clean up all temporary files
+            await asyncio.to_thread(db.close)
+        # A worker shutting down mid-job lands here too: the archive stays for the resume
+        if not keep_archive:
+            await asyncio.to_thread(cleanup_temp_files, zip_path, upload_id, progress_store)
+
+async def resume_jobs(progress_store: ProgressStore):
+    """
+    Claim pending ingest jobs and jobs whose worker died, one per
+    JOB_HEARTBEAT_SECONDS; started with each web worker and runs forever.
+    """
+    while True:
         try:
-            print(f"Starting cleanup process...")
-            
-            # Remove the uploaded zip file
-            if os.path.exists(zip_path):
-                print(f"Removing zip file: {zip_path}")
-                os.remove(zip_path)
-                print(f"Successfully removed zip file")
-            
-            # Remove the extracted files directory if it exists
-            if os.path.exists(settings.EXTRACT_DIR):
-                print(f"Removing extracted files from: {settings.EXTRACT_DIR}")
-                # First, ensure all files are writable
-                for root, dirs, files in os.walk(settings.EXTRACT_DIR):
-                    for name in files:
-                        file_path = os.path.join(root, name)
-                        try:
-                            os.chmod(file_path, 0o777)  # Make file writable
-                        except Exception as e:
-                            print(f"Warning: Could not change permissions for {file_path}: {e}")
-                # Then remove the directory tree
-                shutil.rmtree(settings.EXTRACT_DIR, ignore_errors=True)
-                print(f"Successfully removed extracted files directory")
-            
-            # Also clean up any files in the uploads directory (as a safety measure)
-            uploads_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads')
-            if os.path.exists(uploads_dir):
-                print(f"Cleaning up uploads directory: {uploads_dir}")
-                for filename in os.listdir(uploads_dir):
-                    file_path = os.path.join(uploads_dir, filename)
-                    try:
-                        if os.path.isfile(file_path):
-                            os.chmod(file_path, 0o777)  # Make file writable
-                            os.unlink(file_path)
-                            print(f"Removed file: {file_path}")
-                    except Exception as e:
-                        print(f"Error deleting {file_path}: {e}")
-                        
+            for job in await asyncio.to_thread(jobs.claim_jobs, 1):
+                if not os.path.exists(job["zip_path"]):
+                    print(f"Cannot resume ingest job {job['upload_id']}: {job['zip_path']} is gone")
+                    await asyncio.to_thread(jobs.finish_job, job["upload_id"], jobs.JOB_FAILED)
+                    continue
+                print(f"Resuming ingest job {job['upload_id']}")
+                asyncio.create_task(process_zip_with_progress(
+                    job["zip_path"], job["quarter"], job["year"], job["upload_id"], progress_store
+                ))
         except Exception as e:
-            print(f"Error during cleanup: {str(e)}")
-            # Update progress with cleanup error if processing was successful
-            if upload_id in progress_store and progress_store[upload_id].get("status") == "completed":
-                progress_store[upload_id]["message"] += " (Note: Some temporary files might not have been cleaned up properly)"
-
-
-
-# def process_pdf_file(pdf_path: str, quarter: str, year: int, db: Session, filename: str = None):
-#     if filename is None:
-#         filename = os.path.basename(pdf_path)
-
-#     text = extract_text_from_pdf(pdf_path)
-#     data = ask_openai(text)
-
-#     issuer_name = clean_field(data.get("Issuer"))
-#     card_name = clean_field(data.get("Card Name"))
-
-#     # Fetch IDs from external backend's table
-#     issuer_id, card_id = get_card_and_issuer_ids(db, issuer_name, card_name)
-
-#     # 🔍 Try to find an existing record (already inserted previously)
-#     existing = db.query(ExtractedCard).filter_by(
-#         issuer=issuer_name,
-#         card_name=card_name,
-#         quarter=quarter,
-#         year=year,
-#         source_filename=filename,
-#     ).first()
-
-#     if existing:
-#         # 🔄 Update IDs if missing
-#         if not existing.issuer_id and issuer_id:
-#             existing.issuer_id = issuer_id
-#         if not existing.card_id and card_id:
-#             existing.card_id = card_id
-#         db.commit()
-#         return  # ✅ Exit early, no duplicate insert
-
-#     # 🆕 If not exists, create new
-#     new_card = ExtractedCard(
-#         quarter=quarter,
-#         year=year,
-#         source_filename=filename,
-#         issuer=issuer_name,
-#         card_name=card_name,
-#         issuer_id=issuer_id,
-#         card_id=card_id,
-#         min_apr=clean_field(data.get("Min APR (%)")),
-#         max_apr=clean_field(data.get("Max APR (%)")),
-#         penalty_apr=clean_field(data.get("Penalty APR (%)")),
-#         annual_fee=clean_field(data.get("Annual Fee ($)")),
-#         late_fee=clean_field(data.get("Late Fee ($)")),
-#         foreign_txn_fee=clean_field(data.get("Foreign Transaction Fee (%)")),
-#         cash_advance_fee=clean_field(data.get("Cash Advance Fee (%)")),
-#         balance_transfer_fee=clean_field(data.get("Balance Transfer Fee (%)")),
-#         min_interest_charge=clean_field(data.get("Minimum Interest Charge ($)")),
-#         rewards=clean_field(data.get("Rewards Structure")),
-#         exclusions=clean_field(data.get("Notable Exclusions")),
-#         extraction_date=datetime.utcnow(),
-#         card_type=clean_field(data.get("Card type")),
-#         institution_type=clean_field(data.get("Institution type")),
-#         change_description=clean_field(data.get("Change Description")),
-#         change_type=clean_field(data.get("Change type")),
-#         fee_structure=clean_field(data.get("Fee structure")),
-#         rewards_structure=clean_field(data.get("Rewards structure"))
-#     )
-
-#     db.add(new_card)
-#     db.commit()
-
-def process_pdf_file(pdf_path: str, quarter: str, year: int, db: Session, filename: str = None):
-    if filename is None:
-        filename = os.path.basename(pdf_path)
-
-    text = extract_text_from_pdf(pdf_path)
-    data = ask_openai(text)
-
-    issuer_name = clean_field(data.get("Issuer"))
-    card_name = clean_field(data.get("Card Name"))
-
-    # issuer_id, card_id = get_card_and_issuer_ids(db, issuer_name, card_name)  # 🔒 Commented for now
-
-    existing = db.query(ExtractedCard).filter_by(
-        issuer=issuer_name,
-        card_name=card_name,
-        quarter=quarter,
-        year=year,
-        source_filename=filename,
-    ).first()
-
-    if existing:
-        # Just update fields (excluding issuer_id and card_id for now)
-        existing.min_apr = clean_field(data.get("Min APR (%)"))
-        existing.max_apr = clean_field(data.get("Max APR (%)"))
-        existing.penalty_apr = clean_field(data.get("Penalty APR (%)"))
-        existing.cash_advance_apr = clean_field(data.get("Cash Advance APR (%)"))
-        existing.annual_fee = clean_field(data.get("Annual Fee ($)"))
-        existing.late_fee = clean_field(data.get("Late Fee ($)"))
-        existing.foreign_txn_fee = clean_field(data.get("Foreign Transaction Fee (%)"))
-        existing.cash_advance_fee = clean_field(data.get("Cash Advance Fee (%)"))
-        existing.balance_transfer_fee = clean_field(data.get("Balance Transfer Fee (%)"))
-        existing.min_interest_charge = clean_field(data.get("Minimum Interest Charge ($)"))
-        existing.rewards = clean_field(data.get("Rewards Structure"))
-        existing.exclusions = clean_field(data.get("Notable Exclusions"))
-        existing.card_type = clean_field(data.get("Card type"))
-        existing.institution_type = clean_field(data.get("Institution type"))
-        existing.change_description = clean_field(data.get("Change Description"))
-        existing.change_type = clean_field(data.get("Change type"))
-        existing.fee_structure = clean_field(data.get("Fee structure"))
-        existing.rewards_structure = clean_field(data.get("Rewards structure"))
-        existing.extraction_date = datetime.utcnow()
-        db.commit()
-        return
-
-    new_card = ExtractedCard(
-        quarter=quarter,
-        year=year,
-        source_filename=filename,
-        issuer=issuer_name,
-        card_name=card_name,
-        # issuer_id=issuer_id,
-        # card_id=card_id,
-        min_apr=clean_field(data.get("Min APR (%)")),
-        max_apr=clean_field(data.get("Max APR (%)")),
-        penalty_apr=clean_field(data.get("Penalty APR (%)")),
-        cash_advance_apr = clean_field(data.get("Cash Advance APR (%)")),
-        annual_fee=clean_field(data.get("Annual Fee ($)")),
-        late_fee=clean_field(data.get("Late Fee ($)")),
-        foreign_txn_fee=clean_field(data.get("Foreign Transaction Fee (%)")),
-        cash_advance_fee=clean_field(data.get("Cash Advance Fee (%)")),
-        balance_transfer_fee=clean_field(data.get("Balance Transfer Fee (%)")),
-        min_interest_charge=clean_field(data.get("Minimum Interest Charge ($)")),
-        rewards=clean_field(data.get("Rewards Structure")),
-        exclusions=clean_field(data.get("Notable Exclusions")),
-        extraction_date=datetime.utcnow(),
-        card_type=clean_field(data.get("Card type")),
-        institution_type=clean_field(data.get("Institution type")),
-        change_description=clean_field(data.get("Change Description")),
-        change_type=clean_field(data.get("Change type")),
-        fee_structure=clean_field(data.get("Fee structure")),
-        rewards_structure=clean_field(data.get("Rewards structure"))
-    )
-
-    db.add(new_card)
-    db.commit()
+            print(f"Error resuming ingest jobs: {str(e)}")
+        await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
 
+def job_work_dir(upload_id: str) -> str:
+    """Scratch directory owned by a single upload; nothing else reads or deletes it"""
+    return os.path.join(settings.UPLOAD_DIR, upload_id)
 
+def cleanup_stale_work_dirs(max_age_seconds: int) -> int:
+    """Remove job directories left behind by workers that died mid-job"""
+    removed = 0
+    if not os.path.isdir(settings.UPLOAD_DIR):
+        return removed
+    cutoff = time.time() - max_age_seconds
+    # Unfinished jobs may still be resumed from their archive
+    active = set(jobs.active_upload_ids())
+    for entry in os.scandir(settings.UPLOAD_DIR):
+        if entry.is_dir() and entry.name not in active and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
 
+def cleanup_temp_files(zip_path: str, upload_id: str, progress_store: ProgressStore):
+    """Remove the uploaded archive and this job's work directory once the job is done"""
+    # Clean up this job's temporary files only; other uploads may be in flight
+    try:
+        print(f"Starting cleanup process...")
+        
+        # Remove the uploaded zip file
+        if os.path.exists(zip_path):
+            print(f"Removing zip file: {zip_path}")
+            os.remove(zip_path)
+            print(f"Successfully removed zip file")
+        
+        work_dir = job_work_dir(upload_id)
+        if os.path.isdir(work_dir):
+            print(f"Removing work directory: {work_dir}")
+            shutil.rmtree(work_dir)
+                    
+    except Exception as e:
+        print(f"Error during cleanup: {str(e)}")
+        # Update progress with cleanup error if processing was successful
+        state = progress_store.get(upload_id)
+        if state and state.get("status") == "completed":
+            progress_store.update(upload_id, {
+                "message": state["message"] + " (Note: Some temporary files might not have been cleaned up properly)"
+            })
 
-    # optionally clean up extracted files
+def build_card_record(data: dict, quarter: str, year: int, filename: str) -> Dict[str, Any]:
+    """Map the extracted fields (parser and/or LLM JSON) onto extracted_cards column values"""
+    # issuer_id / card_id are resolved by upsert_cards (app.core.name_index)
+    record = {column: clean_field(data.get(field)) for field, column in FIELD_COLUMNS.items()}
+    record.update({
+        "quarter": quarter,
+        "year": year,
+        "source_filename": filename,
+        "extraction_date": datetime.utcnow(),
+        "extraction_method": data.get(EXTRACTION_METHOD_KEY, METHOD_LLM),
+    })
+    return record
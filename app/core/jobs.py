@@ -0,0 +1,327 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, or_, select, update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import IngestFile, IngestJob
+
+# Durable state of ingest jobs. Every archive gets an ingest_jobs row and each
+# of its PDFs an ingest_files row whose state moves
+#
+#   pending -> extracting -> llm -> written
+#                     \--------\----> failed
+#
+# A running job's owner touches heartbeat_at every JOB_HEARTBEAT_SECONDS. When
+# a worker dies (gunicorn recycles it, a deploy), its jobs stop heartbeating
+# and any live worker claims them after JOB_STALE_SECONDS and carries on with
+# the files not yet written.
+#
+# The same table is the queue for standalone workers (python -m app.ingest
+# worker): with INGEST_IN_WEB off, /upload only inserts a pending job.
+# All functions block; use asyncio.to_thread.
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+FILE_PENDING = "pending"
+FILE_EXTRACTING = "extracting"
+FILE_LLM = "llm"
+FILE_WRITTEN = "written"
+FILE_FAILED = "failed"
+FILE_DONE_STATES = (FILE_WRITTEN, FILE_FAILED)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _job_dict(job: IngestJob) -> Dict[str, Any]:
+    return {
+        "upload_id": job.upload_id,
+        "zip_path": job.zip_path,
+        "quarter": job.quarter,
+        "year": job.year,
+        "status": job.status,
+        "owner": job.owner,
+    }
+
+
+def create_job(upload_id: str, zip_path: str, quarter: str, year: int, owner: Optional[str] = WORKER_ID):
+    """Record a new archive; with an owner it starts out running there, else it waits to be claimed"""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.add(IngestJob(
+            upload_id=upload_id,
+            zip_path=zip_path,
+            quarter=quarter,
+            year=year,
+            status=JOB_RUNNING if owner else JOB_PENDING,
+            owner=owner,
+            heartbeat_at=now if owner else None,
+            created_at=now,
+            updated_at=now,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def ensure_job(upload_id: str, zip_path: str, quarter: str, year: int):
+    """create_job, owned by this worker, unless the job exists (it is being resumed)"""
+    db = SessionLocal()
+    try:
+        exists = db.get(IngestJob, upload_id) is not None
+    finally:
+        db.close()
+    if not exists:
+        create_job(upload_id, zip_path, quarter, year)
+
+
+def get_job(upload_id: str) -> Optional[Dict[str, Any]]:
+    """The job with its per-state file counts and failed files, or None"""
+    db = SessionLocal()
+    try:
+        job = db.get(IngestJob, upload_id)
+        if job is None:
+            return None
+        result = _job_dict(job)
+        counts = db.execute(
+            select(IngestFile.state, func.count()).where(IngestFile.upload_id == upload_id).group_by(IngestFile.state)
+        ).all()
+        result["files"] = {state: count for state, count in counts}
+        result["failed_files"] = [
+            {"filename": filename, "error": error}
+            for filename, error in db.execute(
+                select(IngestFile.filename, IngestFile.error)
+                .where(IngestFile.upload_id == upload_id, IngestFile.state == FILE_FAILED)
+                .order_by(IngestFile.id)
+            ).all()
+        ]
+        return result
+    finally:
+        db.close()
+
+
+def register_files(upload_id: str, members: List[str]) -> int:
+    """Add an ingest_files row for each archive member not tracked yet; returns how many were added"""
+    db = SessionLocal()
+    try:
+        known = set(db.execute(select(IngestFile.filename).where(IngestFile.upload_id == upload_id)).scalars())
+        now = datetime.utcnow()
+        added = 0
+        for member in members:
+            filename = os.path.basename(member)
+            # Cards are keyed by basename, so a second member with the same name is the same card
+            if filename in known:
+                continue
+            known.add(filename)
+            db.add(IngestFile(upload_id=upload_id, filename=filename, member=member, state=FILE_PENDING, updated_at=now))
+            added += 1
+        db.commit()
+        return added
+    finally:
+        db.close()
+
+
+def file_states(upload_id: str) -> Dict[str, str]:
+    """member -> state for every file of the job"""
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(IngestFile.member, IngestFile.state).where(IngestFile.upload_id == upload_id)).all()
+        return {member: state for member, state in rows}
+    finally:
+        db.close()
+
+
+def set_file_state(upload_id: str, filenames: List[str], state: str, error: Optional[str] = None):
+    """Move files of a job to ``state`` with one UPDATE"""
+    if not filenames:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(IngestFile)
+            .where(IngestFile.upload_id == upload_id, IngestFile.filename.in_(filenames))
+            .values(state=state, error=error[:2000] if error else None, updated_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def heartbeat(upload_id: str, owner: str = WORKER_ID) -> bool:
+    """Refresh the job's heartbeat; False if another worker has taken it over"""
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(IngestJob)
+            .where(IngestJob.upload_id == upload_id, IngestJob.owner == owner, IngestJob.status == JOB_RUNNING)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        db.commit()
+        return result.rowcount == 1
+    finally:
+        db.close()
+
+
+def finish_job(upload_id: str, status: str, owner: str = WORKER_ID):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(IngestJob)
+            .where(IngestJob.upload_id == upload_id, IngestJob.owner == owner)
+            .values(status=status, updated_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claimable():
+    stale = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return or_(
+        IngestJob.status == JOB_PENDING,
+        (IngestJob.status == JOB_RUNNING) & (IngestJob.heartbeat_at < stale),
+    )
+
+
+def _try_claim(db, upload_id: str, owner: str) -> Optional[Dict[str, Any]]:
+    # Re-checks the claimable condition, so when several workers race for the
+    # same job exactly one UPDATE matches
+    now = datetime.utcnow()
+    result = db.execute(
+        update(IngestJob)
+        .where(IngestJob.upload_id == upload_id, _claimable())
+        .values(status=JOB_RUNNING, owner=owner, heartbeat_at=now, updated_at=now)
+    )
+    db.commit()
+    return _job_dict(db.get(IngestJob, upload_id)) if result.rowcount == 1 else None
+
+
+def claim_jobs(limit: int = 1, owner: str = WORKER_ID) -> List[Dict[str, Any]]:
+    """
+    Take over up to ``limit`` pending jobs or running jobs whose owner stopped heartbeating.
+
+    PostgreSQL and MySQL lock the picked rows with SELECT ... FOR UPDATE SKIP
+    LOCKED, so concurrent workers (on any node) each get different jobs
+    without waiting on one another. SQLite has no row locks; there each
+    candidate is taken with a conditional UPDATE instead, and since SQLite
+    serializes writers exactly one worker's UPDATE matches.
+    """
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name in ("postgresql", "mysql"):
+            return _claim_skip_locked(db, limit, owner)
+        claimed = []
+        candidates = db.execute(
+            select(IngestJob.upload_id).where(_claimable()).order_by(IngestJob.created_at).limit(limit * 4)
+        ).scalars().all()
+        for upload_id in candidates:
+            if len(claimed) >= limit:
+                break
+            job = _try_claim(db, upload_id, owner)
+            if job is not None:
+                claimed.append(job)
+        return claimed
+    finally:
+        db.close()
+
+
+def _claim_skip_locked(db, limit: int, owner: str) -> List[Dict[str, Any]]:
+    rows = db.execute(
+        select(IngestJob)
+        .where(_claimable())
+        .order_by(IngestJob.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    now = datetime.utcnow()
+    for job in rows:
+        job.status = JOB_RUNNING
+        job.owner = owner
+        job.heartbeat_at = now
+        job.updated_at = now
+    db.commit()
+    return [_job_dict(job) for job in rows]
+
+
+def release_job(upload_id: str, owner: str = WORKER_ID):
+    """Hand a running job back to the queue (worker shutting down); another worker resumes it"""
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(IngestJob)
+            .where(IngestJob.upload_id == upload_id, IngestJob.owner == owner, IngestJob.status == JOB_RUNNING)
+            .values(status=JOB_PENDING, owner=None, updated_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def claim_job(upload_id: str, owner: str = WORKER_ID) -> Optional[Dict[str, Any]]:
+    """Take over one job if it is claimable, else None"""
+    db = SessionLocal()
+    try:
+        return _try_claim(db, upload_id, owner)
+    finally:
+        db.close()
+
+
+def retry_failed(upload_id: str) -> int:
+    """
+    Put a job's failed files back to pending and queue the job to be claimed again.
+
+    Returns how many files are left to process. Written files are left alone;
+    when every file was written the job is not touched and 0 is returned.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.execute(
+            update(IngestFile)
+            .where(IngestFile.upload_id == upload_id, IngestFile.state == FILE_FAILED)
+            .values(state=FILE_PENDING, error=None, updated_at=now)
+        )
+        remaining = db.execute(
+            select(func.count())
+            .select_from(IngestFile)
+            .where(IngestFile.upload_id == upload_id, IngestFile.state.notin_(FILE_DONE_STATES))
+        ).scalar()
+        if remaining:
+            # A running job picks the files up when it is next resumed; a finished one is queued again
+            db.execute(
+                update(IngestJob)
+                .where(IngestJob.upload_id == upload_id, IngestJob.status.in_((JOB_COMPLETED, JOB_FAILED)))
+                .values(status=JOB_PENDING, owner=None, updated_at=now)
+            )
+        db.commit()
+        return remaining
+    finally:
+        db.close()
+
+
+def active_upload_ids() -> List[str]:
+    """Unfinished jobs, whose archives must stay on disk"""
+    db = SessionLocal()
+    try:
+        stmt = select(IngestJob.upload_id).where(IngestJob.status.in_((JOB_PENDING, JOB_RUNNING)))
+        return list(db.execute(stmt).scalars())
+    finally:
+        db.close()
+
+
+class JobFiles:
+    """Per-file checkpoints of one job, for the async extraction pipeline"""
+
+    def __init__(self, upload_id: str):
+        self.upload_id = upload_id
+
+    async def mark(self, filenames: List[str], state: str, error: Optional[str] = None):
+        await asyncio.to_thread(set_file_state, self.upload_id, filenames, state, error)
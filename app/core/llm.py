@@ -0,0 +1,363 @@
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import openai
+from openai import AsyncOpenAI
+
+from app.core import metrics
+from app.core.config import settings
+
+Messages = List[Dict[str, str]]
+
+# Offline batch statuses after which nothing changes any more
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class LLMProvider:
+    """
+    Chat completion backend used for extraction.
+
+    complete() serves the online path (one request per document or per packed
+    batch of documents). The batch methods serve the offline path: submit many
+    requests at once, poll, then fetch every answer, keyed by custom_id.
+    """
+
+    model: str = ""
+
+    async def complete(self, messages: Messages, response_format: Optional[Dict[str, Any]] = None) -> str:
+        """response_format is an OpenAI-style structured-output spec, or None for free text"""
+        raise NotImplementedError
+
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """requests are {"custom_id": ..., "messages": [...], "response_format": ...?}; returns the batch id"""
+        raise NotImplementedError
+
+    async def batch_status(self, batch_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def batch_results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """custom_id -> message content, or None for requests that failed"""
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI, or any server speaking its API (LLM_BASE_URL), such as app.scripts.llm_stub_server"""
+
+    def __init__(self, api_key: str, model: str, base_url: str = ""):
+        self.model = model
+        # Retries and timeouts are owned by LLMScheduler, not the SDK
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url or None, max_retries=0)
+
+    async def complete(self, messages: Messages, response_format: Optional[Dict[str, Any]] = None) -> str:
+        extra = {"response_format": response_format} if response_format else {}
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0,
+            **extra,
+        )
+        return response.choices[0].message.content
+
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": r["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": r["messages"],
+                    "temperature": 0,
+                    **({"response_format": r["response_format"]} if r.get("response_format") else {}),
+                },
+            })
+            for r in requests
+        ]
+        upload = await self.client.files.create(
+            file=("extraction_batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return batch.id
+
+    async def batch_status(self, batch_id: str) -> Dict[str, Any]:
+        batch = await self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "total": counts.total if counts else 0,
+            "completed": counts.completed if counts else 0,
+            "failed": counts.failed if counts else 0,
+        }
+
+    async def batch_results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch_id} is {batch.status}, not completed")
+        results: Dict[str, Optional[str]] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                body = response.get("body") or {}
+                if response.get("status_code") == 200 and body.get("choices"):
+                    results[item["custom_id"]] = body["choices"][0]["message"]["content"]
+                else:
+                    results[item["custom_id"]] = None
+        return results
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    return isinstance(exc, openai.RateLimitError)
+
+
+def is_retryable(exc: Exception) -> bool:
+    """429s, timeouts, connection errors and 5xx are transient; bad requests and auth are not"""
+    if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409) or exc.status_code >= 500
+    return False
+
+
+class LLMScheduler(LLMProvider):
+    """
+    Rate-limit-aware front for a provider's online requests.
+
+    - Budgets: a request starts only while the last 60 s hold fewer than
+      ``rpm`` requests and ``tpm`` estimated tokens (prompt + expected answer).
+    - Concurrency is adaptive (AIMD): +1 slot after a full window of successes,
+      halved on a 429, between 1 and ``max_concurrency``.
+    - Transient errors are retried with full-jitter exponential backoff (or the
+      server's Retry-After). A 429 also pauses every caller for that delay.
+      Retried requests go back through the queue, they are never dropped;
+      only after ``max_retries`` does the error reach the caller.
+
+    Budgets and limits are per process; with several gunicorn workers, set
+    LLM_RPM_LIMIT / LLM_TPM_LIMIT to the account limit divided by the workers.
+    Batch-API calls pass straight through.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        rpm: int,
+        tpm: int,
+        initial_concurrency: int,
+        max_concurrency: int,
+        max_retries: int,
+        timeout: float,
+        backoff_base: float,
+        backoff_max: float,
+        completion_tokens: int,
+    ):
+        self.provider = provider
+        self.model = provider.model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = max(1, min(initial_concurrency, self.max_concurrency))
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.completion_tokens = completion_tokens
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.backing_off = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self._successes_in_window = 0
+        self._paused_until = 0.0
+        self._last_decrease: Optional[float] = None
+        self._started: Deque[Tuple[float, int]] = deque()  # (time, tokens) of requests started in the last 60 s
+        self._completed: Deque[Tuple[float, int]] = deque()
+        self._cond: Optional[asyncio.Condition] = None
+        self._loop = None
+
+    def _condition(self) -> asyncio.Condition:
+        # asyncio primitives belong to one loop; scripts may run several in turn
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._cond = asyncio.Condition()
+            self.in_flight = self.waiting = self.backing_off = 0
+            self._publish()
+        return self._cond
+
+    def _publish(self):
+        # Per-process values; /metrics sums them over the live workers
+        metrics.LLM_IN_FLIGHT.set(self.in_flight)
+        metrics.LLM_QUEUE_DEPTH.set(self.waiting + self.backing_off)
+
+    @staticmethod
+    def _trim(window: Deque[Tuple[float, int]], now: float):
+        while window and window[0][0] <= now - 60:
+            window.popleft()
+
+    def _wait_time(self, tokens: int, now: float) -> Optional[float]:
+        """0 if a request of ``tokens`` may start now, else seconds until that could change (None: on release)"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= self.limit:
+            return None
+        self._trim(self._started, now)
+        if self.rpm and len(self._started) >= self.rpm:
+            return self._started[0][0] + 60 - now
+        used = sum(t for _, t in self._started)
+        # A single request larger than the whole budget may still run alone
+        if self.tpm and used + tokens > self.tpm and self._started:
+            return self._started[0][0] + 60 - now
+        return 0
+
+    async def _acquire(self, tokens: int):
+        cond = self._condition()
+        async with cond:
+            self.waiting += 1
+            self._publish()
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._wait_time(tokens, now)
+                    if delay == 0:
+                        break
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting -= 1
+                self._publish()
+            self.in_flight += 1
+            self._publish()
+            self._started.append((time.monotonic(), tokens))
+
+    async def _release(self, tokens: int, ok: bool, rate_limited: bool = False, retry_after: Optional[float] = None):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            self._publish()
+            now = time.monotonic()
+            if ok:
+                self._completed.append((now, tokens))
+                self._successes_in_window += 1
+                if self._successes_in_window >= self.limit:
+                    self.limit = min(self.max_concurrency, self.limit + 1)
+                    self._successes_in_window = 0
+            elif rate_limited:
+                self.rate_limited += 1
+                self._successes_in_window = 0
+                # One decrease per burst: the other requests of that burst fail the same way
+                if self._last_decrease is None or now - self._last_decrease > self.backoff_base:
+                    self.limit = max(1, self.limit // 2)
+                    self._last_decrease = now
+                pause = retry_after if retry_after is not None else self.backoff_base
+                self._paused_until = max(self._paused_until, now + pause)
+            cond.notify_all()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def estimate_tokens(self, messages: Messages) -> int:
+        from app.core.pdf_text import count_tokens
+
+        return sum(count_tokens(m["content"]) for m in messages) + self.completion_tokens
+
+    async def complete(self, messages: Messages, response_format: Optional[Dict[str, Any]] = None) -> str:
+        tokens = self.estimate_tokens(messages)
+        metrics.LLM_REQUEST_TOKENS.observe(tokens)
+        attempt = 0
+        while True:
+            await self._acquire(tokens)
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(self.provider.complete(messages, response_format), timeout=self.timeout)
+            except Exception as e:
+                rate_limited = is_rate_limited(e)
+                metrics.LLM_REQUEST_SECONDS.labels("rate_limited" if rate_limited else "error").observe(
+                    time.perf_counter() - started
+                )
+                retry_after = _retry_after(e)
+                await self._release(tokens, ok=False, rate_limited=rate_limited, retry_after=retry_after)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+                metrics.LLM_RETRIES.labels("rate_limited" if rate_limited else "transient").inc()
+                self.backing_off += 1
+                self._publish()
+                try:
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+                finally:
+                    self.backing_off -= 1
+                    self._publish()
+                continue
+            metrics.LLM_REQUEST_SECONDS.labels("ok").observe(time.perf_counter() - started)
+            await self._release(tokens, ok=True)
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Live figures for the progress stream"""
+        now = time.monotonic()
+        self._trim(self._completed, now)
+        return {
+            "requests_per_min": len(self._completed),
+            "tokens_per_min": sum(t for _, t in self._completed),
+            "queue_depth": self.waiting + self.backing_off,
+            "in_flight": self.in_flight,
+            "concurrency_limit": self.limit,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        return await self.provider.submit_batch(requests)
+
+    async def batch_status(self, batch_id: str) -> Dict[str, Any]:
+        return await self.provider.batch_status(batch_id)
+
+    async def batch_results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        return await self.provider.batch_results(batch_id)
+
+
+def get_llm_provider() -> LLMScheduler:
+    if settings.LLM_PROVIDER == "openai":
+        provider = OpenAIProvider(settings.OPENAI_API_KEY, settings.OPENAI_MODEL, settings.LLM_BASE_URL)
+    else:
+        raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
+    return LLMScheduler(
+        provider,
+        rpm=settings.LLM_RPM_LIMIT,
+        tpm=settings.LLM_TPM_LIMIT,
+        initial_concurrency=settings.LLM_CONCURRENCY,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        max_retries=settings.LLM_MAX_RETRIES,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+        completion_tokens=settings.LLM_COMPLETION_TOKENS_ESTIMATE,
+    )
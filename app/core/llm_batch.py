@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from app.core import cache as extraction_cache
+from app.core.config import settings
+from app.core.export import invalidate_export_cache
+from app.core.extractor import (
+    METHOD_LLM,
+    EXTRACTION_FIELDS,
+    METHOD_RULES_LLM,
+    PROMPT_VERSION,
+    build_card_record,
+    extraction_messages,
+    extraction_response_format,
+    iter_zip_pdfs,
+    list_pdf_members,
+    llm_provider,
+    merge_extraction,
+    missing_fields,
+)
+from app.core.llm import BATCH_FINAL_STATUSES
+from app.core.scoring import rescore_written
+from app.core.structured import parse_fields
+from app.core.pdf_text import prepare_document
+from app.core.response_cache import data_cache
+from app.db.crud import upsert_cards
+from app.db.database import SessionLocal
+
+# Offline path for non-urgent backfills: submit every document as one provider
+# batch job (cheaper, no rate-limit pressure on the online path), poll, then
+# ingest. The manifest kept in LLM_BATCH_DIR carries what ingestion needs
+# (filename, cache key, parsed Schumer box fields) between the two steps.
+
+
+def manifest_path(batch_id: str) -> str:
+    return os.path.join(settings.LLM_BATCH_DIR, f"{batch_id}.json")
+
+
+def load_manifest(batch_id: str) -> Dict[str, Any]:
+    with open(manifest_path(batch_id)) as f:
+        return json.load(f)
+
+
+def _write_records(records: List[Dict[str, Any]], quarter: str, year: int) -> int:
+    """Upsert records in WRITE_BATCH_SIZE chunks; returns how many failed"""
+    failed = 0
+    written = []
+    db = SessionLocal()
+    try:
+        for start in range(0, len(records), settings.WRITE_BATCH_SIZE):
+            chunk = records[start:start + settings.WRITE_BATCH_SIZE]
+            failures = dict(upsert_cards(db, chunk))
+            for index, exc in failures.items():
+                failed += 1
+                print(f"Error saving {chunk[index]['source_filename']}: {str(exc)}")
+            written.extend(r for i, r in enumerate(chunk) if i not in failures)
+        if written:
+            rescore_written(db, written, quarter, year)
+    finally:
+        db.close()
+    if len(records) > failed:
+        invalidate_export_cache(quarter, year)
+        data_cache.invalidate(quarter, year)
+    return failed
+
+
+async def submit_zip_batch(zip_path: str, quarter: str, year: int) -> Tuple[str, Dict[str, int]]:
+    """
+    Prepare every PDF in the archive and submit the LLM work as one batch job.
+
+    Files already in the extraction cache are written immediately and left out
+    of the batch; the rest ask only for the fields the Schumer box parser
+    left unresolved. Returns (batch_id, counts); batch_id is "" when nothing
+    needed the LLM.
+    """
+    extraction_cache.evict()
+    members = list_pdf_members(zip_path)
+    if not members:
+        raise ValueError("No PDF files found in the archive")
+
+    requests = []
+    documents: Dict[str, Dict[str, Any]] = {}
+    records = []
+    counts = {"files": len(members), "cached": 0, "submitted": 0, "unreadable": 0}
+    for index, (filename, pdf_bytes) in enumerate(iter_zip_pdfs(zip_path, members)):
+        if isinstance(pdf_bytes, Exception):
+            counts["unreadable"] += 1
+            print(f"Skipping {filename}, it cannot be read from the archive: {str(pdf_bytes)}")
+            continue
+        pdf_sha256 = extraction_cache.hash_bytes(pdf_bytes)
+        cache_key = extraction_cache.make_cache_key(pdf_sha256, PROMPT_VERSION)
+        data = extraction_cache.lookup(cache_key)
+        if data is not None:
+            counts["cached"] += 1
+            records.append(build_card_record(data, quarter, year, filename))
+            continue
+
+        text, parsed_fields = prepare_document(pdf_bytes)
+        missing = missing_fields(parsed_fields)
+        custom_id = f"{index}-{pdf_sha256[:16]}"
+        requests.append({
+            "custom_id": custom_id,
+            "messages": extraction_messages(text, missing),
+            "response_format": extraction_response_format(missing),
+        })
+        documents[custom_id] = {
+            "filename": filename,
+            "fields": missing,
+            "pdf_sha256": pdf_sha256,
+            "cache_key": cache_key,
+            "parsed_fields": parsed_fields,
+        }
+
+    if records:
+        _write_records(records, quarter, year)
+    if not requests:
+        return "", counts
+
+    batch_id = await llm_provider.submit_batch(requests)
+    counts["submitted"] = len(requests)
+    os.makedirs(settings.LLM_BATCH_DIR, exist_ok=True)
+    with open(manifest_path(batch_id), "w") as f:
+        json.dump({
+            "batch_id": batch_id,
+            "quarter": quarter,
+            "year": year,
+            "prompt_version": PROMPT_VERSION,
+            "submitted_at": datetime.utcnow().isoformat(),
+            "documents": documents,
+        }, f)
+    return batch_id, counts
+
+
+async def batch_status(batch_id: str) -> Dict[str, Any]:
+    return await llm_provider.batch_status(batch_id)
+
+
+async def wait_for_batch(batch_id: str, poll_seconds: float = 60.0) -> Dict[str, Any]:
+    """Poll until the batch reaches a final status"""
+    while True:
+        status = await batch_status(batch_id)
+        print(f"batch {batch_id}: {status['status']} ({status['completed']}/{status['total']} done, {status['failed']} failed)")
+        if status["status"] in BATCH_FINAL_STATUSES:
+            return status
+        await asyncio.sleep(poll_seconds)
+
+
+async def ingest_batch(batch_id: str) -> Dict[str, int]:
+    """
+    Write the results of a completed batch job.
+
+    Answers are merged with the parsed fields exactly as on the online path and
+    stored in the extraction cache. Answers go through the same repair and
+    per-field validation; there is no re-ask offline, so fields that stay
+    invalid are recorded as "Not disclosed". Documents without a single valid
+    field are counted as failed; re-running the upload online picks them up.
+    """
+    manifest = load_manifest(batch_id)
+    quarter, year = manifest["quarter"], manifest["year"]
+    results = await llm_provider.batch_results(batch_id)
+
+    records = []
+    failed = 0
+    for custom_id, doc in manifest["documents"].items():
+        content = results.get(custom_id)
+        fields = doc.get("fields", EXTRACTION_FIELDS)
+        answer, invalid, _ = parse_fields(content or "", fields)
+        if not answer:
+            failed += 1
+            print(f"Error processing {doc['filename']}: {'no answer in batch output' if content is None else 'no valid fields'}")
+            continue
+        answer.update({field: "Not disclosed" for field in invalid})
+        method = METHOD_RULES_LLM if doc["parsed_fields"] else METHOD_LLM
+        data = merge_extraction(answer, doc["parsed_fields"], method)
+        if manifest.get("prompt_version") == PROMPT_VERSION:
+            extraction_cache.store(doc["cache_key"], doc["pdf_sha256"], PROMPT_VERSION, data)
+        records.append(build_card_record(data, quarter, year, doc["filename"]))
+
+    write_failures = _write_records(records, quarter, year)
+    return {
+        "documents": len(manifest["documents"]),
+        "written": len(records) - write_failures,
+        "failed": failed + write_failures,
+    }
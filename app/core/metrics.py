@@ -0,0 +1,171 @@
+import os
+import time
+from typing import AsyncIterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+# Prometheus metrics for ingestion and the API, served at /metrics.
+#
+# Under gunicorn every worker keeps its own counters. With
+# PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does that) each process
+# writes them to files there and /metrics, whichever worker answers, adds up
+# the files of all of them. Gauges of live state use "livesum": the sum over
+# running processes only. Without the variable (uvicorn, scripts) /metrics
+# reports this process.
+
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KB .. 256 MB
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000, 32000)
+
+# Ingestion: read (archive member bytes), pdf_text (text, page selection and
+# Schumer box parsing in the process pool, queueing for it included), llm
+# (every LLM call of one document, re-asks included) and db_write (one batched
+# upsert)
+INGEST_STAGE_SECONDS = Histogram(
+    "finprintiq_ingest_stage_seconds", "Time spent per ingestion stage", ["stage"], buckets=STAGE_BUCKETS
+)
+INGEST_FILES = Counter("finprintiq_ingest_files_total", "PDFs finished by ingestion", ["outcome"])
+EXTRACTION_CACHE_LOOKUPS = Counter("finprintiq_extraction_cache_lookups_total", "Extraction cache lookups", ["result"])
+INGEST_JOBS_RUNNING = Gauge(
+    "finprintiq_ingest_jobs_running", "Archives being ingested", multiprocess_mode="livesum"
+)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "finprintiq_llm_request_seconds", "Latency of single LLM requests", ["outcome"], buckets=STAGE_BUCKETS
+)
+LLM_REQUEST_TOKENS = Histogram(
+    "finprintiq_llm_request_tokens", "Estimated tokens per LLM request (prompt + expected answer)",
+    buckets=TOKEN_BUCKETS,
+)
+LLM_RETRIES = Counter("finprintiq_llm_retries_total", "LLM requests retried", ["reason"])
+LLM_IN_FLIGHT = Gauge("finprintiq_llm_in_flight", "LLM requests in flight", multiprocess_mode="livesum")
+LLM_QUEUE_DEPTH = Gauge(
+    "finprintiq_llm_queue_depth", "LLM requests waiting for a slot or backing off", multiprocess_mode="livesum"
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "finprintiq_http_request_seconds", "HTTP request latency, until the last body byte",
+    ["method", "route", "status"], buckets=HTTP_BUCKETS,
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "finprintiq_http_response_bytes", "HTTP response body size, as sent (compressed if it was)",
+    ["route"], buckets=SIZE_BUCKETS,
+)
+SSE_STREAMS_OPEN = Gauge("finprintiq_sse_streams_open", "Open /progress streams", multiprocess_mode="livesum")
+SSE_STREAMS = Counter("finprintiq_sse_streams_total", "/progress streams opened")
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "finprintiq_db_pool_checkout_seconds", "Wait for a pooled DB connection", buckets=HTTP_BUCKETS
+)
+DB_CONNECTIONS_IN_USE = Gauge(
+    "finprintiq_db_connections_in_use", "DB connections checked out of the pool", multiprocess_mode="livesum"
+)
+
+# Long-lived streams would swamp the latency histogram
+_UNTIMED_ROUTES = {"/progress/{upload_id}"}
+
+
+def _registry() -> CollectorRegistry:
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render() -> tuple:
+    """(body, content type) of the metrics of every worker"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def serve(port: int):
+    """Expose the metrics on their own port, for processes without the API (python -m app.ingest worker)"""
+    start_http_server(port, registry=_registry())
+
+
+async def track_sse(events: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Pass an SSE event stream through, counting it while it is open"""
+    SSE_STREAMS.inc()
+    SSE_STREAMS_OPEN.inc()
+    try:
+        async for sse_event in events:
+            yield sse_event
+    finally:
+        SSE_STREAMS_OPEN.dec()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+def pool_class_for(url: str) -> Optional[type]:
+    """TimedQueuePool where the dialect would pool with QueuePool, else None (keep its default)"""
+    parsed = make_url(url)
+    return TimedQueuePool if parsed.get_dialect().get_pool_class(parsed) is QueuePool else None
+
+
+def instrument_engine(engine: Engine):
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CONNECTIONS_IN_USE.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        DB_CONNECTIONS_IN_USE.dec()
+
+
+class HTTPMetricsMiddleware:
+    """
+    Request latency, status and response size per route template
+    ("/jobs/{upload_id}", not the URL), as a plain ASGI middleware so streamed
+    bodies are measured through their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def counting_send(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            # The router records the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if route not in _UNTIMED_ROUTES:
+                HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
+            HTTP_RESPONSE_BYTES.labels(route).observe(size)
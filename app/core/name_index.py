@@ -0,0 +1,249 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.external_models import Card, Issuer
+
+# Words that say nothing about which issuer or card a name means. A name made
+# only of them (e.g. "U.S. Bank") keeps all its words but its legal suffix.
+ISSUER_NOISE = frozenset({
+    "the", "of", "and", "bank", "na", "national", "association", "fsb", "inc", "corp", "corporation",
+    "company", "co", "llc", "ltd", "usa", "us", "financial", "services", "card", "cards",
+})
+CARD_NOISE = frozenset({"the", "credit", "card", "cards", "from", "visa", "mastercard", "signature"})
+LEGAL_SUFFIXES = frozenset({
+    "na", "national", "association", "fsb", "inc", "corp", "corporation", "company", "co", "llc", "ltd",
+})
+# Candidates (by shared trigrams) scored in full per lookup
+_CANDIDATES = 20
+_CACHE_MAX_ENTRIES = 50000
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase ASCII words: "Capital One®, N.A." -> "capital one na" """
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"[.'’]", "", text.replace("&", " and "))
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def name_tokens(name: str, noise: FrozenSet[str]) -> Tuple[str, ...]:
+    words = normalize_name(name).split()
+    return (
+        tuple(w for w in words if w not in noise)
+        or tuple(w for w in words if w not in LEGAL_SUFFIXES)
+        or tuple(words)
+    )
+
+
+def trigrams(tokens: Tuple[str, ...]) -> FrozenSet[str]:
+    padded = f" {' '.join(tokens)} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+class _Name:
+    """A name prepared for matching: its words, its trigrams and each word's trigrams"""
+
+    __slots__ = ("tokens", "grams", "word_grams")
+
+    def __init__(self, tokens: Tuple[str, ...]):
+        self.tokens = tokens
+        self.grams = trigrams(tokens)
+        self.word_grams = {t: trigrams((t,)) for t in tokens}
+
+
+def similarity(a: _Name, b: _Name) -> float:
+    """
+    0..1: the mean of trigram Dice over the whole name and of word overlap.
+
+    A word counts fully when both names have it and partly when a word of the
+    other name is spelled nearly alike (typos, OCR: "Pemier" ~ "Premier").
+    Overlap is taken relative to both the shorter and the longer name, so
+    "Chase" still scores well against "JPMorgan Chase" while "Gold Classic"
+    prefers "Gold Classic" over "Gold".
+    """
+    if not a.grams or not b.grams:
+        return 0.0
+    short, long = (a, b) if len(a.word_grams) <= len(b.word_grams) else (b, a)
+    matched = 0.0
+    for word, grams in short.word_grams.items():
+        if word in long.word_grams:
+            matched += 1
+        else:
+            near = max(_dice(grams, other) for other in long.word_grams.values())
+            matched += near if near >= 0.5 else 0.0
+    overlap = matched * (1 / len(short.word_grams) + 1 / len(long.word_grams)) / 2
+    return (_dice(a.grams, b.grams) + overlap) / 2
+
+
+class _Names:
+    """One set of names (all issuers, or one issuer's cards) with a trigram inverted index"""
+
+    def __init__(self, noise: FrozenSet[str]):
+        self.noise = noise
+        self.entries: Dict[int, _Name] = {}
+        self.exact: Dict[Tuple[str, ...], int] = {}
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+
+    def add(self, entry_id: int, name: str):
+        if entry_id in self.entries or not name:
+            return
+        entry = _Name(name_tokens(name, self.noise))
+        self.entries[entry_id] = entry
+        # The lowest id wins among names that normalize alike
+        self.exact.setdefault(entry.tokens, entry_id)
+        for gram in entry.grams:
+            self.postings[gram].append(entry_id)
+
+    def best(self, tokens: Tuple[str, ...], min_score: float) -> Optional[Tuple[int, float]]:
+        """(id, score) of the closest name scoring at least min_score, or None"""
+        exact = self.exact.get(tokens)
+        if exact is not None:
+            return exact, 1.0
+        query = _Name(tokens)
+        shared = Counter()
+        for gram in query.grams:
+            shared.update(self.postings.get(gram, ()))
+        best = None
+        # Ties broken by id, so a name resolves the same in every process
+        candidates = heapq.nsmallest(_CANDIDATES, shared.items(), key=lambda item: (-item[1], item[0]))
+        for entry_id, _ in candidates:
+            score = similarity(query, self.entries[entry_id])
+            if score >= min_score and (best is None or score > best[1] or (score == best[1] and entry_id < best[0])):
+                best = (entry_id, score)
+        return best
+
+
+class NameIndex:
+    """
+    Resolves extracted issuer and card names to issuers.issuer_id / cards.card_id.
+
+    Both tables are read once into memory and matched there, instead of a
+    LIKE '%name%' query per record that no index can serve. The issuer is
+    matched first, then the card among that issuer's cards only, with the
+    issuer's words dropped from the card name ("Chase Freedom" -> "freedom").
+
+    refresh() picks up rows added since the last load (by id) every
+    NAME_INDEX_REFRESH_SECONDS and reloads everything every
+    NAME_INDEX_RELOAD_SECONDS, for renames and deletes. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._checked_at: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        self.available = False
+        self._warned = False
+
+    def _reset(self):
+        self._issuers = _Names(ISSUER_NOISE)
+        self._cards: Dict[int, _Names] = defaultdict(lambda: _Names(CARD_NOISE))
+        self._max_issuer_id = 0
+        self._max_card_id = 0
+        self._cache: Dict[Tuple[str, str], Tuple[Optional[int], Optional[int]]] = {}
+
+    def refresh(self, db: Session, force: bool = False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < settings.NAME_INDEX_REFRESH_SECONDS:
+            return
+        self._checked_at = now
+        full = force or self._loaded_at is None or now - self._loaded_at >= settings.NAME_INDEX_RELOAD_SECONDS
+        after_issuer, after_card = (0, 0) if full else (self._max_issuer_id, self._max_card_id)
+        try:
+            issuers = db.execute(
+                select(Issuer.issuer_id, Issuer.name).where(Issuer.issuer_id > after_issuer).order_by(Issuer.issuer_id)
+            ).all()
+            cards = db.execute(
+                select(Card.card_id, Card.name, Card.issuer_id).where(Card.card_id > after_card).order_by(Card.card_id)
+            ).all()
+        except Exception as e:
+            db.rollback()
+            if not self._warned:
+                print(f"Card ID resolution unavailable, cannot read issuers/cards: {str(e).splitlines()[0]}")
+                self._warned = True
+            self.available = False
+            self._loaded_at = None
+            return
+        with self._lock:
+            if full:
+                self._reset()
+                self._loaded_at = now
+            for issuer_id, name in issuers:
+                self._issuers.add(issuer_id, name)
+                self._max_issuer_id = max(self._max_issuer_id, issuer_id)
+            for card_id, name, issuer_id in cards:
+                if issuer_id is not None:
+                    self._cards[issuer_id].add(card_id, name)
+                self._max_card_id = max(self._max_card_id, card_id)
+            if issuers or cards:
+                self._cache.clear()
+            self.available = True
+            self._warned = False
+        if full:
+            print(f"Loaded name index: {len(self._issuers.entries)} issuers, "
+                  f"{sum(len(c.entries) for c in self._cards.values())} cards")
+
+    def resolve(self, issuer_name: str, card_name: str) -> Tuple[Optional[int], Optional[int]]:
+        """(issuer_id, card_id); card_id is None when only the issuer matched, both when nothing did"""
+        if not issuer_name or issuer_name == "Not disclosed":
+            return None, None
+        key = (normalize_name(issuer_name), normalize_name(card_name or ""))
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                result = self._resolve(issuer_name, card_name or "")
+                if len(self._cache) >= _CACHE_MAX_ENTRIES:
+                    self._cache.clear()
+                self._cache[key] = result
+            return result
+
+    def _resolve(self, issuer_name: str, card_name: str) -> Tuple[Optional[int], Optional[int]]:
+        issuer_tokens = name_tokens(issuer_name, ISSUER_NOISE)
+        issuer = self._issuers.best(issuer_tokens, settings.NAME_MATCH_MIN_SCORE)
+        if issuer is None:
+            return None, None
+        issuer_id = issuer[0]
+        cards = self._cards.get(issuer_id)
+        if cards is None or not card_name:
+            return issuer_id, None
+        brand = set(issuer_tokens) | set(self._issuers.entries[issuer_id].tokens)
+        card_tokens = name_tokens(card_name, CARD_NOISE | brand)
+        card = cards.best(card_tokens, settings.NAME_MATCH_MIN_SCORE)
+        return issuer_id, card[0] if card else None
+
+    def resolve_records(self, db: Session, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Set issuer_id / card_id of extracted_cards records, in place; untouched while the tables can't be read.
+
+        A name that does not match keeps the record's existing ID (None if it has none).
+        """
+        self.refresh(db)
+        if not self.available:
+            return records
+        for record in records:
+            issuer_id, card_id = self.resolve(record.get("issuer"), record.get("card_name"))
+            record["issuer_id"] = issuer_id if issuer_id is not None else record.get("issuer_id")
+            record["card_id"] = card_id if card_id is not None else record.get("card_id")
+        return records
+
+
+_name_index: Optional[NameIndex] = None
+
+
+def get_name_index() -> NameIndex:
+    global _name_index
+    if _name_index is None:
+        _name_index = NameIndex()
+    return _name_index
@@ -0,0 +1,119 @@
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+
+# Numeric column -> (raw text columns it is read from, unit, statistic).
+#   min / max: lowest / highest go-to amount ("19.99%–29.99% variable")
+#   intro:     lowest introductory amount ("$0 intro, then $95")
+# Amounts in the other unit are ignored, so "5% (min $10)" is 5 for a % column.
+NUMERIC_COLUMNS: Dict[str, Tuple[Tuple[str, ...], str, str]] = {
+    "purchase_apr_min": (("min_apr", "max_apr"), "%", "min"),
+    "purchase_apr_max": (("min_apr", "max_apr"), "%", "max"),
+    "purchase_apr_intro": (("min_apr", "max_apr"), "%", "intro"),
+    "penalty_apr_max": (("penalty_apr",), "%", "max"),
+    "cash_advance_apr_min": (("cash_advance_apr",), "%", "min"),
+    "cash_advance_apr_max": (("cash_advance_apr",), "%", "max"),
+    "annual_fee_usd": (("annual_fee",), "$", "max"),
+    "annual_fee_intro_usd": (("annual_fee",), "$", "intro"),
+    "late_fee_usd": (("late_fee",), "$", "max"),
+    "foreign_txn_fee_pct": (("foreign_txn_fee",), "%", "max"),
+    "cash_advance_fee_pct": (("cash_advance_fee",), "%", "max"),
+    "balance_transfer_fee_pct": (("balance_transfer_fee",), "%", "max"),
+    "balance_transfer_fee_intro_pct": (("balance_transfer_fee",), "%", "intro"),
+    "min_interest_charge_usd": (("min_interest_charge",), "$", "max"),
+}
+RAW_COLUMNS = sorted({c for sources, _, _ in NUMERIC_COLUMNS.values() for c in sources})
+
+_AMOUNT = {
+    "%": r"(\d{1,3}(?:\.\d+)?)\s?%",
+    "$": r"\$\s?(\d[\d,]*(?:\.\d+)?)",
+}
+# "0% intro APR for 15 months, then 19.99%": clauses are judged one at a time.
+# ", " rather than "," so "$1,000" stays whole.
+_CLAUSE_BREAK = r";|,\s|\.\s|\bthen\b|\bthereafter\b"
+_INTRO = (
+    r"\bintro(?:ductory)?\b|\bpromotional\b|\bfirst year\b|\bfirst \d+ (?:months|billing cycles|days)\b"
+    r"|\bfor \d+ (?:months|billing cycles)\b|\bwithin \d+ days\b"
+)
+# "...$95 after that", "19.99% after the intro period" are the go-to amount
+_REGULAR = r"\bafter (?:that|the (?:intro(?:ductory)?|promotional) period|the first year)\b|\bongoing\b|\bstandard\b"
+# "$95 (waived the first year)": the amount is the go-to one and the intro amount is 0
+_WAIVED = r"\bwaived?\b"
+# "Prime + 14.74%", "14.74% above the Prime Rate": a margin over an index, not a rate
+_INDEX = r"(?:the\s+)?(?:(?:u\.?s\.?\s+)?prime(?:\s+rate)?|index|sofr|libor)"
+_INDEX_MARGIN = (
+    rf"\b{_INDEX}\s*(?:\+|plus)\s*\d{{1,3}}(?:\.\d+)?\s?%"
+    rf"|\b\d{{1,3}}(?:\.\d+)?\s?%\s*(?:\+|plus|above|over)\s*{_INDEX}\b"
+    r"|\bmargin of \d{1,3}(?:\.\d+)?\s?%"
+)
+# Cells that say there is no such fee/rate count as 0; "Not disclosed" stays NULL
+_NONE = r"^\s*(?:none|no\b.*\bfee|\$0(?:\.00)?|0(?:\.0+)?%)\s*$"
+
+
+def _parse_texts(texts: pd.Series, unit: str) -> pd.DataFrame:
+    """min / max / intro for every text of a series, without a Python loop per row"""
+    # Cells repeat a lot ("$0", "Not disclosed", the same APR range): parse each distinct text once
+    codes, distinct = pd.factorize(texts.fillna("").astype(str))
+    parsed = _parse_distinct(pd.Series(distinct, dtype="object"), unit)
+    return parsed.iloc[codes].set_axis(texts.index)
+
+
+def _parse_distinct(texts: pd.Series, unit: str) -> pd.DataFrame:
+    clauses = texts
+    if unit == "%":
+        # Index-relative rates have no APR of their own; "(currently 22.24%)" next to one still counts
+        clauses = clauses.str.replace(_INDEX_MARGIN, " ", case=False, regex=True)
+    clauses = clauses.str.split(_CLAUSE_BREAK, regex=True).explode()
+    rows = clauses.index.to_numpy()
+    clauses = pd.Series(clauses.to_numpy(), dtype="object").fillna("")
+    waived = clauses.str.contains(_WAIVED, case=False, regex=True)
+    intro = clauses.str.contains(_INTRO, case=False, regex=True) & ~clauses.str.contains(
+        _REGULAR, case=False, regex=True
+    ) & ~waived
+
+    found = clauses.str.extractall(_AMOUNT[unit])[0]
+    clause_ids = found.index.get_level_values(0).to_numpy().astype(int)
+    amounts = pd.DataFrame({
+        "row": rows[clause_ids],
+        "intro": intro.to_numpy()[clause_ids],
+        "value": pd.to_numeric(found.str.replace(",", "", regex=False).to_numpy(), errors="coerce"),
+    }).dropna(subset=["value"])
+
+    regular = amounts[~amounts["intro"]].groupby("row")["value"]
+    result = pd.DataFrame({
+        "min": regular.min(),
+        "max": regular.max(),
+        "intro": amounts[amounts["intro"]].groupby("row")["value"].min(),
+    }).reindex(texts.index)
+
+    waived_rows = pd.unique(rows[waived.to_numpy()])
+    result.loc[waived_rows, "intro"] = 0.0
+
+    none = texts.str.match(_NONE, case=False) & result.isna().all(axis=1)
+    result.loc[none, ["min", "max"]] = 0.0
+    return result.astype(float)
+
+
+def normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """NUMERIC_COLUMNS for a frame holding the raw text columns (float, NaN where unknown)"""
+    parsed = {}
+    result = pd.DataFrame(index=frame.index)
+    for column, (sources, unit, statistic) in NUMERIC_COLUMNS.items():
+        for source in sources:
+            if (source, unit) not in parsed:
+                parsed[source, unit] = _parse_texts(frame[source], unit)
+        # Several sources (min_apr, max_apr) hold parts of one range
+        values = pd.concat([parsed[source, unit][statistic] for source in sources], axis=1)
+        result[column] = values.max(axis=1) if statistic == "max" else values.min(axis=1)
+    return result
+
+
+def normalize_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add the NUMERIC_COLUMNS values to extracted_cards records, in place"""
+    if not records:
+        return records
+    frame = pd.DataFrame([{c: r.get(c) for c in RAW_COLUMNS} for r in records])
+    numeric = normalize_frame(frame).astype(object).where(lambda f: f.notna(), None)
+    for record, values in zip(records, numeric.to_dict("records")):
+        record.update(values)
+    return records
@@ -0,0 +1,138 @@
+import re
+from typing import Dict, List, Tuple, Union
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+from app.core.schumer import parse_schumer_box
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+# Terms that mark pricing pages: the Schumer box and the fee/rewards sections
+# that carry the fields in EXTRACTION_PROMPT. Weight reflects how specific a term is.
+PAGE_KEYWORDS = {
+    r"interest rates and interest charges": 8,
+    r"annual percentage rate": 5,
+    r"\bAPRs?\b": 3,
+    r"penalty APR": 4,
+    r"annual (membership )?fee": 4,
+    r"late (payment )?fee": 4,
+    r"foreign transaction": 4,
+    r"balance transfers?": 3,
+    r"cash advances?": 3,
+    r"minimum interest charge": 4,
+    r"fees": 1,
+    r"rewards?": 2,
+    r"cash ?back|points|miles": 1,
+    r"\d{1,2}\.\d{2}\s?%": 1,
+    r"\$\d+": 1,
+}
+_KEYWORD_PATTERNS = [(re.compile(p, re.IGNORECASE), w) for p, w in PAGE_KEYWORDS.items()]
+# Occurrences beyond this per keyword stop adding to a page's score
+_MAX_HITS_PER_KEYWORD = 5
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken encoding for the model, or None if tiktoken or its BPE file is unavailable"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                try:
+                    _encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # First use downloads the BPE file; without network, estimate instead
+                print(f"tiktoken unavailable, estimating token counts: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens for text (tiktoken when available, else ~4 characters per token)"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def open_pdf(source: Union[str, bytes]) -> "fitz.Document":
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def extract_pages(source: Union[str, bytes]) -> List[str]:
+    """Text of every page, from a PDF path or raw bytes"""
+    doc = open_pdf(source)
+    try:
+        return [page.get_text() for page in doc]
+    finally:
+        doc.close()
+
+
+def score_page(text: str) -> int:
+    return sum(min(len(pattern.findall(text)), _MAX_HITS_PER_KEYWORD) * weight for pattern, weight in _KEYWORD_PATTERNS)
+
+
+def select_pages(pages: List[str], token_budget: int) -> List[int]:
+    """
+    Indices of the pages to send, in document order.
+
+    The first page (issuer and card name) is always kept. Remaining pages are
+    taken by descending keyword score while they fit the token budget; pages
+    with no pricing keywords at all are never sent.
+    """
+    if not pages:
+        return []
+    tokens = [count_tokens(p) for p in pages]
+    chosen = [0]
+    used = tokens[0]
+    scores = [score_page(p) for p in pages]
+    ranked = sorted((i for i in range(1, len(pages)) if scores[i] > 0), key=lambda i: (-scores[i], i))
+    for i in ranked:
+        if used + tokens[i] > token_budget:
+            continue
+        chosen.append(i)
+        used += tokens[i]
+    return sorted(chosen)
+
+
+def truncate_to_tokens(text: str, token_budget: int) -> str:
+    if count_tokens(text) <= token_budget:
+        return text
+    # Cut proportionally, then trim until it fits
+    cut = max(1, int(len(text) * token_budget / count_tokens(text)))
+    while cut > 1 and count_tokens(text[:cut]) > token_budget:
+        cut = int(cut * 0.9)
+    return text[:cut]
+
+
+def build_prompt_text(pages: List[str], token_budget: int) -> str:
+    selected = select_pages(pages, token_budget)
+    parts = [f"--- Page {i + 1} ---\n{pages[i]}" for i in selected]
+    # A single oversized first page is the only way to exceed the budget
+    return truncate_to_tokens("\n".join(parts), token_budget)
+
+
+def prepare_document(source: Union[str, bytes]) -> Tuple[str, Dict[str, str]]:
+    """
+    (prompt text, Schumer box fields) from one pass over the PDF; runs in the PDF process pool.
+
+    The fields are whatever the deterministic parser resolved locally; the
+    prompt text is only sent to the LLM for the fields still missing.
+    """
+    doc = open_pdf(source)
+    try:
+        pages = [page.get_text() for page in doc]
+        fields = parse_schumer_box(doc, pages)
+    finally:
+        doc.close()
+    return build_prompt_text(pages, settings.PROMPT_TOKEN_BUDGET), fields
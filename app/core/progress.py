@@ -0,0 +1,419 @@
+import asyncio
+import json
+import threading
+import time
+from select import select as select_socket
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, text, update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import JobProgress
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def _ttl_for(state: Dict[str, Any]) -> int:
+    if state.get("status") in TERMINAL_STATUSES:
+        return settings.PROGRESS_TTL_SECONDS
+    return settings.PROGRESS_ACTIVE_TTL_SECONDS
+
+
+def _bump(state: Dict[str, Any]):
+    """Advance the event sequence number used as the SSE event id"""
+    state["seq"] = state.get("seq", 0) + 1
+
+
+def _merge(state: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+    """
+    Apply an update to a job state in place; False if it must be dropped.
+
+    A finished job only changes through another terminal write (or create()
+    when it is retried), so a late stats or monitor write cannot turn a
+    completed job back into a processing one.
+    """
+    if state.get("status") in TERMINAL_STATUSES and fields.get("status") not in TERMINAL_STATUSES:
+        return False
+    state.update(fields)
+    _bump(state)
+    return True
+
+
+class ProgressNotifier:
+    """
+    Wakes /progress streams in this process when a job's state changes.
+
+    publish() may be called from any thread (stores run in worker threads);
+    waiters live on the event loop and sleep on a per-job asyncio.Condition.
+    A stream subscribes for as long as it is open, so a change published
+    between two waits still bumps the version the next wait compares against.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._conditions: Dict[str, asyncio.Condition] = {}
+        self._subscribers: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}
+
+    def version(self, upload_id: str) -> int:
+        return self._versions.get(upload_id, 0)
+
+    def subscribe(self, upload_id: str):
+        """Start tracking changes of a job; call from the event loop, pair with unsubscribe()"""
+        self._loop = asyncio.get_running_loop()
+        if upload_id not in self._conditions:
+            self._conditions[upload_id] = asyncio.Condition()
+            self._versions[upload_id] = 0
+        self._subscribers[upload_id] = self._subscribers.get(upload_id, 0) + 1
+
+    def unsubscribe(self, upload_id: str):
+        self._subscribers[upload_id] -= 1
+        if not self._subscribers[upload_id]:
+            del self._subscribers[upload_id]
+            self._conditions.pop(upload_id, None)
+            self._versions.pop(upload_id, None)
+
+    def publish(self, upload_id: str):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return  # nobody in this process has subscribed yet
+        loop.call_soon_threadsafe(self._schedule_notify, upload_id)
+
+    def _schedule_notify(self, upload_id: str):
+        # Jobs without an open stream in this process have nobody to wake
+        if upload_id not in self._conditions:
+            return
+        # Bumped right away, on the loop: a stream reading the version after
+        # this point sees the change even if it is not waiting yet
+        self._versions[upload_id] += 1
+        asyncio.ensure_future(self._notify(upload_id))
+
+    async def _notify(self, upload_id: str):
+        condition = self._conditions.get(upload_id)
+        if condition is None:
+            return
+        async with condition:
+            condition.notify_all()
+
+    async def wait_for_change(self, upload_id: str, seen_version: int, timeout: float) -> bool:
+        """Sleep until the job changes after seen_version; False on timeout. Needs subscribe()"""
+        condition = self._conditions[upload_id]
+        try:
+            async with condition:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.version(upload_id) != seen_version),
+                    timeout,
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class ProgressStore:
+    """
+    Job-state backend behind /upload and /progress.
+
+    Every gunicorn worker talks to the same backend, so a progress stream can
+    land on any worker. Finished jobs expire after PROGRESS_TTL_SECONDS.
+    All methods are blocking; call them via asyncio.to_thread from async code.
+
+    Every write bumps state["seq"] and wakes waiting streams through
+    ``notifier``. Backends that cannot push to other workers set
+    ``pushes_across_workers = False`` and streams fall back to a slow poll.
+    """
+
+    pushes_across_workers = False
+
+    def __init__(self):
+        self.notifier = ProgressNotifier()
+
+    def _changed(self, upload_id: str):
+        self.notifier.publish(upload_id)
+
+    def start_listening(self):
+        """Start receiving change events from other workers, if supported"""
+
+    def create(self, upload_id: str, state: Dict[str, Any]):
+        raise NotImplementedError
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, upload_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Merge fields into the job state and return the new state (None if unknown).
+
+        Must be atomic: a job's stats, monitor and failure paths write concurrently.
+        """
+        raise NotImplementedError
+
+    def cleanup(self) -> int:
+        """Remove expired jobs, returning how many were dropped"""
+        return 0
+
+
+class MemoryProgressStore(ProgressStore):
+    """Per-process store; only correct with a single worker"""
+
+    pushes_across_workers = True
+
+    def __init__(self):
+        super().__init__()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, upload_id, state):
+        with self._lock:
+            self._jobs[upload_id] = dict(state)
+            _bump(self._jobs[upload_id])
+            self._expires[upload_id] = time.time() + _ttl_for(state)
+        self._changed(upload_id)
+
+    def get(self, upload_id):
+        with self._lock:
+            if self._expires.get(upload_id, 0) < time.time():
+                return None
+            state = self._jobs.get(upload_id)
+            return dict(state) if state is not None else None
+
+    def update(self, upload_id, fields):
+        with self._lock:
+            state = self._jobs.get(upload_id)
+            if state is None:
+                return None
+            if not _merge(state, fields):
+                return dict(state)
+            self._expires[upload_id] = time.time() + _ttl_for(state)
+            state = dict(state)
+        self._changed(upload_id)
+        return state
+
+    def cleanup(self):
+        now = time.time()
+        with self._lock:
+            expired = [upload_id for upload_id, at in self._expires.items() if at < now]
+            for upload_id in expired:
+                self._jobs.pop(upload_id, None)
+                self._expires.pop(upload_id, None)
+        return len(expired)
+
+
+class DatabaseProgressStore(ProgressStore):
+    """
+    Stores job state in the job_progress table; reads are a primary-key lookup.
+
+    On PostgreSQL each write also sends a NOTIFY on CHANNEL in its transaction
+    and start_listening() LISTENs for it, so streams on every worker wake as
+    soon as a job changes. Other databases fall back to PROGRESS_POLL_SECONDS.
+    """
+
+    CHANNEL = "finprintiq_progress"
+    # Drivers whose connections can wait for notifications (psycopg 3 or psycopg2)
+    LISTEN_DRIVERS = ("psycopg", "psycopg2")
+
+    def __init__(self):
+        super().__init__()
+        dialect = SessionLocal.kw["bind"].dialect
+        self._notifies = dialect.name == "postgresql" and dialect.driver in self.LISTEN_DRIVERS
+        self.pushes_across_workers = self._notifies
+        self._listener: Optional[threading.Thread] = None
+
+    def _notify(self, db, upload_id: str):
+        if self._notifies:
+            db.execute(text("SELECT pg_notify(:channel, :upload_id)"), {"channel": self.CHANNEL, "upload_id": upload_id})
+
+    def _changed(self, upload_id):
+        # With NOTIFY the change reaches this worker through start_listening() too
+        if not self._notifies:
+            super()._changed(upload_id)
+
+    def start_listening(self):
+        if not self._notifies or self._listener is not None:
+            return
+
+        def listen():
+            while True:
+                try:
+                    self._listen()
+                except Exception as e:
+                    print(f"Progress LISTEN connection failed, reconnecting: {e}")
+                time.sleep(settings.PROGRESS_POLL_SECONDS)
+
+        self._listener = threading.Thread(target=listen, name="progress-events", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        # A dedicated connection, detached from the pool since it is held forever
+        connection = SessionLocal.kw["bind"].raw_connection()
+        connection.detach()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            dbapi_connection.cursor().execute(f"LISTEN {self.CHANNEL}")
+            if callable(dbapi_connection.notifies):
+                # psycopg 3: a generator that blocks until the next notification
+                for notification in dbapi_connection.notifies():
+                    self.notifier.publish(notification.payload)
+                return
+            # psycopg2: wait for the socket to become readable, then collect them
+            while True:
+                if select_socket([dbapi_connection], [], [], 60) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    self.notifier.publish(dbapi_connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+    def create(self, upload_id, state):
+        state = dict(state)
+        _bump(state)
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.merge(JobProgress(
+                upload_id=upload_id,
+                state=json.dumps(state),
+                updated_at=now,
+                expires_at=now + timedelta(seconds=_ttl_for(state)),
+            ))
+            self._notify(db, upload_id)
+            db.commit()
+        finally:
+            db.close()
+        self._changed(upload_id)
+
+    def get(self, upload_id):
+        db = SessionLocal()
+        try:
+            row = db.get(JobProgress, upload_id)
+            if row is None or row.expires_at < datetime.utcnow():
+                return None
+            return json.loads(row.state)
+        finally:
+            db.close()
+
+    def update(self, upload_id, fields):
+        db = SessionLocal()
+        try:
+            # Compare-and-swap on the stored JSON: seq changes on every write, so
+            # the text never repeats and a concurrent writer makes the UPDATE miss
+            while True:
+                old = db.execute(select(JobProgress.state).where(JobProgress.upload_id == upload_id)).scalar()
+                if old is None:
+                    return None
+                state = json.loads(old)
+                if not _merge(state, fields):
+                    return state
+                now = datetime.utcnow()
+                swapped = db.execute(
+                    update(JobProgress)
+                    .where(JobProgress.upload_id == upload_id, JobProgress.state == old)
+                    .values(
+                        state=json.dumps(state),
+                        updated_at=now,
+                        expires_at=now + timedelta(seconds=_ttl_for(state)),
+                    )
+                ).rowcount
+                if swapped:
+                    self._notify(db, upload_id)
+                db.commit()
+                if swapped:
+                    break
+        finally:
+            db.close()
+        self._changed(upload_id)
+        return state
+
+    def cleanup(self):
+        db = SessionLocal()
+        try:
+            removed = db.query(JobProgress).filter(JobProgress.expires_at < datetime.utcnow()).delete(
+                synchronize_session=False
+            )
+            db.commit()
+            return removed
+        finally:
+            db.close()
+
+
+class RedisProgressStore(ProgressStore):
+    """Optional Redis backend; expiry is handled by Redis key TTLs"""
+
+    KEY_PREFIX = "finprintiq:progress:"
+    CHANNEL = "finprintiq:progress-events"
+    pushes_across_workers = True
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PROGRESS_BACKEND=redis requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self._watch_error = redis.WatchError
+        self._listener: Optional[threading.Thread] = None
+
+    def _changed(self, upload_id):
+        # Delivered to every worker, this one included, by start_listening()
+        self._redis.publish(self.CHANNEL, upload_id)
+
+    def start_listening(self):
+        if self._listener is not None:
+            return
+
+        def listen():
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.CHANNEL)
+            for message in pubsub.listen():
+                self.notifier.publish(message["data"].decode("utf-8"))
+
+        self._listener = threading.Thread(target=listen, name="progress-events", daemon=True)
+        self._listener.start()
+
+    def _key(self, upload_id: str) -> str:
+        return self.KEY_PREFIX + upload_id
+
+    def create(self, upload_id, state):
+        state = dict(state)
+        _bump(state)
+        self._redis.set(self._key(upload_id), json.dumps(state), ex=_ttl_for(state))
+        self._changed(upload_id)
+
+    def get(self, upload_id):
+        raw = self._redis.get(self._key(upload_id))
+        return json.loads(raw) if raw is not None else None
+
+    def update(self, upload_id, fields):
+        key = self._key(upload_id)
+        with self._redis.pipeline() as pipe:
+            # WATCH/MULTI: the SET is discarded and retried if another writer got in first
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is None:
+                        return None
+                    state = json.loads(raw)
+                    if not _merge(state, fields):
+                        return state
+                    pipe.multi()
+                    pipe.set(key, json.dumps(state), ex=_ttl_for(state))
+                    pipe.execute()
+                    break
+                except self._watch_error:
+                    continue
+        self._changed(upload_id)
+        return state
+
+
+def get_progress_store() -> ProgressStore:
+    backend = settings.PROGRESS_BACKEND.lower()
+    if backend == "redis":
+        return RedisProgressStore(settings.REDIS_URL)
+    if backend == "memory":
+        return MemoryProgressStore()
+    return DatabaseProgressStore()
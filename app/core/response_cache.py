@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, or None for identity"""
+    offered = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def compress_bytes(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a chunked body on the fly without buffering it"""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+class CachedResponse:
+    def __init__(self, version: str, body: bytes, headers: Dict[str, str]):
+        self.version = version
+        self.body = body
+        self.headers = headers
+        self._encoded: Dict[Optional[str], bytes] = {None: body}
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """Body in the requested encoding, compressed once and then reused"""
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress_bytes(self.body, encoding)
+        return self._encoded[encoding]
+
+    @property
+    def size(self) -> int:
+        return sum(len(b) for b in self._encoded.values())
+
+
+class ResponseCache:
+    """
+    LRU of serialized /data payloads keyed by request shape.
+
+    Each entry remembers the data_version() of its (quarter, year) slice and
+    is only served while that version still matches. Writes from any worker
+    change the version, so a per-process cache stays correct across
+    gunicorn workers; invalidate() just frees memory early after ingestion.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, version: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, entry: CachedResponse):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, quarter: str = "", year: int = 0):
+        """Drop entries whose slice contains (quarter, year); keys start with (quarter, year)"""
+        with self._lock:
+            for key in list(self._entries):
+                key_quarter, key_year = key[0], key[1]
+                if key_quarter in ("", quarter) and key_year in (0, year):
+                    self._remove(key)
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+
+def make_etag(version: str, key: Tuple[Any, ...]) -> str:
+    return '"' + hashlib.sha1(f"{version}:{key!r}".encode("utf-8")).hexdigest()[:20] + '"'
+
+
+data_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,206 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+# Bump when the rules change: it is part of the extraction cache key
+PARSER_VERSION = "1"
+
+# Schumer box row labels -> the EXTRACTION_PROMPT field they fill.
+# Order matters: APR rows are matched before the fee rows that share words with them.
+ROW_RULES: List[Tuple[str, "re.Pattern", Optional[str]]] = [
+    ("purchase_apr", re.compile(r"(annual percentage rate|APR)\b.*\bpurchases?", re.I), "percent_range"),
+    ("penalty_apr", re.compile(r"penalty\s+APR", re.I), "percent"),
+    ("cash_advance_apr", re.compile(r"APR\b.*\bcash\s+advances?|cash\s+advance\s+APR", re.I), "percent"),
+    ("balance_transfer_apr", re.compile(r"APR\b.*\bbalance\s+transfers?|balance\s+transfer\s+APR", re.I), None),
+    ("annual_fee", re.compile(r"annual\s+(membership\s+)?fee", re.I), "dollar"),
+    ("late_fee", re.compile(r"late\s+(payment|fee)", re.I), "dollar"),
+    ("foreign_txn_fee", re.compile(r"foreign\s+(transaction|purchase)", re.I), "fee"),
+    ("cash_advance_fee", re.compile(r"^\W*cash\s+advances?\b", re.I), "fee"),
+    ("balance_transfer_fee", re.compile(r"^\W*balance\s+transfers?\b", re.I), "fee"),
+    ("min_interest_charge", re.compile(r"minimum\s+interest\s+charge", re.I), "dollar"),
+]
+
+# Parser key -> EXTRACTION_PROMPT field name
+FIELD_NAMES = {
+    "min_apr": "Min APR (%)",
+    "max_apr": "Max APR (%)",
+    "penalty_apr": "Penalty APR (%)",
+    "cash_advance_apr": "Cash Advance APR (%)",
+    "annual_fee": "Annual Fee ($)",
+    "late_fee": "Late Fee ($)",
+    "foreign_txn_fee": "Foreign Transaction Fee (%)",
+    "cash_advance_fee": "Cash Advance Fee (%)",
+    "balance_transfer_fee": "Balance Transfer Fee (%)",
+    "min_interest_charge": "Minimum Interest Charge ($)",
+}
+
+BOX_HEADING = re.compile(r"interest\s+rates\s+and\s+interest\s+charges|annual\s+percentage\s+rate", re.I)
+_PERCENT = re.compile(r"(\d{1,2}(?:\.\d{1,2})?)\s?%")
+_DOLLAR = re.compile(r"\$\s?(\d{1,4}(?:\.\d{2})?)")
+_NONE = re.compile(r"\b(none|not applicable|n/a)\b|\$0\b", re.I)
+_BULLET = re.compile(r"\s*[\u2022\u25cf\u25aa]\s*")
+# "0% intro APR for 15 months ... after that, 19.99% to 29.99%": only the go-to rate counts
+_AFTER_INTRO = re.compile(r"\b(after that|then|thereafter)\b", re.I)
+# Words within this many points vertically are on the same visual line
+_LINE_TOLERANCE = 3.0
+_MAX_WRAPPED_LINES = 3
+
+
+def _format_number(value: str) -> str:
+    return value.rstrip("0").rstrip(".") if "." in value else value
+
+
+def _percent(value: str) -> str:
+    return f"{_format_number(value)}%"
+
+
+def parse_value(kind: str, text: str) -> Optional[str]:
+    """Normalize one Schumer box cell; None when the cell holds nothing recognizable"""
+    text = " ".join(text.split())
+    if not text:
+        return None
+    if kind in ("dollar", "fee"):
+        amounts = [a for a in _DOLLAR.findall(text) if float(a) > 0]
+        percents = [p for p in _PERCENT.findall(text) if float(p) > 0]
+        if not amounts and not percents:
+            return "None" if _NONE.search(text) else None
+    if kind == "dollar":
+        return f"${_format_number(max(amounts, key=float))}" if amounts else None
+    if kind == "fee":
+        if percents and amounts:
+            return f"{_percent(percents[0])} (min ${_format_number(amounts[0])})"
+        if percents:
+            return _percent(percents[0])
+        return f"${_format_number(amounts[0])}" if amounts else None
+    if kind in ("percent", "percent_range"):
+        if kind == "percent_range" and re.search(r"\bintro", text, re.I):
+            parts = _AFTER_INTRO.split(text, maxsplit=1)
+            if len(parts) > 1:
+                text = parts[-1]
+        percents = [float(p) for p in _PERCENT.findall(text)]
+        if not percents:
+            return None
+        if kind == "percent":
+            return _percent(str(max(percents)))
+        return [_percent(str(min(percents))), _percent(str(max(percents)))]
+    return None
+
+
+def _table_rows(page: "fitz.Page") -> List[Tuple[str, str]]:
+    """(label, value) rows from ruled tables PyMuPDF can detect"""
+    rows = []
+    try:
+        tables = page.find_tables().tables
+    except Exception:  # find_tables needs PyMuPDF >= 1.23 and can fail on odd drawings
+        return rows
+    for table in tables:
+        for cells in table.extract():
+            cells = [c for c in cells if c and c.strip()]
+            if len(cells) < 2:
+                continue
+            label, value = cells[0], " ".join(cells[1:])
+            # "Transaction Fees • Balance Transfer • Cash Advance" next to one bulleted
+            # value per item: pair them up instead of reading one merged row
+            labels, values = _BULLET.split(label), _BULLET.split(value)
+            if len(labels) > 2 and len(values) == len(labels):
+                rows.extend(zip(labels[1:], values[1:]))
+            elif len(labels) > 1 and len(values) == len(labels) - 1:
+                rows.extend(zip(labels[1:], values))
+            else:
+                rows.append((label, value))
+    return rows
+
+
+def _line_rows(page: "fitz.Page") -> List[Tuple[str, str]]:
+    """
+    (label, value) rows rebuilt from word positions, for boxes drawn without rules.
+
+    Words are grouped into visual lines; a line is split into label and value at
+    the widest horizontal gap, which in a two-column box is the column gutter.
+    """
+    words = sorted(page.get_text("words"), key=lambda w: (round(w[3]), w[0]))
+    lines: List[List[tuple]] = []
+    for word in words:
+        if lines and abs(lines[-1][0][3] - word[3]) <= _LINE_TOLERANCE:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+
+    rows = []
+    for line in lines:
+        line.sort(key=lambda w: w[0])
+        if len(line) < 2:
+            rows.append((line[0][4], ""))
+            continue
+        gaps = [(line[i + 1][0] - line[i][2], i) for i in range(len(line) - 1)]
+        _, split = max(gaps)
+        rows.append((" ".join(w[4] for w in line[:split + 1]), " ".join(w[4] for w in line[split + 1:])))
+    return rows
+
+
+def _rule_for(label: str):
+    for rule in ROW_RULES:
+        if rule[1].search(label):
+            return rule  # first matching rule owns the row
+    return None
+
+
+def _match_rows(rows: List[Tuple[str, str]], fields: Dict[str, str], wrapped: bool = False):
+    """
+    Apply ROW_RULES to (label, value) rows.
+
+    With ``wrapped`` (rows rebuilt from visual lines), a label that matches
+    nothing is retried joined with the next row's label, and the rows after a
+    match that start no rule of their own are taken as its wrapped value text.
+    Table cells already hold whole rows, so neither applies to them.
+    """
+    for i, (label, value) in enumerate(rows):
+        rule = _rule_for(label)
+        start = i + 1
+        if rule is None and wrapped and start < len(rows):
+            rule = _rule_for(f"{label} {rows[start][0]}")
+            if rule is not None:
+                value = f"{value} {rows[start][1]}"
+                start += 1
+        if rule is None:
+            continue
+        name, _, kind = rule
+        for j in range(start, min(len(rows), start + (_MAX_WRAPPED_LINES if wrapped else 0))):
+            next_label, next_value = rows[j]
+            if _rule_for(next_label) is not None:
+                break
+            if j + 1 < len(rows) and _rule_for(f"{next_label} {rows[j + 1][0]}") is not None:
+                break
+            value = f"{value} {next_label} {next_value}"
+        if kind is None:
+            continue
+        parsed = parse_value(kind, value)
+        if parsed is None:
+            continue
+        if name == "purchase_apr":
+            fields.setdefault("min_apr", parsed[0])
+            fields.setdefault("max_apr", parsed[1])
+        else:
+            fields.setdefault(name, parsed)
+
+
+def parse_schumer_box(doc: "fitz.Document", page_texts: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Numeric pricing fields read from the Schumer box, keyed like EXTRACTION_PROMPT.
+
+    Only pages that look like the box are parsed. Ruled tables (find_tables) are
+    tried first, then rows rebuilt from word positions. Fields that no rule
+    matched are left out so the caller can send just those to the LLM.
+    """
+    found: Dict[str, str] = {}
+    for number, page in enumerate(doc):
+        text = page_texts[number] if page_texts is not None else page.get_text()
+        if not BOX_HEADING.search(text):
+            continue
+        _match_rows(_table_rows(page), found)
+        if len(found) < len(FIELD_NAMES):
+            _match_rows(_line_rows(page), found, wrapped=True)
+        if len(found) == len(FIELD_NAMES):
+            break
+    return {FIELD_NAMES[k]: v for k, v in found.items() if k in FIELD_NAMES}
@@ -0,0 +1,186 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.db.models import ExtractedCard
+
+# Numeric column (app.core.normalize) -> (weight, value worth 100, value worth 0), linear in between.
+# base_score is the weighted mean over the columns a row discloses.
+SCORE_COMPONENTS: Dict[str, Tuple[float, float, float]] = {
+    "purchase_apr_min": (25, 10.0, 35.0),
+    "purchase_apr_max": (15, 15.0, 36.0),
+    "annual_fee_usd": (20, 0.0, 550.0),
+    "cash_advance_apr_max": (5, 20.0, 36.0),
+    "penalty_apr_max": (5, 0.0, 30.0),
+    "late_fee_usd": (5, 0.0, 41.0),
+    "foreign_txn_fee_pct": (10, 0.0, 3.0),
+    "balance_transfer_fee_pct": (10, 0.0, 6.0),
+    "cash_advance_fee_pct": (5, 0.0, 6.0),
+}
+# Quarters of history behind trend_bonus and volatility_score
+TREND_WINDOW = 4
+# trend_bonus: this share of the gap to the previous quarters' mean, capped either way
+TREND_WEIGHT = 0.5
+TREND_MAX = 10
+# volatility_score: std dev of base_score over the window; the penalty is a share of it
+VOLATILITY_WEIGHT = 0.5
+VOLATILITY_PENALTY_MAX = 15
+GRADES = [(80, "A"), (65, "B"), (50, "C"), (35, "D"), (0, "F")]
+
+SCORE_COLUMNS = ["base_score", "trend_bonus", "volatility_score", "volatility_penalty", "final_score", "grade"]
+QUARTER_NUMBERS = {"Q1": 0, "Q2": 1, "Q3": 2, "Q4": 3}
+_NO_CARD = {"", "Not disclosed"}
+# Up to this many cards are looked up by key; more are filtered after one scan
+_KEYS_IN_QUERY = 500
+
+
+def period_of(quarter: str, year: int) -> int:
+    """Consecutive quarters get consecutive periods"""
+    return year * 4 + QUARTER_NUMBERS[quarter]
+
+
+def base_scores(frame: pd.DataFrame) -> pd.Series:
+    weighted = pd.Series(0.0, index=frame.index)
+    weights = pd.Series(0.0, index=frame.index)
+    for column, (weight, best, worst) in SCORE_COMPONENTS.items():
+        values = frame[column].astype(float)
+        score = ((worst - values) / (worst - best)).clip(0, 1) * 100
+        known = values.notna()
+        weighted += score.where(known, 0.0) * weight
+        weights += known * weight
+    return (weighted / weights.where(weights > 0)).round()
+
+
+def compute_scores(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Every SCORE_COLUMNS value for the rows of ``frame``, indexed like it.
+
+    ``frame`` needs id, issuer, card_name, quarter, year and the
+    SCORE_COMPONENTS columns. Cards are (issuer, card_name); trend and
+    volatility look at up to TREND_WINDOW earlier quarters of the same card
+    present in the frame, so it must hold that much history for the rows
+    whose scores are wanted. All of it runs as column operations: a groupby
+    shift per window step, no loop over cards or rows.
+    """
+    result = pd.DataFrame(index=frame.index)
+    base = base_scores(frame)
+    result["base_score"] = base
+
+    period = frame["year"] * 4 + frame["quarter"].map(QUARTER_NUMBERS)
+    card = frame.groupby(["issuer", "card_name"], sort=False, dropna=False).ngroup()
+    has_card = frame["issuer"].notna() & frame["card_name"].notna() & ~frame["card_name"].isin(_NO_CARD)
+    history = pd.DataFrame({"card": card, "period": period, "id": frame["id"], "base": base})
+    history = history[has_card & period.notna() & base.notna()]
+    # One observation per card and quarter: the latest extraction
+    history = history.sort_values(["card", "period", "id"]).drop_duplicates(["card", "period"], keep="last")
+
+    by_card = history.groupby("card", sort=False)
+    previous = []
+    for step in range(1, TREND_WINDOW + 1):
+        earlier = by_card["base"].shift(step)
+        gap = history["period"] - by_card["period"].shift(step)
+        # Quarters a card skipped still count towards the window
+        previous.append(earlier.where(gap <= TREND_WINDOW))
+    previous = pd.concat(previous, axis=1)
+
+    trend = (TREND_WEIGHT * (history["base"] - previous.mean(axis=1))).round().clip(-TREND_MAX, TREND_MAX)
+    window = pd.concat([history["base"], previous.iloc[:, :TREND_WINDOW - 1]], axis=1)
+    volatility = window.std(axis=1, ddof=0).where(window.notna().sum(axis=1) >= 2).round()
+    history["trend_bonus"] = trend.fillna(0)
+    history["volatility_score"] = volatility.fillna(0)
+
+    # Back onto every row of that card and quarter
+    looked_up = pd.DataFrame({"card": card, "period": period}).merge(
+        history[["card", "period", "trend_bonus", "volatility_score"]], on=["card", "period"], how="left"
+    )
+    looked_up.index = frame.index
+    has_base = base.notna()
+    result["trend_bonus"] = looked_up["trend_bonus"].fillna(0).where(has_base)
+    result["volatility_score"] = looked_up["volatility_score"].fillna(0).where(has_base)
+    result["volatility_penalty"] = (VOLATILITY_WEIGHT * result["volatility_score"]).round().clip(
+        upper=VOLATILITY_PENALTY_MAX
+    )
+    final = (base + result["trend_bonus"] - result["volatility_penalty"]).clip(0, 100)
+    result["final_score"] = final
+    thresholds = [final >= floor for floor, _ in GRADES]
+    result["grade"] = pd.Series(np.select(thresholds, [g for _, g in GRADES], default=""), index=frame.index)
+    result["grade"] = result["grade"].where(final.notna())
+    return result
+
+
+def load_cards(db: Session, keys: Optional[Iterable[Tuple[str, str]]] = None, since: Optional[int] = None) -> pd.DataFrame:
+    """Rows of the given (issuer, card_name) cards (all cards if None) from period ``since`` minus the window on"""
+    columns = ["id", "issuer", "card_name", "quarter", "year", *SCORE_COMPONENTS, *SCORE_COLUMNS]
+    stmt = select(*(getattr(ExtractedCard, c) for c in columns))
+    if since is not None:
+        stmt = stmt.where(ExtractedCard.year >= (since - TREND_WINDOW) // 4)
+    keys = None if keys is None else list(keys)
+    if keys is not None and len(keys) <= _KEYS_IN_QUERY:
+        stmt = stmt.where(tuple_(ExtractedCard.issuer, ExtractedCard.card_name).in_(keys))
+    frame = pd.DataFrame(db.execute(stmt).all(), columns=columns)
+    if keys is not None and len(keys) > _KEYS_IN_QUERY:
+        # A whole quarter's worth of cards: one range scan beats thousands of lookups
+        frame = frame[pd.MultiIndex.from_frame(frame[["issuer", "card_name"]]).isin(keys)].reset_index(drop=True)
+    if since is not None:
+        period = frame["year"] * 4 + frame["quarter"].map(QUARTER_NUMBERS)
+        frame = frame[period >= since - TREND_WINDOW].reset_index(drop=True)
+    return frame
+
+
+def changed_rows(frame: pd.DataFrame, scores: pd.DataFrame) -> List[Dict[str, Any]]:
+    """{"id", score columns} for rows whose stored scores differ from ``scores``"""
+    differs = frame["grade"].fillna("").ne(scores["grade"].fillna(""))
+    for column in SCORE_COLUMNS[:-1]:
+        differs |= frame[column].astype(float).fillna(-1).ne(scores[column].fillna(-1))
+    # Integer columns: Int64 -> object gives Python ints (and None), which every driver binds
+    rows = scores[differs].astype({c: "Int64" for c in SCORE_COLUMNS[:-1]}).astype(object)
+    rows = rows.where(rows.notna(), None)
+    rows.insert(0, "id", frame.loc[differs, "id"].astype(int).astype(object))
+    return rows.to_dict("records")
+
+
+def score_cards(
+    db: Session,
+    keys: Optional[Iterable[Tuple[str, str]]] = None,
+    since: Optional[int] = None,
+    chunk_size: int = 5000,
+) -> Dict[str, int]:
+    """
+    Recompute scores and write back the rows that changed.
+
+    keys limits it to those (issuer, card_name) cards, since (a period_of())
+    to quarters from there on: after ingesting one quarter only its cards,
+    from that quarter on, can change. Updates are bulk UPDATEs by primary key,
+    committed every chunk_size rows. Returns row counts.
+    """
+    frame = load_cards(db, keys, since)
+    if frame.empty:
+        return {"rows": 0, "updated": 0}
+    scores = compute_scores(frame)
+    if since is not None:
+        period = frame["year"] * 4 + frame["quarter"].map(QUARTER_NUMBERS)
+        in_scope = period >= since
+        frame, scores = frame[in_scope], scores[in_scope]
+    rows = changed_rows(frame, scores)
+    for start in range(0, len(rows), chunk_size):
+        db.execute(update(ExtractedCard), rows[start:start + chunk_size])
+        db.commit()
+    return {"rows": len(frame), "updated": len(rows)}
+
+
+def card_keys(records: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Distinct (issuer, card_name) of extracted_cards records, for score_cards"""
+    return list({(r["issuer"], r["card_name"]) for r in records if r.get("issuer") and r.get("card_name")})
+
+
+def rescore_written(db: Session, records: List[Dict[str, Any]], quarter: str, year: int):
+    """score_cards for the cards of freshly written records; a scoring problem never fails ingestion"""
+    try:
+        result = score_cards(db, card_keys(records), since=period_of(quarter, year))
+        print(f"Rescored cards: {result['updated']} of {result['rows']} rows changed")
+    except Exception as e:
+        db.rollback()
+        print(f"Error scoring cards: {str(e)}")
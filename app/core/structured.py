@@ -0,0 +1,166 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pydantic import StrictStr, TypeAdapter, ValidationError
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib parser is only slower
+    orjson = None
+
+# What a field may hold: a string, or a list/object that clean_field() flattens
+FieldValue = Union[StrictStr, List[StrictStr], Dict[str, Any]]
+_field_value = TypeAdapter(FieldValue)
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def field_schema(fields: List[str], descriptions: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Strict JSON schema for one document: every field required, a string each"""
+    descriptions = descriptions or {}
+    properties = {}
+    for field in fields:
+        properties[field] = {"type": "string"}
+        if field in descriptions:
+            properties[field]["description"] = descriptions[field]
+    return {"type": "object", "properties": properties, "required": list(fields), "additionalProperties": False}
+
+
+def response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAI structured-output response_format for a schema"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def _loads(text: str) -> Any:
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def _close_truncated(text: str) -> str:
+    """Close strings/objects/arrays left open by a cut-off answer, dropping a dangling key"""
+    stack = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        # A value cut off mid-string is unreliable: drop the pair so it is re-asked
+        dropped = re.sub(r'([{,])\s*"[^"]*"\s*:\s*"(?:[^"\\]|\\.)*$', r"\1", text)
+        text = dropped if dropped != text else text + '"'
+    # A key cut off before (or right after) its colon has no value to keep
+    text = re.sub(r',?\s*"[^"]*"\s*:\s*$', "", text)
+    if stack and stack[-1] == "}":
+        text = re.sub(r'([{,])\s*"[^"]*"\s*$', r"\1", text)
+    text = re.sub(r",\s*$", "", text)
+    return text + "".join(reversed(stack))
+
+
+def repair_candidates(content: str):
+    """Progressively more invasive fixes for answers that are not valid JSON as sent"""
+    text = (content or "").strip()
+    yield text
+    text = _FENCE.sub("", text).strip()
+    if text.lower().startswith("json"):
+        text = text[4:].strip()
+    yield text
+    start = text.find("{")
+    if start > 0:
+        text = text[start:]
+    # Prose after the object, then the usual hand-written JSON slips
+    end = text.rfind("}")
+    cut = text[:end + 1] if end >= 0 else text
+    yield cut
+    yield _TRAILING_COMMA.sub(r"\1", cut.translate(_SMART_QUOTES))
+    # An answer cut off mid-object (max tokens, dropped connection)
+    yield _close_truncated(_TRAILING_COMMA.sub(r"\1", text.translate(_SMART_QUOTES)))
+
+
+def load_json(content: str) -> Tuple[Any, int]:
+    """
+    Parse an answer, trying cheap repairs before giving up.
+
+    Returns (value, repairs): 0 for clean JSON, higher the more invasive the
+    fix that worked. Raises ValueError if nothing parses.
+    """
+    last_error: Optional[Exception] = None
+    seen = set()
+    for repairs, candidate in enumerate(repair_candidates(content)):
+        if candidate in seen:
+            continue
+        seen.add(candidate)
+        try:
+            return _loads(candidate), repairs
+        except ValueError as e:  # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+            last_error = e
+    raise ValueError(f"Unparseable JSON answer: {last_error}")
+
+
+def salvage_fields(content: str, fields: List[str]) -> Dict[str, str]:
+    """Last resort for answers no repair could parse: pick out "Field": "value" pairs"""
+    found = {}
+    for field in fields:
+        match = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % re.escape(field), content or "")
+        if match:
+            try:
+                found[field] = json.loads(f'"{match.group(1)}"')
+            except ValueError:
+                continue
+    return found
+
+
+def _coerce_scalar(value: Any) -> Any:
+    """null -> "Not disclosed", numbers -> text ("Annual Fee": 95); what free-form answers send"""
+    if value is None:
+        return "Not disclosed"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+
+def validate_fields(value: Any, fields: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Split a parsed answer into (valid field values, fields that are missing or malformed).
+
+    Nulls and bare numbers are repaired here rather than re-asked: they carry
+    the answer, just not as the string the schema wants.
+    """
+    if not isinstance(value, dict):
+        return {}, list(fields)
+    valid = {}
+    failed = []
+    for field in fields:
+        try:
+            valid[field] = _field_value.validate_python(_coerce_scalar(value[field]))
+        except (KeyError, ValidationError):
+            failed.append(field)
+    return valid, failed
+
+
+def parse_fields(content: str, fields: List[str]) -> Tuple[Dict[str, Any], List[str], int]:
+    """
+    (valid values, failed fields, repairs) for a single-document answer.
+
+    Never raises: an unparseable answer yields whatever salvage_fields finds
+    and lists the rest as failed, so the caller can re-ask for just those.
+    It only counts as repaired when salvage_fields found something.
+    """
+    try:
+        value, repairs = load_json(content)
+    except ValueError:
+        valid = salvage_fields(content, fields)
+        return valid, [f for f in fields if f not in valid], 1 if valid else 0
+    valid, failed = validate_fields(value, fields)
+    return valid, failed, repairs
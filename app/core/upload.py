@@ -0,0 +1,157 @@
+import os
+from typing import Dict, List, Optional
+
+import aiofiles
+from starlette.requests import Request
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart before 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# Multipart boundaries, part headers and the small form fields sent next to the archive
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+MAX_FIELD_BYTES = 1024
+
+
+class UploadError(Exception):
+    """The request body is not the upload form /upload expects"""
+
+
+class UploadTooLarge(UploadError):
+    """The archive is bigger than the allowed maximum"""
+
+
+class ReceivedUpload:
+    """Form fields of an /upload request and where its file part was saved"""
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.path: Optional[str] = None
+        self.size = 0
+
+
+class _FormReader:
+    """
+    Callbacks for python-multipart's MultipartParser.
+
+    The parser calls them synchronously while a chunk is fed to it; bytes of
+    the file part are only collected in ``pending`` and written to disk by
+    receive_upload between chunks.
+    """
+
+    def __init__(self, file_field: str, dest_dir: str, max_bytes: int):
+        self.file_field = file_field
+        self.dest_dir = dest_dir
+        self.max_bytes = max_bytes
+        self.upload = ReceivedUpload()
+        self.pending: List[bytes] = []
+        self.error: Optional[UploadError] = None
+        self.complete = False
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name: Optional[str] = None
+        self._is_file = False
+        self._value = bytearray()
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_end": self.on_end,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._name = None
+        self._is_file = False
+        self._value = bytearray()
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        if self._name != self.file_field:
+            return
+        if self.upload.path is not None:
+            self.error = UploadError(f"More than one '{self.file_field}' part")
+            return
+        filename = os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace"))
+        self._is_file = True
+        self.upload.path = os.path.join(self.dest_dir, filename if filename not in ("", ".", "..") else "upload.zip")
+
+    def on_part_data(self, data, start, end):
+        if self.error is not None:
+            return
+        if self._is_file:
+            self.upload.size += end - start
+            if self.upload.size > self.max_bytes:
+                self.error = UploadTooLarge()
+                return
+            self.pending.append(bytes(data[start:end]))
+        elif len(self._value) + end - start > MAX_FIELD_BYTES:
+            self.error = UploadError(f"Form field '{self._name}' is too long")
+        else:
+            self._value += data[start:end]
+
+    def on_part_end(self):
+        if not self._is_file and self._name and self.error is None:
+            self.upload.fields[self._name] = self._value.decode("utf-8", "replace")
+
+    def on_end(self):
+        self.complete = True
+
+
+async def receive_upload(request: Request, file_field: str, dest_dir: str, max_bytes: int) -> ReceivedUpload:
+    """
+    Parse a multipart/form-data body as it arrives, writing the ``file_field``
+    part straight into ``dest_dir``.
+
+    Unlike UploadFile, the archive is never spooled to a temporary file first,
+    so it touches the disk once. Raises UploadTooLarge as soon as the file
+    part passes ``max_bytes`` and UploadError for a malformed form.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise UploadError("Expected a multipart/form-data body")
+    reader = _FormReader(file_field, dest_dir, max_bytes)
+    parser = multipart.MultipartParser(params[b"boundary"], reader.callbacks())
+    f = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if reader.error is not None:
+                raise reader.error
+            if f is None and reader.upload.path is not None:
+                f = await aiofiles.open(reader.upload.path, "wb")
+            if reader.pending:
+                await f.write(b"".join(reader.pending))
+                reader.pending.clear()
+        parser.finalize()
+    finally:
+        if f is not None:
+            await f.close()
+    if not reader.complete:
+        raise UploadError("The multipart body ended early")
+    if reader.upload.path is None:
+        raise UploadError(f"Missing the '{file_field}' file")
+    return reader.upload
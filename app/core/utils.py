@@ -42,31 +42,20 @@
 #     if result:
 #         return result.issuer_id, result.card_id
 #     return None, None
-from typing import Tuple
+from typing import Optional, Tuple
 from sqlalchemy.orm import Session
 
+from app.core.name_index import get_name_index
 
-def get_card_and_issuer_ids(db: Session, issuer_name: str, card_name: str) -> Tuple[int, int]:
+
+def get_card_and_issuer_ids(db: Session, issuer_name: str, card_name: str) -> Tuple[Optional[int], Optional[int]]:
     """
     Fetch the issuer_id and card_id for given issuer and card name.
 
+    Names are matched fuzzily against the in-memory issuers/cards index
+    (app.core.name_index), refreshed from db as needed.
     Returns (issuer_id, card_id) — if not found, values will be None.
     """
-    try:
-        # Look up issuer_id from issuers table
-        issuer_id = db.execute(
-            "SELECT issuer_id FROM issuers WHERE name = :name",
-            {"name": issuer_name}
-        ).scalar()
-
-        # Look up card_id from cards table based on card_name and issuer_id
-        card_id = db.execute(
-            "SELECT card_id FROM cards WHERE name = :name AND issuer_id = :issuer_id",
-            {"name": card_name, "issuer_id": issuer_id}
-        ).scalar()
-
-        return issuer_id, card_id
-
-    except Exception as e:
-        print(f"[get_card_and_issuer_ids] Error looking up IDs: {e}")
-        return None, None
+    index = get_name_index()
+    index.refresh(db)
+    return index.resolve(issuer_name, card_name)
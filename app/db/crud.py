@@ -1,105 +1,242 @@
 from sqlalchemy.orm import Session
-from app.db.models import ExtractedCard
-import pandas as pd
+from app.db.models import ExtractedCard, CARD_IDENTITY_COLUMNS
+from sqlalchemy import func, inspect, select
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import hashlib
 import os
 from app.core.config import settings
+from app.core.name_index import get_name_index
+from app.core.normalize import normalize_records
 from app.db.database import SessionLocal
 
 
-def fetch_filtered_data(db: Session, quarter: str = "", year: int = 0):
-    q = db.query(ExtractedCard)
+# Matched to the external issuer/card tables; a re-ingest that can't match never clears them
+CARD_ID_COLUMNS = ("issuer_id", "card_id")
+
+
+# Response key -> column, in the order the dashboard and exports present them
+CARD_API_FIELDS = {
+    "Issuer": ExtractedCard.issuer,
+    "CardName": ExtractedCard.card_name,
+    "MinAPR": ExtractedCard.min_apr,
+    "MaxAPR": ExtractedCard.max_apr,
+    "CashAdvanceAPR": ExtractedCard.cash_advance_apr,
+    "LateFee": ExtractedCard.late_fee,
+    "BalanceTransferFeePct": ExtractedCard.balance_transfer_fee,
+    "AnnualFee": ExtractedCard.annual_fee,
+    "CashAdvanceFee": ExtractedCard.cash_advance_fee,
+    "ForeignTransactionFee": ExtractedCard.foreign_txn_fee,
+    "RewardsCategories": ExtractedCard.rewards,
+    "NotableExclusions": ExtractedCard.exclusions,
+    "ChangeDescription": ExtractedCard.change_description,
+    "changeType": ExtractedCard.change_type,
+    "card_type": ExtractedCard.card_type,
+    "InstitutionType": ExtractedCard.institution_type,
+    "Quarter": ExtractedCard.quarter,
+    "Year": ExtractedCard.year,
+    "promote_quarter": ExtractedCard.promote_quarter,
+    "promote_year": ExtractedCard.promote_year,
+    "MinimumInterestCharge": ExtractedCard.min_interest_charge,
+    "ExtractionMethod": ExtractedCard.extraction_method,
+}
+
+
+def _filtered(stmt, quarter: str = "", year: int = 0, after_id: int = 0):
     if year:
-        q = q.filter(ExtractedCard.year == year)
+        stmt = stmt.where(ExtractedCard.year == year)
     if quarter:
-        q = q.filter(ExtractedCard.quarter == quarter)
-    rows = q.all()
-    return [
-        {
-            "Issuer": r.issuer,
-            "CardName": r.card_name,
-            # "report_date": r.report_date,
-            "MinAPR": r.min_apr,
-            "MaxAPR": r.max_apr,
-            "CashAdvanceAPR": r.cash_advance_apr,
-            "LateFee": r.late_fee,
-            "BalanceTransferFeePct":r.balance_transfer_fee,
-            "AnnualFee": r.annual_fee,
-            "CashAdvanceFee": r.cash_advance_fee,
-            "ForeignTransactionFee": r.foreign_txn_fee,
-            "RewardsCategories": r.rewards,
-         #  "category": r.category,
-            "NotableExclusions": r.exclusions,
-            "ChangeDescription": r.change_description,
-            "changeType":r.change_type,
-            "card_type": r.card_type,
-            "InstitutionType": r.institution_type,
-            "Quarter": r.quarter,
-            "Year": r.year,
-            "promote_quarter": r.promote_quarter,
-            "promote_year": r.promote_year,
-            "MinimumInterestCharge": r.min_interest_charge,
-        }
-        for r in rows
-    ]
-
-
-def export_to_excel(quarter: str = "", year: int = 0) -> str:
+        stmt = stmt.where(ExtractedCard.quarter == quarter)
+    if after_id:
+        stmt = stmt.where(ExtractedCard.id > after_id)
+    return stmt
+
+
+def iter_filtered_rows(
+    db: Session,
+    quarter: str = "",
+    year: int = 0,
+    fields: Optional[List[str]] = None,
+    after_id: int = 0,
+    limit: int = 0,
+    batch_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream card rows as plain dicts keyed by CARD_API_FIELDS names.
+
+    Only the requested columns are selected (no ORM objects are built) and rows
+    are fetched batch_size at a time. Rows come back in id order; pass the last
+    id seen as after_id to continue from there (keyset pagination).
+    """
+    fields = fields or list(CARD_API_FIELDS)
+    stmt = select(*(CARD_API_FIELDS[f].label(f) for f in fields))
+    stmt = _filtered(stmt, quarter, year, after_id).order_by(ExtractedCard.id)
+    if limit:
+        stmt = stmt.limit(limit)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for row in result.mappings():
+        yield dict(row)
+
+
+def next_page_cursor(db: Session, quarter: str = "", year: int = 0, after_id: int = 0, limit: int = 0) -> Optional[int]:
+    """after_id for the page following this one, or None if this is the last page"""
+    if not limit:
+        return None
+    stmt = _filtered(select(ExtractedCard.id), quarter, year, after_id)
+    ids = db.execute(stmt.order_by(ExtractedCard.id).offset(limit - 1).limit(2)).scalars().all()
+    return ids[0] if len(ids) == 2 else None
+
+
+def data_version(db: Session, quarter: str = "", year: int = 0) -> str:
+    """
+    Cheap fingerprint of a (quarter, year) slice.
+
+    Any insert, re-extraction (which bumps extraction_date) or delete in the
+    slice changes it, so it can key caches and ETags for that slice.
+    """
+    stmt = _filtered(
+        select(func.count(ExtractedCard.id), func.max(ExtractedCard.id), func.max(ExtractedCard.extraction_date)),
+        quarter, year,
+    )
+    count, max_id, last_extracted = db.execute(stmt).one()
+    return hashlib.sha1(f"{count}:{max_id}:{last_extracted}".encode("utf-8")).hexdigest()[:16]
+
+
+def fetch_filtered_data(db: Session, quarter: str = "", year: int = 0):
+    return list(iter_filtered_rows(db, quarter, year))
+
+
+def export_to_excel(quarter: str = "", year: int = 0, output_path: Optional[str] = None) -> str:
     """
     Export filtered card data to an Excel file.
     
     Args:
         quarter: Optional quarter filter (e.g., "Q1", "Q2")
         year: Optional year filter (e.g., 2023)
+        output_path: Where to write; defaults to a new unique file next to settings.OUTPUT_XLSX
         
     Returns:
         str: Path to the generated Excel file
     """
+    from app.core.export import new_export_path, write_cards_xlsx
+
+    if output_path is None:
+        output_path = new_export_path(os.path.dirname(settings.OUTPUT_XLSX))
     db = SessionLocal()
     try:
-        # Apply filters directly in the query
-        query = db.query(ExtractedCard)
-        
-        if year:
-            query = query.filter(ExtractedCard.year == year)
-        if quarter:
-            query = query.filter(ExtractedCard.quarter == quarter)
-            
-        # Get the filtered data
-        rows = query.all()
-        
-        # Convert to the required format
-        data = [
-            {
-                "Issuer": r.issuer,
-                "CardName": r.card_name,
-                "MinAPR": r.min_apr,
-                "MaxAPR": r.max_apr,
-                "CashAdvanceAPR": r.cash_advance_apr,
-                "LateFee": r.late_fee,
-                "BalanceTransferFeePct":r.balance_transfer_fee,
-                "AnnualFee": r.annual_fee,
-                "CashAdvanceFee": r.cash_advance_fee,
-                "ForeignTransactionFee": r.foreign_txn_fee,
-                "RewardsCategories": r.rewards,
-                "NotableExclusions": r.exclusions,
-                "ChangeDescription": r.change_description,
-                "changeType":r.change_type,
-                "card_type": r.card_type,
-                "InstitutionType": r.institution_type,
-                "Quarter": r.quarter,
-                "Year": r.year,
-                "promote_quarter": r.promote_quarter,
-                "promote_year": r.promote_year,
-                "MinimumInterestCharge": r.min_interest_charge,
-            }
-            for r in rows
-        ]
-        
-        # Export to Excel
-        df = pd.DataFrame(data)
-        os.makedirs(os.path.dirname(settings.OUTPUT_XLSX), exist_ok=True)
-        df.to_excel(settings.OUTPUT_XLSX, index=False)
-        
-        return settings.OUTPUT_XLSX
+        write_cards_xlsx(db, output_path, quarter, year)
+        return output_path
     finally:
         db.close()
+
+
+# Engines known to have the unique key on the card identity. Only a positive
+# answer is kept: a database migrated while we run is picked up on the next batch.
+_identity_key_engines = set()
+_warned_no_identity_key = False
+
+
+def _has_identity_key(db: Session) -> bool:
+    """Whether extracted_cards has a unique index on CARD_IDENTITY_COLUMNS, which ON CONFLICT needs"""
+    engine = db.get_bind()
+    if engine in _identity_key_engines:
+        return True
+    inspector = inspect(engine)
+    table = ExtractedCard.__tablename__
+    unique_keys = [i["column_names"] for i in inspector.get_indexes(table) if i.get("unique")]
+    unique_keys += [u["column_names"] for u in inspector.get_unique_constraints(table)]
+    if not any(set(columns) == set(CARD_IDENTITY_COLUMNS) for columns in unique_keys):
+        global _warned_no_identity_key
+        if not _warned_no_identity_key:
+            print("extracted_cards has no unique key on the card identity yet "
+                  "(run python -m app.scripts.migrate), writing cards row by row")
+            _warned_no_identity_key = True
+        return False
+    _identity_key_engines.add(engine)
+    return True
+
+
+def _bulk_upsert_statement(db: Session, records: List[Dict[str, Any]]):
+    """Dialect-native INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE, or None if unsupported"""
+    table = ExtractedCard.__table__
+    dialect = db.get_bind().dialect.name
+    update_columns = [c for c in records[0] if c not in CARD_IDENTITY_COLUMNS]
+
+    def new_value(column, incoming):
+        # An unresolved ID keeps the one already stored (backfilled or set by hand)
+        if column in CARD_ID_COLUMNS:
+            return func.coalesce(incoming, table.c[column])
+        return incoming
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(records)
+        return stmt.on_duplicate_key_update({c: new_value(c, stmt.inserted[c]) for c in update_columns})
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(table).values(records)
+    return stmt.on_conflict_do_update(
+        index_elements=list(CARD_IDENTITY_COLUMNS),
+        set_={c: new_value(c, stmt.excluded[c]) for c in update_columns},
+    )
+
+
+def _upsert_card_row(db: Session, record: Dict[str, Any]):
+    """Lookup-then-write for a single record; works without the unique constraint"""
+    existing = db.query(ExtractedCard).filter_by(
+        **{c: record[c] for c in CARD_IDENTITY_COLUMNS}
+    ).first()
+    if existing:
+        for column, value in record.items():
+            if value is None and column in CARD_ID_COLUMNS:
+                continue
+            setattr(existing, column, value)
+    else:
+        db.add(ExtractedCard(**record))
+    db.commit()
+
+
+def upsert_cards(db: Session, records: List[Dict[str, Any]]) -> List[Tuple[int, Exception]]:
+    """
+    Insert or update extracted cards keyed on (issuer, card_name, quarter, year, source_filename).
+
+    Numeric rate/fee columns are parsed from the records' text first
+    (app.core.normalize) and, with RESOLVE_CARD_IDS, issuer_id/card_id are
+    matched by name (app.core.name_index). The whole batch is written with one bulk upsert
+    statement and one commit, once the database has the unique key that
+    statement relies on (app.scripts.migrate builds it on existing databases).
+    If that fails, each record is retried on its own so one bad row only loses itself.
+
+    Returns (index, error) for every record that could not be written.
+    """
+    if not records:
+        return []
+    normalize_records(records)
+    if settings.RESOLVE_CARD_IDS:
+        get_name_index().resolve_records(db, records)
+
+    # A statement may touch each row once; the last extraction of a duplicate wins
+    unique_records = list({
+        tuple(r[c] for c in CARD_IDENTITY_COLUMNS): r for r in records
+    }.values())
+    stmt = _bulk_upsert_statement(db, unique_records) if _has_identity_key(db) else None
+    if stmt is not None:
+        try:
+            db.execute(stmt)
+            db.commit()
+            return []
+        except Exception as e:
+            print(f"Bulk upsert of {len(records)} cards failed, retrying row by row: {e}")
+            db.rollback()
+
+    failures = []
+    for index, record in enumerate(records):
+        try:
+            _upsert_card_row(db, record)
+        except Exception as e:
+            db.rollback()
+            failures.append((index, e))
+    return failures
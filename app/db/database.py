@@ -1,10 +1,24 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine, pool_class_for
 from app.db.models import Base
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+# Pool checkout wait and connections in use are exported at /metrics
+_pool_class = pool_class_for(settings.DATABASE_URL)
+engine = create_engine(
+    settings.DATABASE_URL, pool_pre_ping=True, **({"poolclass": _pool_class} if _pool_class else {})
+)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+
+def get_db():
+    """FastAPI dependency: one session per request, always closed"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+# Reference tables maintained outside this app. They have their own Base so
+# init_db() never creates them; they are only read (see app.core.name_index).
+ExternalBase = declarative_base()
+
+
+class Issuer(ExternalBase):
+    __tablename__ = "issuers"
+
+    issuer_id = Column(Integer, primary_key=True)
+    name = Column(String(255))
+
+
+class Card(ExternalBase):
+    __tablename__ = "cards"
+
+    card_id = Column(Integer, primary_key=True)
+    name = Column(String(255))
+    issuer_id = Column(Integer)
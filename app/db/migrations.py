@@ -0,0 +1,114 @@
+from typing import List, Optional
+
+from sqlalchemy import String, UniqueConstraint, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+from app.db.models import Base, ExtractedCard, CARD_IDENTITY_COLUMNS
+
+
+def _dedupe_card_identity(engine: Engine) -> int:
+    """Keep only the newest row (highest id) per card identity so the unique key can be built"""
+    columns = ", ".join(CARD_IDENTITY_COLUMNS)
+    not_null = " AND ".join(f"{c} IS NOT NULL" for c in CARD_IDENTITY_COLUMNS)
+    # The derived table keeps MySQL from rejecting a subquery on the table being deleted from
+    stmt = text(f"""
+        DELETE FROM {ExtractedCard.__tablename__}
+        WHERE {not_null}
+          AND id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MAX(id) AS keep_id FROM {ExtractedCard.__tablename__} GROUP BY {columns}
+            ) AS keep
+        )
+    """)
+    with engine.begin() as conn:
+        return conn.execute(stmt).rowcount
+
+
+def _widen_to_text_ddl(engine: Engine, table: str, column) -> Optional[str]:
+    """
+    ALTER statement turning a numeric column into the model's string type, None where not needed.
+
+    extracted_cards.cash_advance_apr was created as INTEGER before it held
+    text such as "29.99% variable"; PostgreSQL needs the explicit USING cast.
+    """
+    type_ddl = column.type.compile(dialect=engine.dialect)
+    if engine.dialect.name == "mysql":
+        return f"ALTER TABLE {table} MODIFY COLUMN {column.name} {type_ddl} NULL"
+    if engine.dialect.name == "postgresql":
+        return f"ALTER TABLE {table} ALTER COLUMN {column.name} TYPE {type_ddl} USING {column.name}::{type_ddl}"
+    # SQLite column types are only affinities: the text is already stored as given
+    return None
+
+
+def migrate(engine: Engine, dry_run: bool = False) -> List[str]:
+    """
+    Bring an existing database up to the models without dropping anything.
+
+    init_db() only runs create_all, which never touches existing tables. This
+    inspects the live schema and adds whatever is missing:
+
+    - tables,
+    - columns (nullable or defaulted, so existing rows stay valid),
+    - column types, where a numeric column became a string one (widening only),
+    - indexes,
+    - unique constraints, built as unique indexes after removing duplicates.
+
+    Every step is idempotent, so this is safe to run on every deploy.
+
+    Returns a description of each change (planned changes when dry_run).
+    """
+    changes = []
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            changes.append(f"create table {table.name}")
+            if not dry_run:
+                table.create(bind=engine)
+            continue
+
+        existing_columns = {c["name"]: c["type"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                existing_type = existing_columns[column.name]
+                if isinstance(column.type, String) and not isinstance(existing_type, String):
+                    ddl = _widen_to_text_ddl(engine, table.name, column)
+                    if ddl:
+                        changes.append(f"change column {table.name}.{column.name} to {column.type}")
+                        if not dry_run:
+                            with engine.begin() as conn:
+                                conn.execute(text(ddl))
+                continue
+            ddl = str(CreateColumn(column).compile(dialect=engine.dialect))
+            changes.append(f"add column {table.name}.{column.name}")
+            if not dry_run:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        existing_indexes |= {u["name"] for u in inspector.get_unique_constraints(table.name)}
+
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            changes.append(f"create index {index.name}")
+            if not dry_run:
+                index.create(bind=engine)
+
+        for constraint in table.constraints:
+            if not isinstance(constraint, UniqueConstraint) or constraint.name in existing_indexes:
+                continue
+            changes.append(f"create unique index {constraint.name}")
+            if dry_run:
+                continue
+            if table.name == ExtractedCard.__tablename__:
+                removed = _dedupe_card_identity(engine)
+                if removed:
+                    changes.append(f"removed {removed} duplicate rows from {table.name}")
+            columns = ", ".join(c.name for c in constraint.columns)
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"))
+
+    return changes
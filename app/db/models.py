@@ -1,11 +1,23 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+# Identity of an extracted record; re-processing the same file upserts onto it
+CARD_IDENTITY_COLUMNS = ("issuer", "card_name", "quarter", "year", "source_filename")
+
+
 class ExtractedCard(Base):
     __tablename__ = "extracted_cards"
+    __table_args__ = (
+        UniqueConstraint(*CARD_IDENTITY_COLUMNS, name="uq_extracted_cards_identity"),
+        # /data, /export and export_to_excel filter on year, optionally narrowed by quarter
+        Index("ix_extracted_cards_year_quarter", "year", "quarter"),
+        # Ranking a slice by rate or fee (see app.core.normalize)
+        Index("ix_extracted_cards_year_quarter_purchase_apr", "year", "quarter", "purchase_apr_min"),
+        Index("ix_extracted_cards_year_quarter_annual_fee", "year", "quarter", "annual_fee_usd"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     issuer_id = Column(Integer, nullable=True)
@@ -21,13 +33,29 @@ class ExtractedCard(Base):
     min_apr = Column(String(50), nullable=True)
     max_apr = Column(String(50), nullable=True)
     penalty_apr = Column(String(255), nullable=True)
-    cash_advance_apr = Column(Integer, nullable=True)
+    cash_advance_apr = Column(String(50), nullable=True)
     annual_fee = Column(String(255), nullable=True)
     late_fee = Column(String(255), nullable=True)
     foreign_txn_fee = Column(String(255), nullable=True)
     cash_advance_fee = Column(String(255), nullable=True)
     balance_transfer_fee = Column(String(255), nullable=True)
     min_interest_charge = Column(String(255), nullable=True)
+
+    # Numbers parsed from the text columns above by app.core.normalize; NULL when not disclosed
+    purchase_apr_min = Column(Float, nullable=True)
+    purchase_apr_max = Column(Float, nullable=True)
+    purchase_apr_intro = Column(Float, nullable=True)
+    penalty_apr_max = Column(Float, nullable=True)
+    cash_advance_apr_min = Column(Float, nullable=True)
+    cash_advance_apr_max = Column(Float, nullable=True)
+    annual_fee_usd = Column(Float, nullable=True)
+    annual_fee_intro_usd = Column(Float, nullable=True)
+    late_fee_usd = Column(Float, nullable=True)
+    foreign_txn_fee_pct = Column(Float, nullable=True)
+    cash_advance_fee_pct = Column(Float, nullable=True)
+    balance_transfer_fee_pct = Column(Float, nullable=True)
+    balance_transfer_fee_intro_pct = Column(Float, nullable=True)
+    min_interest_charge_usd = Column(Float, nullable=True)
     
     base_score = Column(Integer, nullable=True)
     trend_bonus = Column(Integer, nullable=True)
@@ -49,3 +77,58 @@ class ExtractedCard(Base):
     notable_exclusions = Column(Text, nullable=True)
     fee_structure = Column(Text, nullable=True)
     rewards_structure = Column(Text, nullable=True)
+    # rules+llm / llm: which extraction path produced the row
+    extraction_method = Column(String(20), nullable=True)
+
+
+class ExtractionCache(Base):
+    __tablename__ = "extraction_cache"
+
+    # sha256 of the PDF bytes + fingerprint of the prompt/model that produced `data`
+    cache_key = Column(String(64), primary_key=True)
+    pdf_sha256 = Column(String(64), nullable=False)
+    prompt_version = Column(String(16), nullable=False)
+    data = Column(Text, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class JobProgress(Base):
+    __tablename__ = "job_progress"
+
+    upload_id = Column(String(36), primary_key=True)
+    state = Column(Text, nullable=False)  # JSON progress payload served by /progress
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class IngestJob(Base):
+    """One uploaded archive; survives worker restarts so the job can be resumed (app.core.jobs)"""
+    __tablename__ = "ingest_jobs"
+
+    upload_id = Column(String(36), primary_key=True)
+    zip_path = Column(String(1024), nullable=False)
+    quarter = Column(String(2), nullable=False)
+    year = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending / running / completed / failed
+    owner = Column(String(255), nullable=True)  # "host:pid" of the process running it
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IngestFile(Base):
+    """Checkpoint of one PDF of an ingest job"""
+    __tablename__ = "ingest_files"
+    __table_args__ = (
+        UniqueConstraint("upload_id", "filename", name="uq_ingest_files_job_filename"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    upload_id = Column(String(36), nullable=False)
+    filename = Column(String(255), nullable=False)  # source_filename of the card it produces
+    member = Column(String(1024), nullable=False)  # path inside the archive
+    state = Column(String(20), nullable=False, default="pending")  # pending / extracting / llm / written / failed
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,176 @@
+# app/ingest.py
+#
+# Ingestion outside the web tier, on the same staged pipeline as /upload.
+#
+#   python -m app.ingest local agreements.zip --quarter Q1 --year 2024
+#   python -m app.ingest local ./agreements/ --quarter Q1 --year 2024
+#   python -m app.ingest enqueue agreements.zip --quarter Q1 --year 2024
+#   python -m app.ingest worker [--jobs 2] [--poll-seconds 5] [--metrics-port 9100]
+#
+# local processes a ZIP or a directory of PDFs right here and leaves it in place.
+#
+# worker is a long-running extraction node: it claims jobs from the ingest_jobs
+# table (SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL/MySQL, a conditional
+# UPDATE on SQLite, see app.core.jobs) and runs up to --jobs archives at once.
+# Start as many workers, on as many machines, as the LLM budget allows; set
+# INGEST_IN_WEB=false so /upload only enqueues. Every worker needs the same
+# DATABASE_URL and UPLOAD_DIR (shared storage) as the web tier, and
+# PROGRESS_BACKEND db or redis so /progress sees their updates. On SIGTERM or
+# Ctrl-C a worker stops claiming and hands its running jobs back to the queue,
+# where another worker resumes them from their per-file checkpoints.
+# --metrics-port serves the worker's Prometheus metrics (app.core.metrics).
+
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import time
+import uuid
+
+from app.core import jobs, metrics
+from app.core.config import settings
+from app.core.extractor import (
+    iter_dir_pdfs,
+    iter_zip_pdfs,
+    job_work_dir,
+    list_pdf_members,
+    process_zip_with_progress,
+    run_extraction_pipeline,
+)
+from app.core.progress import MemoryProgressStore, get_progress_store
+from app.db.database import SessionLocal, init_db
+
+
+class ConsoleProgressStore(MemoryProgressStore):
+    """Prints each progress message, for runs without a browser watching"""
+
+    def update(self, upload_id, fields):
+        state = super().update(upload_id, fields)
+        if state is not None and "message" in fields:
+            print(f"  [{state.get('progress', 0):>3}%] {fields['message']}")
+        return state
+
+
+async def ingest_local(path: str, quarter: str, year: int):
+    if os.path.isdir(path):
+        names = [n for _, _, files in os.walk(path) for n in files if n.endswith(".pdf") and not n.startswith("._")]
+        total_files, sources = len(names), iter_dir_pdfs(path)
+    else:
+        members = list_pdf_members(path)
+        total_files, sources = len(members), iter_zip_pdfs(path, members)
+    if not total_files:
+        print(f"❌ No PDF files found in {path}")
+        return
+
+    upload_id = f"local-{uuid.uuid4()}"
+    progress_store = ConsoleProgressStore()
+    progress_store.create(upload_id, {"status": "processing", "progress": 0, "total_files": total_files})
+    print(f"Processing {total_files} PDF files for {quarter} {year}...")
+    db = SessionLocal()
+    try:
+        stats = await run_extraction_pipeline(sources, total_files, quarter, year, db, upload_id, progress_store)
+    finally:
+        db.close()
+    seconds = time.time() - stats.start_time
+    print(f"✅ {stats.succeeded_files} of {total_files} files written, {stats.failed_files} failed, "
+          f"{stats.cache_hits} from cache, in {seconds:.1f}s.")
+
+
+def enqueue(zip_path: str, quarter: str, year: int) -> str:
+    """Copy the archive into UPLOAD_DIR and queue it for a worker, as /upload does"""
+    upload_id = str(uuid.uuid4())
+    work_dir = job_work_dir(upload_id)
+    os.makedirs(work_dir, exist_ok=True)
+    target = os.path.join(work_dir, os.path.basename(zip_path))
+    shutil.copyfile(zip_path, target)
+    jobs.create_job(upload_id, target, quarter, year, owner=None)
+    get_progress_store().create(upload_id, {
+        "status": "queued",
+        "progress": 0,
+        "total_files": 0,
+        "processed_files": 0,
+        "current_file": "",
+        "message": "Waiting for an ingestion worker..."
+    })
+    return upload_id
+
+
+async def run_worker(max_jobs: int, poll_seconds: float):
+    progress_store = get_progress_store()
+    running = {}
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    print(f"Ingestion worker {jobs.WORKER_ID} up, {max_jobs} jobs at a time")
+
+    while not stopping.is_set():
+        for upload_id in [u for u, task in running.items() if task.done()]:
+            del running[upload_id]
+            print(f"Finished ingest job {upload_id}")
+        capacity = max_jobs - len(running)
+        if capacity > 0:
+            try:
+                claimed = await asyncio.to_thread(jobs.claim_jobs, capacity)
+            except Exception as e:
+                print(f"Error claiming ingest jobs: {str(e)}")
+                claimed = []
+            for job in claimed:
+                if not os.path.exists(job["zip_path"]):
+                    # Not on this node's UPLOAD_DIR: storage is not shared, or the archive was removed
+                    print(f"Cannot run ingest job {job['upload_id']}: {job['zip_path']} is gone")
+                    await asyncio.to_thread(jobs.finish_job, job["upload_id"], jobs.JOB_FAILED)
+                    continue
+                print(f"Claimed ingest job {job['upload_id']} ({job['quarter']} {job['year']})")
+                running[job["upload_id"]] = asyncio.create_task(process_zip_with_progress(
+                    job["zip_path"], job["quarter"], job["year"], job["upload_id"], progress_store
+                ))
+        try:
+            await asyncio.wait_for(stopping.wait(), poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    unfinished = [u for u, task in running.items() if not task.done()]
+    print(f"Shutting down, returning {len(unfinished)} running jobs to the queue")
+    for task in running.values():
+        task.cancel()
+    await asyncio.gather(*running.values(), return_exceptions=True)
+    for upload_id in unfinished:
+        await asyncio.to_thread(jobs.release_job, upload_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest credit card agreements outside the web server")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    local = commands.add_parser("local", help="Process a ZIP or a directory of PDFs in this process")
+    local.add_argument("path")
+    local.add_argument("--quarter", required=True)
+    local.add_argument("--year", type=int, required=True)
+
+    queue = commands.add_parser("enqueue", help="Queue a ZIP for the ingestion workers")
+    queue.add_argument("zip")
+    queue.add_argument("--quarter", required=True)
+    queue.add_argument("--year", type=int, required=True)
+
+    worker = commands.add_parser("worker", help="Claim and process queued jobs until stopped")
+    worker.add_argument("--jobs", type=int, default=1, help="Archives processed at the same time")
+    worker.add_argument("--poll-seconds", type=float, default=settings.JOB_HEARTBEAT_SECONDS / 3)
+    worker.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this port")
+
+    args = parser.parse_args()
+    init_db()
+    if args.command == "local":
+        asyncio.run(ingest_local(args.path, args.quarter, args.year))
+    elif args.command == "enqueue":
+        upload_id = enqueue(args.zip, args.quarter, args.year)
+        print(f"✅ Queued as {upload_id}; follow it at /progress/{upload_id} or /jobs/{upload_id}")
+    else:
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+        asyncio.run(run_worker(max(1, args.jobs), args.poll_seconds))
+
+
+if __name__ == "__main__":
+    main()
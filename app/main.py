@@ -1,22 +1,32 @@
-from fastapi import FastAPI, Request, UploadFile, Form, File, BackgroundTasks, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
+from fastapi import FastAPI, Request, HTTPException, Depends, Query
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
-import shutil, os, uuid, json, asyncio
-from typing import Dict, Any
+import shutil, os, uuid, json, asyncio, itertools
+from typing import List, Optional
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.extractor import process_zip_with_progress
-from app.db.database import init_db, SessionLocal
-from app.db.crud import fetch_filtered_data, export_to_excel
+from app.core.extractor import process_zip_with_progress, job_work_dir, cleanup_stale_work_dirs, resume_jobs
+from app.core import jobs, metrics
+from app.core.progress import get_progress_store, TERMINAL_STATUSES
+from app.core.export import (
+    XLSX_MEDIA_TYPE, cached_xlsx_export, export_filename, iter_cards_csv, xlsx_export_etag
+)
+from app.db.database import init_db, get_db
+from app.db.crud import (
+    iter_filtered_rows, next_page_cursor, data_version, CARD_API_FIELDS
+)
+from app.core.upload import UPLOAD_FORM_OVERHEAD, UploadError, UploadTooLarge, receive_upload
+from app.core.response_cache import CachedResponse, choose_encoding, compress_stream, data_cache, make_etag
 from fastapi.exceptions import RequestValidationError
-from fastapi.requests import Request
-from fastapi.responses import JSONResponse
 
-# In-memory storage for progress (in production, use Redis or similar)
-progress_store: Dict[str, Dict[str, Any]] = {}
+# Job progress shared by all workers (see PROGRESS_BACKEND)
+progress_store = get_progress_store()
+
+DATA_CHUNK_SIZE = 64 * 1024
 
 # Initialize DB
 init_db()
@@ -33,6 +43,9 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         }
     )
 
+# Latency, status and response size per route, for /metrics
+app.add_middleware(metrics.HTTPMetricsMiddleware)
+
 # Enable CORS for development
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +61,13 @@ BASE_DIR = Path(__file__).resolve().parent
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
+@app.on_event("startup")
+async def start_job_resumer():
+    # Picks up jobs of workers that were recycled or crashed mid-archive;
+    # with INGEST_IN_WEB off that is the standalone workers' job
+    if settings.INGEST_IN_WEB:
+        asyncio.create_task(resume_jobs(progress_store))
+
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
     return templates.TemplateResponse("index.html", {
@@ -55,34 +75,83 @@ def home(request: Request):
         "current_year": settings.YEAR_DEFAULT
     })
 
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the maximum of {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+
 @app.post("/upload")
-async def upload_zip(
-    zip_file: UploadFile = File(...),
-    quarter: str = Form(...),
-    year: int = Form(...)
-):
+async def upload_zip(request: Request):
+    """
+    Accept a multipart form with zip_file, quarter and year.
+
+    The body is parsed as it arrives and the archive written straight into the
+    job's work directory (app.core.upload), instead of being spooled to a
+    temporary file by UploadFile first.
+    """
+    # Refuse an oversized body from its Content-Length before reading any of it
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+        raise upload_too_large()
+    
     # Create a unique ID for this upload
     upload_id = str(uuid.uuid4())
     
-    # Initialize progress tracking
-    progress_store[upload_id] = {
+    # Drop finished jobs whose TTL has passed, then start tracking this one
+    await asyncio.to_thread(progress_store.cleanup)
+    await asyncio.to_thread(cleanup_stale_work_dirs, settings.PROGRESS_ACTIVE_TTL_SECONDS)
+    await asyncio.to_thread(progress_store.create, upload_id, {
         "status": "uploading",
         "progress": 0,
         "total_files": 0,
         "processed_files": 0,
         "current_file": "",
         "message": "Starting upload..."
-    }
+    })
     
-    # Ensure upload directory exists
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    upload_path = os.path.join(settings.UPLOAD_DIR, f"{upload_id}_{zip_file.filename}")
+    # Each upload gets its own work directory so concurrent jobs never see each other's files
+    work_dir = job_work_dir(upload_id)
+    os.makedirs(work_dir, exist_ok=True)
     
-    # Save the file
-    with open(upload_path, "wb") as f:
-        f.write(await zip_file.read())
+    # Stream the archive to disk, enforcing the size limit as it arrives
+    try:
+        upload = await receive_upload(request, "zip_file", work_dir, settings.MAX_UPLOAD_BYTES)
+        quarter = upload.fields.get("quarter", "").strip()
+        if not quarter:
+            raise UploadError("Missing the 'quarter' field")
+        try:
+            year = int(upload.fields.get("year", ""))
+        except ValueError:
+            raise UploadError("'year' must be an integer")
+    except Exception as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        too_large = isinstance(e, UploadTooLarge)
+        await asyncio.to_thread(progress_store.update, upload_id, {
+            "status": "failed",
+            "message": "Upload exceeds the maximum allowed size" if too_large else "Upload failed"
+        })
+        if too_large:
+            raise upload_too_large()
+        if isinstance(e, UploadError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    upload_path = upload.path
     
-    # Start processing in the background
+    # Record the job durably, then start processing in the background, or
+    # leave it queued for an ingestion worker
+    if not settings.INGEST_IN_WEB:
+        await asyncio.to_thread(jobs.create_job, upload_id, upload_path, quarter, year, None)
+        await asyncio.to_thread(progress_store.update, upload_id, {
+            "status": "queued",
+            "message": "Waiting for an ingestion worker..."
+        })
+        return {
+            "message": "File uploaded and queued for processing",
+            "upload_id": upload_id,
+            "progress_url": f"/progress/{upload_id}"
+        }
+    await asyncio.to_thread(jobs.create_job, upload_id, upload_path, quarter, year)
     asyncio.create_task(process_zip_with_progress(upload_path, quarter, year, upload_id, progress_store))
     
     return {
@@ -91,35 +160,106 @@ async def upload_zip(
         "progress_url": f"/progress/{upload_id}"
     }
 
+@app.get("/jobs/{upload_id}")
+async def get_job(upload_id: str):
+    """Durable job state: status, file counts per state and the failed files with their errors"""
+    job = await asyncio.to_thread(jobs.get_job, upload_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload ID not found")
+    job.pop("zip_path", None)
+    return job
+
+@app.post("/jobs/{upload_id}/retry")
+async def retry_job(upload_id: str):
+    """Re-run the failed (or never finished) files of a finished job; written files are kept"""
+    job = await asyncio.to_thread(jobs.get_job, upload_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload ID not found")
+    if job["status"] in (jobs.JOB_PENDING, jobs.JOB_RUNNING):
+        raise HTTPException(status_code=409, detail="Job is still running")
+    unfinished = sum(count for state, count in job["files"].items() if state != jobs.FILE_WRITTEN)
+    if not unfinished:
+        raise HTTPException(status_code=409, detail="Nothing to retry: the job has no failed or unfinished files")
+    if not os.path.exists(job["zip_path"]):
+        raise HTTPException(status_code=410, detail="The archive of this job was cleaned up; upload it again")
+    
+    retried = await asyncio.to_thread(jobs.retry_failed, upload_id)
+    if retried and settings.INGEST_IN_WEB:
+        # Normally claimed right here; if another worker beats us to it, it runs there
+        claimed = await asyncio.to_thread(jobs.claim_job, upload_id)
+        if claimed is not None:
+            await asyncio.to_thread(progress_store.create, upload_id, {
+                "status": "processing",
+                "progress": 0,
+                "total_files": 0,
+                "processed_files": 0,
+                "current_file": "",
+                "message": f"Retrying {retried} files..."
+            })
+            asyncio.create_task(process_zip_with_progress(
+                claimed["zip_path"], claimed["quarter"], claimed["year"], upload_id, progress_store
+            ))
+    
+    return {
+        "message": f"Retrying {retried} files" if retried else "Nothing to retry",
+        "upload_id": upload_id,
+        "retried": retried,
+        "progress_url": f"/progress/{upload_id}"
+    }
+
 @app.get("/progress/{upload_id}")
-async def get_progress(upload_id: str):
+async def get_progress(upload_id: str, request: Request):
     """SSE endpoint for progress updates"""
-    if upload_id not in progress_store:
+    if await asyncio.to_thread(progress_store.get, upload_id) is None:
         raise HTTPException(status_code=404, detail="Upload ID not found")
     
+    # Resume support: EventSource resends the id of the last event it received
+    try:
+        last_seq = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        last_seq = 0
+    
+    # Without cross-worker push, a job running on another worker is re-read periodically
+    wait_timeout = settings.SSE_HEARTBEAT_SECONDS
+    if not progress_store.pushes_across_workers:
+        wait_timeout = min(wait_timeout, settings.PROGRESS_POLL_SECONDS)
+    progress_store.start_listening()
+    notifier = progress_store.notifier
+    
     async def event_generator():
-        last_progress = -1
+        nonlocal last_seq
+        last_sent = asyncio.get_running_loop().time()
+        yield "retry: 3000\n\n"
         
-        while True:
-            progress = progress_store[upload_id]
+        # Subscribed for the whole stream, so changes between two waits are not missed
+        notifier.subscribe(upload_id)
+        try:
+            while True:
+                seen_version = notifier.version(upload_id)
+                progress = await asyncio.to_thread(progress_store.get, upload_id)
+                if progress is None:
+                    # Expired or removed while we were streaming
+                    break
             
-            # Only send if progress has changed
-            if progress["progress"] != last_progress:
-                yield f"data: {json.dumps(progress)}\n\n"
-                last_progress = progress["progress"]
-                
-                # If processing is complete, clean up and exit
-                if progress["status"] in ["completed", "failed"]:
-                    # Keep the result for 5 minutes before cleaning up
-                    await asyncio.sleep(300)
-                    if upload_id in progress_store:
-                        del progress_store[upload_id]
+                # Only send real state changes
+                if progress.get("seq", 0) != last_seq:
+                    last_seq = progress.get("seq", 0)
+                    last_sent = asyncio.get_running_loop().time()
+                    yield f"id: {last_seq}\ndata: {json.dumps(progress)}\n\n"
+            
+                # Finished jobs are expired by the store's TTL, so just close
+                if progress["status"] in TERMINAL_STATUSES:
                     break
             
-            await asyncio.sleep(0.5)
+                changed = await notifier.wait_for_change(upload_id, seen_version, wait_timeout)
+                if not changed and asyncio.get_running_loop().time() - last_sent >= settings.SSE_HEARTBEAT_SECONDS:
+                    last_sent = asyncio.get_running_loop().time()
+                    yield ": keepalive\n\n"
+        finally:
+            notifier.unsubscribe(upload_id)
     
     return StreamingResponse(
-        event_generator(),
+        metrics.track_sse(event_generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -128,47 +268,139 @@ async def get_progress(upload_id: str):
         }
     )
 
+def parse_fields(fields: str) -> Optional[List[str]]:
+    """Validate a comma-separated fields= projection against CARD_API_FIELDS"""
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in CARD_API_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
 @app.get("/data")
-def get_data(quarter: str = "", year: int = 0):
-    db = SessionLocal()
-    records = fetch_filtered_data(db, quarter, year)
-    return JSONResponse(content=records)
+def get_data(
+    request: Request,
+    quarter: str = "",
+    year: int = 0,
+    fields: str = "",
+    limit: int = Query(0, ge=0, le=100000),
+    after_id: int = Query(0, ge=0),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    Stream card rows as a JSON array (default) or NDJSON.
 
-@app.get("/export")
-def export(quarter: str = "", year: int = 0):
-    import io
-    import pandas as pd
-    from fastapi.responses import StreamingResponse
+    fields=Issuer,CardName,... limits the selected columns. With limit=N the
+    response is one page; X-Next-Cursor carries the after_id for the next page.
+
+    Responses carry an ETag derived from the slice's data version (304 on
+    If-None-Match), are gzip/brotli encoded when the client accepts it, and
+    are served from data_cache until ingestion changes the slice.
+    """
+    selected = parse_fields(fields)
+    key = (quarter, year, tuple(selected or ()), limit, after_id, format)
+    version = data_version(db, quarter, year)
+    etag = make_etag(version, key)
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, must-revalidate"}
     
-    # Get the data as a DataFrame
-    db = SessionLocal()
-    try:
-        # Get the data as a list of dictionaries
-        data = fetch_filtered_data(db, quarter, year)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(data)
-        
-        # Create a BytesIO buffer
-        buffer = io.BytesIO()
-        
-        # Write Excel file to buffer
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Credit Card Data')
-            
-        # Move to the beginning of the buffer
-        buffer.seek(0)
-        
-        # Create a streaming response
-        filename = f"extracted_data_{f'Q{quarter}_' if quarter else ''}{year if year else 'all'}.xlsx"
+    if etag in request.headers.get("if-none-match", ""):
+        db.close()
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    
+    cached = data_cache.get(key, version)
+    if cached is not None:
+        db.close()
+        return Response(cached.encoded(encoding), media_type=media_type, headers={**headers, **cached.headers})
+    
+    page_headers = {}
+    cursor = next_page_cursor(db, quarter, year, after_id, limit)
+    if cursor is not None:
+        page_headers["X-Next-Cursor"] = str(cursor)
+    
+    def generate():
+        # Rows are serialized into ~64 KB chunks; the body is also kept for
+        # the cache unless it grows past RESPONSE_CACHE_MAX_ENTRY_BYTES
+        captured, captured_size = [], 0
+        pending, pending_size = [], 0
+        try:
+            rows = iter_filtered_rows(db, quarter, year, selected, after_id, limit)
+            if format == "ndjson":
+                parts = (json.dumps(row) + "\n" for row in rows)
+            else:
+                parts = itertools.chain(
+                    ["["], (("," if i else "") + json.dumps(row) for i, row in enumerate(rows)), ["]"]
+                )
+            for part in parts:
+                pending.append(part)
+                pending_size += len(part)
+                if pending_size >= DATA_CHUNK_SIZE:
+                    chunk = "".join(pending).encode("utf-8")
+                    pending, pending_size = [], 0
+                    if captured is not None:
+                        captured.append(chunk)
+                        captured_size += len(chunk)
+                        if captured_size > settings.RESPONSE_CACHE_MAX_ENTRY_BYTES:
+                            captured = None
+                    yield chunk
+            chunk = "".join(pending).encode("utf-8")
+            yield chunk
+            if captured is not None:
+                captured.append(chunk)
+                data_cache.put(key, CachedResponse(version, b"".join(captured), page_headers))
+        finally:
+            # The dependency may already have closed the session; closing twice is harmless
+            db.close()
+    
+    return StreamingResponse(
+        compress_stream(generate(), encoding), media_type=media_type, headers={**headers, **page_headers}
+    )
+
+@app.get("/export")
+def export(
+    request: Request,
+    quarter: str = "",
+    year: int = 0,
+    format: str = Query("xlsx", pattern="^(xlsx|csv)$"),
+    db: Session = Depends(get_db),
+):
+    """Download the filtered cards as a constant-memory XLSX workbook or a streamed CSV"""
+    if format == "csv":
+        def generate():
+            try:
+                yield from iter_cards_csv(db, quarter, year)
+            finally:
+                db.close()
         
+        filename = export_filename(quarter, year, "csv")
         return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            }
+            generate(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
-    finally:
-        db.close()
+    
+    # A client holding the current version is answered before any workbook is looked up or built
+    version = data_version(db, quarter, year)
+    headers = {"ETag": xlsx_export_etag(version), "Cache-Control": "private, must-revalidate"}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    # Built once per (slice, data version) and served from the export cache afterwards
+    path, _ = cached_xlsx_export(db, quarter, year, version)
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        filename=export_filename(quarter, year),
+        headers=headers
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics, summed over all gunicorn workers (see app.core.metrics)"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
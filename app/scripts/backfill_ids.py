@@ -1,106 +1,166 @@
-# # app/scripts/backfill_ids.py
-
-# from app.db.database import SessionLocal
-# from app.db.models import ExtractedCard
-# from app.core.utils import get_card_and_issuer_ids
-
-
-# def backfill_ids():
-#     db = SessionLocal()
-#     try:
-#         # Fetch all cards that are missing either issuer_id or card_id
-#         cards = db.query(ExtractedCard).filter(
-#             (ExtractedCard.issuer_id == None) | (ExtractedCard.card_id == None)
-#         ).all()
-
-#         updated_count = 0
+# app/scripts/backfill_ids.py
+#
+# Fill issuer_id / card_id of existing extracted_cards rows by matching their
+# issuer and card names against the issuers/cards tables (app.core.name_index).
+# New rows get them at ingestion; run this after the reference tables grew, or
+# once for rows written before ID resolution was switched on.
+#
+#   python -m app.scripts.backfill_ids [--chunk-size 5000] [--dry-run]
+#   python -m app.scripts.backfill_ids --workers 4
+#   python -m app.scripts.backfill_ids --from-id 200001 --to-id 400000
+#
+# Rows missing either ID are read in id order chunk by chunk (keyset, no
+# OFFSET); each distinct (issuer, card_name) of a chunk is resolved once and
+# the chunk is written back with one bulk UPDATE and one commit, so an
+# interrupted run keeps what it finished. Rerun with --from-id set to the last
+# id printed to pick up where it stopped. --workers splits the id range over
+# that many processes (each loads its own name index); on SQLite, which has
+# one writer at a time, keep the default of 1. --dry-run reports match rates
+# and the most common unmatched names without writing.
+
+import argparse
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import func, or_, select, update
+
+from app.core.name_index import get_name_index
+from app.db.database import SessionLocal
+from app.db.models import ExtractedCard
 
-#         for card in cards:
-#             if card.issuer and card.card_name:
-#                 issuer_id, card_id = get_card_and_issuer_ids(db, card.issuer, card.card_name)
-#                 if issuer_id is not None and card_id is not None:
-#                     card.issuer_id = issuer_id
-#                     card.card_id = card_id
-#                     updated_count += 1
+_MISSING = or_(ExtractedCard.issuer_id.is_(None), ExtractedCard.card_id.is_(None))
 
-#         db.commit()
-#         print(f"✅ Backfilled {updated_count} of {len(cards)} cards with missing IDs.")
-#     except Exception as e:
-#         db.rollback()
-#         print(f"❌ Error during backfill: {e}")
-#     finally:
-#         db.close()
 
+def id_range(from_id: int = 0, to_id: int = 0):
+    """(lowest, highest) id of the rows missing an ID within the bounds, or None"""
+    db = SessionLocal()
+    try:
+        stmt = select(func.min(ExtractedCard.id), func.max(ExtractedCard.id)).where(_MISSING)
+        if from_id:
+            stmt = stmt.where(ExtractedCard.id >= from_id)
+        if to_id:
+            stmt = stmt.where(ExtractedCard.id <= to_id)
+        low, high = db.execute(stmt).one()
+        return None if low is None else (low, high)
+    finally:
+        db.close()
 
-# if __name__ == "__main__":
-#     backfill_ids()
 
-from sqlalchemy import Column, Integer, String, func
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+def split_range(low: int, high: int, parts: int):
+    step = (high - low) // parts + 1
+    return [(start, min(high, start + step - 1)) for start in range(low, high + 1, step)]
 
-from app.db.database import SessionLocal  # Your current backend DB session
-from app.db.models import ExtractedCard
 
-# Use the same engine as your FastAPI backend
-engine = SessionLocal().get_bind()
-SessionMaker = sessionmaker(bind=engine)
-
-# Temporary base for models
-Base = declarative_base()
-
-# Temporary Card model
-class TempCard(Base):
-    __tablename__ = 'cards'
-    card_id = Column(Integer, primary_key=True)
-    name = Column(String)
-    issuer_id = Column(Integer)
-
-# Temporary Issuer model
-class TempIssuer(Base):
-    __tablename__ = 'issuers'
-    issuer_id = Column(Integer, primary_key=True)
-    name = Column(String)
-
-def get_card_and_issuer_ids(session, issuer_name: str, card_name: str):
-    """Get matching issuer_id and card_id using fuzzy LIKE match."""
-    if not issuer_name or not card_name:
-        return None, None
-
-    result = (
-        session.query(TempCard.card_id, TempIssuer.issuer_id)
-        .join(TempIssuer, TempCard.issuer_id == TempIssuer.issuer_id)
-        .filter(func.lower(TempCard.name).like(f"%{card_name.lower()}%"))
-        .filter(func.lower(TempIssuer.name).like(f"%{issuer_name.lower()}%"))
-        .first()
-    )
-    if result:
-        return result.issuer_id, result.card_id
-    return None, None
-
-def backfill_ids():
-    session = SessionMaker()
+def backfill_range(from_id: int, to_id: int, chunk_size: int = 5000, dry_run: bool = False) -> dict:
+    """Resolve and write the rows with from_id <= id <= to_id that miss an ID"""
+    db = SessionLocal()
+    started = time.perf_counter()
+    stats = {"rows": 0, "matched": 0, "issuer_only": 0, "unmatched": 0, "updated": 0, "names": 0}
+    unmatched = Counter()
+    after_id = from_id - 1
     try:
-        cards = session.query(ExtractedCard).filter(
-            (ExtractedCard.issuer_id == None) | (ExtractedCard.card_id == None)
-        ).all()
-
-        updated = 0
-        for card in cards:
-            if card.issuer and card.card_name:
-                issuer_id, card_id = get_card_and_issuer_ids(session, card.issuer, card.card_name)
-                if issuer_id and card_id:
-                    card.issuer_id = issuer_id
-                    card.card_id = card_id
-                    updated += 1
-
-        session.commit()
-        print(f"✅ Backfilled {updated} of {len(cards)} records.")
+        index = get_name_index()
+        index.refresh(db, force=True)
+        if not index.available:
+            raise RuntimeError("the issuers/cards tables cannot be read")
+        while True:
+            rows = db.execute(
+                select(ExtractedCard.id, ExtractedCard.issuer, ExtractedCard.card_name,
+                       ExtractedCard.issuer_id, ExtractedCard.card_id)
+                .where(_MISSING, ExtractedCard.id > after_id, ExtractedCard.id <= to_id)
+                .order_by(ExtractedCard.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            after_id = rows[-1].id
+
+            # A quarter repeats the same issuers and cards: one lookup per distinct pair
+            names = {(row.issuer, row.card_name) for row in rows}
+            resolved = {name: index.resolve(*name) for name in names}
+            stats["names"] += len(names)
+            values = []
+            for row in rows:
+                issuer_id, card_id = resolved[row.issuer, row.card_name]
+                stats["rows"] += 1
+                if card_id is not None:
+                    stats["matched"] += 1
+                elif issuer_id is not None:
+                    stats["issuer_only"] += 1
+                else:
+                    stats["unmatched"] += 1
+                    unmatched[row.issuer or "", row.card_name or ""] += 1
+                if issuer_id is None:
+                    continue
+                # A card that no longer matches keeps the card_id it already has
+                if card_id is None:
+                    card_id = row.card_id
+                if (issuer_id, card_id) != (row.issuer_id, row.card_id):
+                    values.append({"id": row.id, "issuer_id": issuer_id, "card_id": card_id})
+            stats["updated"] += len(values)
+            if values and not dry_run:
+                # ORM bulk UPDATE by primary key: one executemany per chunk
+                db.execute(update(ExtractedCard), values)
+                db.commit()
+            print(f"  {stats['rows']} rows{' resolved' if dry_run else ''}, {stats['updated']} "
+                  f"{'to update' if dry_run else 'updated'} (ids {from_id}-{to_id}, last id {after_id})")
     except Exception as e:
-        session.rollback()
-        print("❌ Error during backfill:", e)
+        db.rollback()
+        print(f"❌ Error during backfill after id {after_id}: {e}")
+        raise
     finally:
-        session.close()
+        db.close()
+    stats["unmatched_names"] = unmatched
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def _backfill_part(args) -> dict:
+    return backfill_range(*args)
+
+
+def backfill_ids(from_id: int = 0, to_id: int = 0, chunk_size: int = 5000, workers: int = 1, dry_run: bool = False) -> dict:
+    bounds = id_range(from_id, to_id)
+    if bounds is None:
+        return {"rows": 0, "matched": 0, "issuer_only": 0, "unmatched": 0, "updated": 0, "names": 0,
+                "unmatched_names": Counter(), "seconds": 0.0}
+    parts = split_range(*bounds, max(1, workers))
+    if len(parts) == 1:
+        return backfill_range(*parts[0], chunk_size, dry_run)
+
+    started = time.perf_counter()
+    # spawn: each part gets a fresh process with its own engine and name index
+    with ProcessPoolExecutor(len(parts), mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(_backfill_part, [(low, high, chunk_size, dry_run) for low, high in parts]))
+    total = {key: sum(r[key] for r in results) for key in ("rows", "matched", "issuer_only", "unmatched", "updated", "names")}
+    total["unmatched_names"] = sum((r["unmatched_names"] for r in results), Counter())
+    total["seconds"] = time.perf_counter() - started
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill issuer_id/card_id of extracted cards from their names")
+    parser.add_argument("--from-id", type=int, default=0)
+    parser.add_argument("--to-id", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="Processes, each backfilling a slice of the id range")
+    parser.add_argument("--dry-run", action="store_true", help="Resolve and report match rates without writing")
+    args = parser.parse_args()
+
+    result = backfill_ids(args.from_id, args.to_id, args.chunk_size, args.workers, args.dry_run)
+    rows = result["rows"]
+    for label, key in (("card and issuer", "matched"), ("issuer only", "issuer_only"), ("no match", "unmatched")):
+        print(f"{label:<18}{result[key]:>10}{(result[key] / rows if rows else 0):>8.0%}")
+    if result["unmatched_names"]:
+        print("Most common unmatched names:")
+        for (issuer, card_name), count in result["unmatched_names"].most_common(10):
+            print(f"  {count:>8}  {issuer} / {card_name}")
+    verb = "Would update" if args.dry_run else "Updated"
+    print(f"✅ {verb} {result['updated']} of {rows} rows missing IDs ({result['names']} name lookups) "
+          f"in {result['seconds']:.1f}s.")
+
 
 if __name__ == "__main__":
-    backfill_ids()
+    main()
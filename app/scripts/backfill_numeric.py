@@ -0,0 +1,86 @@
+# app/scripts/backfill_numeric.py
+#
+# Fill the numeric rate/fee columns (app.core.normalize.NUMERIC_COLUMNS) of
+# existing extracted_cards rows from their text columns. New rows get them at
+# ingestion; run this once after `python -m app.scripts.migrate` added the
+# columns, or again after the parsing rules change.
+#
+#   python -m app.scripts.backfill_numeric [--year 2024] [--quarter Q1] [--chunk-size 5000] [--dry-run]
+#
+# Rows are read in id order chunk by chunk (keyset, no OFFSET), parsed as one
+# pandas frame per chunk and written back with one bulk UPDATE and one commit
+# per chunk, so an interrupted run keeps what it finished.
+
+import argparse
+import time
+
+import pandas as pd
+from sqlalchemy import select, update
+
+from app.core.normalize import NUMERIC_COLUMNS, RAW_COLUMNS, normalize_frame
+from app.db.database import SessionLocal
+from app.db.models import ExtractedCard
+
+
+def read_chunk(db, after_id: int, chunk_size: int, year: int, quarter: str) -> pd.DataFrame:
+    stmt = select(ExtractedCard.id, *(getattr(ExtractedCard, c) for c in RAW_COLUMNS))
+    if year:
+        stmt = stmt.where(ExtractedCard.year == year)
+    if quarter:
+        stmt = stmt.where(ExtractedCard.quarter == quarter)
+    stmt = stmt.where(ExtractedCard.id > after_id).order_by(ExtractedCard.id).limit(chunk_size)
+    rows = db.execute(stmt).all()
+    return pd.DataFrame(rows, columns=["id", *RAW_COLUMNS])
+
+
+def backfill_numeric(year: int = 0, quarter: str = "", chunk_size: int = 5000, dry_run: bool = False) -> dict:
+    db = SessionLocal()
+    started = time.perf_counter()
+    rows = 0
+    filled = {column: 0 for column in NUMERIC_COLUMNS}
+    after_id = 0
+    try:
+        while True:
+            frame = read_chunk(db, after_id, chunk_size, year, quarter)
+            if frame.empty:
+                break
+            after_id = int(frame["id"].iloc[-1])
+            numeric = normalize_frame(frame)
+            rows += len(frame)
+            for column, count in numeric.notna().sum().items():
+                filled[column] += int(count)
+            if not dry_run:
+                numeric.insert(0, "id", frame["id"])
+                values = numeric.astype(object).where(numeric.notna(), None).to_dict("records")
+                # ORM bulk UPDATE by primary key: one executemany per chunk
+                db.execute(update(ExtractedCard), values)
+                db.commit()
+            print(f"  {rows} rows{' parsed' if dry_run else ' updated'} (last id {after_id})")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error during backfill after id {after_id}: {e}")
+        raise
+    finally:
+        db.close()
+    return {"rows": rows, "filled": filled, "seconds": time.perf_counter() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill numeric APR/fee columns from their text")
+    parser.add_argument("--year", type=int, default=0)
+    parser.add_argument("--quarter", default="")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="Parse and report coverage without writing")
+    args = parser.parse_args()
+
+    result = backfill_numeric(args.year, args.quarter, args.chunk_size, args.dry_run)
+    rows = result["rows"]
+    print(f"{'column':<34}{'filled':>10}{'share':>8}")
+    for column, count in result["filled"].items():
+        print(f"{column:<34}{count:>10}{(count / rows if rows else 0):>8.0%}")
+    verb = "Parsed" if args.dry_run else "Backfilled"
+    print(f"✅ {verb} {rows} rows in {result['seconds']:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
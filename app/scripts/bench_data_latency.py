@@ -0,0 +1,96 @@
+# app/scripts/bench_data_latency.py
+#
+# Regression benchmark: /data latency while an archive is being ingested.
+#
+# Builds a synthetic ZIP of PDFs, starts process_zip_with_progress with a fake
+# LLM (fixed latency, no network) and keeps hitting /data on the same event
+# loop. If anything in the ingestion path blocks the loop, p99 jumps.
+#
+#   python -m app.scripts.bench_data_latency --pdfs 300 --llm-latency 0.5
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/finprintiq_bench.db")
+
+import fitz  # PyMuPDF
+import httpx
+
+from app.core import extractor
+from app.core.config import settings
+
+
+def build_archive(path: str, pdfs: int, pages: int):
+    with zipfile.ZipFile(path, "w") as z:
+        for i in range(pdfs):
+            doc = fitz.open()
+            for p in range(pages):
+                page = doc.new_page()
+                page.insert_text((72, 72), f"Bench Card {i} page {p}\nAnnual Fee $95\nPurchase APR 19.99% to 29.99%")
+            z.writestr(f"bench/card_{i}.pdf", doc.tobytes())
+            doc.close()
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    from app.main import app, progress_store
+
+    async def fake_ask_openai(text: str, fields=None) -> dict:
+        await asyncio.sleep(args.llm_latency)
+        return {"Issuer": "Bench Bank", "Card Name": text.split("\n", 1)[0], "Annual Fee ($)": "$95"}
+
+    extractor.ask_openai = fake_ask_openai
+
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    zip_path = os.path.join(settings.UPLOAD_DIR, f"bench_{uuid.uuid4()}.zip")
+    build_archive(zip_path, args.pdfs, args.pages)
+
+    upload_id = str(uuid.uuid4())
+    ingest = asyncio.create_task(
+        extractor.process_zip_with_progress(zip_path, "Q1", 2099, upload_id, progress_store)
+    )
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        while not ingest.done():
+            start = time.perf_counter()
+            response = await http.get("/data", params={"quarter": "Q1", "year": 2099})
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+            await asyncio.sleep(args.interval)
+    await ingest
+
+    state = progress_store.get(upload_id)
+    print(f"PDFs ingested:  {args.pdfs} ({state['message']})")
+    print(f"/data requests: {len(latencies)}")
+    if latencies:
+        print(f"p50: {statistics.median(latencies):.1f} ms")
+        print(f"p99: {percentile(latencies, 99):.1f} ms")
+        print(f"max: {max(latencies):.1f} ms")
+    # Latencies measured next to an ingestion that did not run mean nothing
+    if state["status"] != "completed" or state.get("failed_files", 0) > 0:
+        print(f"❌ Ingestion did not process every file ({state.get('failed_files', 0)} failed), discard these numbers")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /data latency during ingestion")
+    parser.add_argument("--pdfs", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake LLM latency in seconds")
+    parser.add_argument("--interval", type=float, default=0.05, help="Delay between /data requests")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,100 @@
+# app/scripts/bench_ingest_memory.py
+#
+# Memory benchmark: peak RSS while ingesting a large archive.
+#
+# Builds a synthetic ZIP (PDFs padded with incompressible image data so the
+# archive is genuinely large), ingests it with a fake LLM and samples the RSS
+# of this process and the PDF worker pool. Peak RSS should stay roughly flat
+# as --pdfs / --pdf-kb grow, because members are streamed from the archive.
+#
+#   python -m app.scripts.bench_ingest_memory --pdfs 500 --pdf-kb 2048
+
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/finprintiq_bench.db")
+
+import fitz  # PyMuPDF
+
+from app.core import extractor
+from app.core.config import settings
+from app.core.progress import MemoryProgressStore
+from app.db.database import init_db
+
+
+def current_rss_mb() -> float:
+    """RSS of this process from /proc (falls back to the peak on other platforms)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_archive(path: str, pdfs: int, pdf_kb: int):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as z:
+        for i in range(pdfs):
+            doc = fitz.open()
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Bench Card {i}\nAnnual Fee $95")
+            doc.embfile_add("padding.bin", os.urandom(pdf_kb * 1024))
+            z.writestr(f"bench/card_{i}.pdf", doc.tobytes())
+            doc.close()
+
+
+async def run(args):
+    init_db()
+
+    async def fake_ask_openai(text: str, fields=None) -> dict:
+        await asyncio.sleep(args.llm_latency)
+        return {"Issuer": "Bench Bank", "Card Name": f"{text.split(chr(10), 1)[0]} {uuid.uuid4()}"}
+
+    extractor.ask_openai = fake_ask_openai
+
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    zip_path = os.path.join(settings.UPLOAD_DIR, f"bench_{uuid.uuid4()}.zip")
+    build_archive(zip_path, args.pdfs, args.pdf_kb)
+    archive_mb = os.path.getsize(zip_path) / (1024 * 1024)
+
+    baseline = current_rss_mb()
+    peak = baseline
+    store = MemoryProgressStore()
+    upload_id = str(uuid.uuid4())
+    started = time.perf_counter()
+    ingest = asyncio.create_task(extractor.process_zip_with_progress(zip_path, "Q1", 2099, upload_id, store))
+    while not ingest.done():
+        peak = max(peak, current_rss_mb())
+        await asyncio.sleep(0.05)
+    await ingest
+    elapsed = time.perf_counter() - started
+
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"archive size:          {archive_mb:.1f} MB ({args.pdfs} PDFs)")
+    state = store.get(upload_id)
+    print(f"ingest time:           {elapsed:.1f} s ({state['message']})")
+    print(f"RSS baseline:          {baseline:.1f} MB")
+    print(f"RSS peak (web worker): {peak:.1f} MB (+{peak - baseline:.1f} MB)")
+    print(f"RSS peak (PDF worker): {children_peak:.1f} MB")
+    # Memory of an ingestion that did not run means nothing
+    if state["status"] != "completed" or state.get("failed_files", 0) > 0:
+        print(f"❌ Ingestion did not process every file ({state.get('failed_files', 0)} failed), discard these numbers")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure peak RSS while ingesting an archive")
+    parser.add_argument("--pdfs", type=int, default=200)
+    parser.add_argument("--pdf-kb", type=int, default=1024, help="Incompressible padding per PDF")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    asyncio.run(run(parser.parse_args()))
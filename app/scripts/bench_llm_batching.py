@@ -0,0 +1,106 @@
+# app/scripts/bench_llm_batching.py
+#
+# Requests and wall time for the LLM stage with and without packing several
+# short documents per chat completion (LLMBatcher), against the local stub
+# server (started here unless --base-url points at a running one).
+#
+#   python -m app.scripts.bench_llm_batching --docs 200 --batch-docs 1 4 8 --latency-ms 400
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def stub_request(base_url: str, path: str, method: str = "GET") -> dict:
+    root = base_url.rsplit("/v1", 1)[0]
+    with urllib.request.urlopen(urllib.request.Request(root + path, method=method)) as response:
+        return json.loads(response.read())
+
+
+def start_stub(port: int, latency_ms: float, extra_args=()) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.scripts.llm_stub_server", "--port", str(port), "--latency-ms", str(latency_ms),
+         *extra_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            stub_request(f"http://127.0.0.1:{port}/v1", "/stats")
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("stub server did not start")
+
+
+def synthetic_documents(count: int):
+    return [
+        (f"--- Page 1 ---\nExample Bank {n}\nExample Card {n}\nRewards: 2% cash back on groceries.", None)
+        for n in range(count)
+    ]
+
+
+async def run_batch_size(base_url: str, documents, batch_docs: int, concurrency: int) -> dict:
+    from app.core.extractor import LLMBatcher
+
+    stub_request(base_url, "/stats/reset", method="POST")
+    batcher = LLMBatcher(batch_docs, 1500, 0.05)
+    semaphore = asyncio.Semaphore(concurrency * max(1, batch_docs))  # pipeline worker count
+
+    async def one(text, fields):
+        async with semaphore:
+            return await batcher.ask(text, fields)
+
+    started = time.perf_counter()
+    answers = await asyncio.gather(*(one(text, fields) for text, fields in documents))
+    elapsed = time.perf_counter() - started
+    correct = sum(1 for n, a in enumerate(answers) if a.get("Issuer") == f"Example Bank {n}")
+    stats = stub_request(base_url, "/stats")
+    return {"seconds": elapsed, "requests": stats["requests"], "tokens": stats["prompt_tokens"], "correct": correct}
+
+
+async def run(args, base_url: str):
+    # One event loop for every size: the provider's HTTP client is bound to it
+    documents = synthetic_documents(args.docs)
+    print(f"{'docs/request':<14}{'requests':>10}{'seconds':>10}{'docs/s':>10}{'tokens':>10}{'correct':>10}")
+    for batch_docs in args.batch_docs:
+        r = await run_batch_size(base_url, documents, batch_docs, args.concurrency)
+        print(f"{batch_docs:<14}{r['requests']:>10}{r['seconds']:>10.1f}{args.docs / r['seconds']:>10.1f}"
+              f"{r['tokens']:>10}{r['correct']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark packed LLM requests against the stub server")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--batch-docs", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--base-url", help="Use an already running OpenAI-compatible stub")
+    args = parser.parse_args()
+
+    stub = None
+    base_url = args.base_url
+    if not base_url:
+        stub = start_stub(args.port, args.latency_ms)
+        base_url = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["LLM_BASE_URL"] = base_url
+    # Fixed concurrency so only the packing differs between runs
+    os.environ["LLM_CONCURRENCY"] = os.environ["LLM_MAX_CONCURRENCY"] = str(args.concurrency)
+    try:
+        asyncio.run(run(args, base_url))
+    finally:
+        if stub is not None:
+            stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
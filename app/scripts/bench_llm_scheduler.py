@@ -0,0 +1,129 @@
+# app/scripts/bench_llm_scheduler.py
+#
+# Drive the LLM scheduler (app.core.llm.LLMScheduler) against the local stub
+# server while it injects 429s, 500s and latency, and compare it with plain
+# fixed-concurrency calls that give up on the first error.
+#
+#   python -m app.scripts.bench_llm_scheduler --requests 300 --rate-429 0.15 --rpm-limit 600
+#
+# Prints completed/failed requests, retries, 429s and wall time for both, and
+# a trace of the scheduler's concurrency limit and queue depth.
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.scripts.bench_llm_batching import start_stub, stub_request
+
+
+def messages(n: int):
+    return [
+        {"role": "system", "content": "You are a document parser."},
+        {"role": "user", "content": f"Extract the following fields from this credit card agreement:\n- Issuer\n\n"
+                                    f"Return only a JSON object.\n\nExample Bank {n}\nExample Card {n}"},
+    ]
+
+
+async def naive(provider, count: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def one(n):
+        nonlocal failed
+        async with semaphore:
+            try:
+                await provider.complete(messages(n))
+            except Exception:
+                failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(count)))
+    return {"seconds": time.perf_counter() - started, "failed": failed}
+
+
+async def scheduled(scheduler, count: int, workers: int, trace_every: float) -> dict:
+    semaphore = asyncio.Semaphore(workers)
+    failed = 0
+    trace = []
+
+    async def one(n):
+        nonlocal failed
+        async with semaphore:
+            try:
+                await scheduler.complete(messages(n))
+            except Exception:
+                failed += 1
+
+    async def tracer():
+        while True:
+            trace.append((time.perf_counter() - started, scheduler.snapshot()))
+            await asyncio.sleep(trace_every)
+
+    started = time.perf_counter()
+    trace_task = asyncio.create_task(tracer())
+    await asyncio.gather(*(one(n) for n in range(count)))
+    trace_task.cancel()
+    return {"seconds": time.perf_counter() - started, "failed": failed, "trace": trace}
+
+
+async def run(args, base_url: str):
+    from app.core.llm import LLMScheduler, OpenAIProvider
+
+    provider = OpenAIProvider("bench", "stub", base_url)
+    stub_request(base_url, "/stats/reset", method="POST")
+    plain = await naive(provider, args.requests, args.max_concurrency)
+    plain_stats = stub_request(base_url, "/stats")
+
+    stub_request(base_url, "/stats/reset", method="POST")
+    scheduler = LLMScheduler(
+        provider, rpm=args.rpm_budget, tpm=0, initial_concurrency=args.concurrency,
+        max_concurrency=args.max_concurrency, max_retries=args.max_retries, timeout=30,
+        backoff_base=args.backoff_base, backoff_max=10, completion_tokens=50,
+    )
+    result = await scheduled(scheduler, args.requests, args.max_concurrency, args.trace_every)
+    sched_stats = stub_request(base_url, "/stats")
+
+    print(f"{'':<22}{'completed':>10}{'failed':>8}{'retries':>9}{'429s':>7}{'seconds':>9}")
+    print(f"{'fixed, no retries':<22}{args.requests - plain['failed']:>10}{plain['failed']:>8}{0:>9}"
+          f"{plain_stats['rejected_429']:>7}{plain['seconds']:>9.1f}")
+    print(f"{'LLMScheduler':<22}{args.requests - result['failed']:>10}{result['failed']:>8}{scheduler.retries:>9}"
+          f"{sched_stats['rejected_429']:>7}{result['seconds']:>9.1f}")
+    print("\nscheduler trace (t, limit, in flight, queue depth, req/min):")
+    for t, snap in result["trace"][::max(1, len(result["trace"]) // 15)]:
+        print(f"  {t:6.1f}s  limit={snap['concurrency_limit']:<3} in_flight={snap['in_flight']:<3} "
+              f"queue={snap['queue_depth']:<4} rpm={snap['requests_per_min']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM scheduler against injected 429s and latency")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=4, help="Initial AIMD window")
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--backoff-base", type=float, default=0.25)
+    parser.add_argument("--rpm-budget", type=int, default=0, help="Client-side requests/min budget (0: none)")
+    parser.add_argument("--rate-429", type=float, default=0.1)
+    parser.add_argument("--rate-500", type=float, default=0.02)
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Server-side requests/min limit")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--latency-jitter-ms", type=float, default=200)
+    parser.add_argument("--trace-every", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=8903)
+    args = parser.parse_args()
+
+    stub = start_stub(args.port, args.latency_ms, [
+        "--latency-jitter-ms", str(args.latency_jitter_ms), "--rate-429", str(args.rate_429),
+        "--rate-500", str(args.rate_500), "--rpm-limit", str(args.rpm_limit),
+    ])
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{args.port}/v1"))
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# app/scripts/bench_name_index.py
+#
+# Time and check issuer/card ID resolution (app.core.name_index) on synthetic
+# issuers/cards tables, with the names the way extraction returns them: legal
+# suffixes, the issuer repeated in the card name, trademark signs, typos.
+#
+#   python -m app.scripts.bench_name_index --issuers 2000 --cards-per-issuer 25 --lookups 20000
+#   python -m app.scripts.bench_name_index --like-sample 200
+#
+# --like-sample also times the old per-record LOWER(name) LIKE '%...%' join
+# on that many lookups, for comparison.
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core.name_index import NameIndex
+from app.db.external_models import Card, ExternalBase, Issuer
+
+WORDS = [
+    "capital", "summit", "river", "harbor", "pioneer", "liberty", "granite", "beacon", "frontier", "heritage",
+    "coastal", "prairie", "union", "citizens", "first", "peoples", "valley", "metro", "horizon", "keystone",
+]
+PRODUCTS = [
+    "rewards", "cash", "platinum", "gold", "travel", "secured", "student", "preferred", "select", "premier",
+    "miles", "points", "everyday", "business", "elite", "classic",
+]
+SUFFIXES = ["", " Bank", " Bank, N.A.", " Financial", " Credit Union", " National Association"]
+
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name) - 1)
+    return name[:i] + name[i + 1:]
+
+
+def build_tables(db: Session, issuers: int, cards_per_issuer: int, rng: random.Random):
+    issuer_names, card_names = {}, {}
+    used = set()
+    while len(issuer_names) < issuers:
+        name = " ".join(w.title() for w in rng.sample(WORDS, 2)) + (f" {len(issuer_names)}" if rng.random() < 0.3 else "")
+        if name not in used:
+            used.add(name)
+            issuer_names[len(issuer_names) + 1] = name
+    card_id = 0
+    for issuer_id in issuer_names:
+        seen = set()
+        while len(seen) < cards_per_issuer:
+            seen.add(" ".join(w.title() for w in rng.sample(PRODUCTS, rng.choice((1, 2, 3)))))
+        for name in sorted(seen):
+            card_id += 1
+            card_names[card_id] = (issuer_id, name)
+    db.execute(insert(Issuer), [{"issuer_id": i, "name": n} for i, n in issuer_names.items()])
+    db.execute(insert(Card), [{"card_id": c, "name": n, "issuer_id": i} for c, (i, n) in card_names.items()])
+    db.commit()
+    return issuer_names, card_names
+
+
+def extracted_names(issuer_names, card_names, lookups: int, rng: random.Random):
+    """(issuer text, card text, expected issuer_id, expected card_id) as an extraction might return them"""
+    queries = []
+    card_ids = list(card_names)
+    for _ in range(lookups):
+        card_id = rng.choice(card_ids)
+        issuer_id, card = card_names[card_id]
+        issuer = issuer_names[issuer_id] + rng.choice(SUFFIXES)
+        if rng.random() < 0.3:
+            card = f"{issuer_names[issuer_id]} {card}"
+        if rng.random() < 0.3:
+            card += rng.choice(("®", " Card", " Credit Card", " Visa Signature®"))
+        if rng.random() < 0.1:
+            card = typo(card, rng)
+        if rng.random() < 0.05:
+            issuer = typo(issuer, rng)
+        queries.append((issuer.upper() if rng.random() < 0.2 else issuer, card, issuer_id, card_id))
+    return queries
+
+
+def like_lookup(db: Session, issuer_name: str, card_name: str):
+    return db.query(Card.card_id, Issuer.issuer_id).join(Issuer, Card.issuer_id == Issuer.issuer_id).filter(
+        func.lower(Card.name).like(f"%{card_name.lower()}%"),
+        func.lower(Issuer.name).like(f"%{issuer_name.lower()}%"),
+    ).first()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark issuer/card name resolution")
+    parser.add_argument("--issuers", type=int, default=2000)
+    parser.add_argument("--cards-per-issuer", type=int, default=25)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--like-sample", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    ExternalBase.metadata.create_all(engine)
+    db = Session(engine)
+    issuer_names, card_names = build_tables(db, args.issuers, args.cards_per_issuer, rng)
+    queries = extracted_names(issuer_names, card_names, args.lookups, rng)
+
+    index = NameIndex()
+    started = time.perf_counter()
+    index.refresh(db, force=True)
+    print(f"load: {time.perf_counter() - started:.2f}s for {len(issuer_names)} issuers, {len(card_names)} cards")
+
+    started = time.perf_counter()
+    results = [index._resolve(issuer, card) for issuer, card, _, _ in queries]
+    seconds = time.perf_counter() - started
+    issuers_ok = sum(r[0] == q[2] for r, q in zip(results, queries))
+    cards_ok = sum(r == (q[2], q[3]) for r, q in zip(results, queries))
+    wrong = sum(r[1] is not None and r[1] != q[3] for r, q in zip(results, queries))
+    print(f"index, uncached: {len(queries) / seconds:,.0f} lookups/s; issuer right {issuers_ok / len(queries):.1%}, "
+          f"card right {cards_ok / len(queries):.1%}, card wrong {wrong / len(queries):.1%}")
+
+    # Ingestion sees the same names over and over; resolve() remembers them
+    for issuer, card, _, _ in queries:
+        index.resolve(issuer, card)
+    started = time.perf_counter()
+    for issuer, card, _, _ in queries:
+        index.resolve(issuer, card)
+    print(f"index, cached:   {len(queries) / (time.perf_counter() - started):,.0f} lookups/s")
+
+    if args.like_sample:
+        sample = queries[:args.like_sample]
+        started = time.perf_counter()
+        found = [like_lookup(db, issuer, card) for issuer, card, _, _ in sample]
+        seconds = time.perf_counter() - started
+        cards_ok = sum(r is not None and (r.issuer_id, r.card_id) == (q[2], q[3]) for r, q in zip(found, sample))
+        print(f"LIKE join:       {len(sample) / seconds:,.0f} lookups/s; card right {cards_ok / len(sample):.1%}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# app/scripts/bench_page_selection.py
+#
+# Compare the old prompt text (full text cut at 12,000 characters) with
+# page-selected, token-budgeted text over a local corpus of agreements.
+#
+# Offline it reports prompt tokens and "pricing-term recall": the share of
+# pricing keyword hits in the whole document that make it into the prompt.
+# With --with-llm it also calls OpenAI for both variants and counts fields
+# that came back disclosed (costs two requests per PDF).
+#
+#   python -m app.scripts.bench_page_selection --corpus ./agreements [--with-llm]
+
+import argparse
+import asyncio
+import glob
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.core.config import settings
+from app.core.pdf_text import _KEYWORD_PATTERNS, build_prompt_text, count_tokens, extract_pages
+
+LEGACY_CHAR_LIMIT = 12000
+
+
+def keyword_hits(text: str) -> int:
+    return sum(len(pattern.findall(text)) for pattern, _ in _KEYWORD_PATTERNS)
+
+
+def disclosed_fields(data: dict) -> int:
+    return sum(1 for v in data.values() if v and str(v).strip().lower() != "not disclosed")
+
+
+async def run(args):
+    paths = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+    if not paths:
+        raise SystemExit(f"No PDFs found under {args.corpus}")
+    if args.with_llm:
+        from app.core.extractor import ask_openai
+
+    totals = {"legacy_tokens": 0, "new_tokens": 0, "legacy_hits": 0, "new_hits": 0, "all_hits": 0,
+              "legacy_fields": 0, "new_fields": 0, "select_seconds": 0.0}
+    for path in paths:
+        pages = extract_pages(path)
+        full_text = "".join(pages)
+        legacy = full_text[:LEGACY_CHAR_LIMIT]
+        started = time.perf_counter()
+        packed = build_prompt_text(pages, args.budget)
+        totals["select_seconds"] += time.perf_counter() - started
+
+        totals["legacy_tokens"] += count_tokens(legacy)
+        totals["new_tokens"] += count_tokens(packed)
+        totals["all_hits"] += keyword_hits(full_text)
+        totals["legacy_hits"] += keyword_hits(legacy)
+        totals["new_hits"] += keyword_hits(packed)
+
+        if args.with_llm:
+            totals["legacy_fields"] += disclosed_fields(await ask_openai(legacy))
+            totals["new_fields"] += disclosed_fields(await ask_openai(packed))
+
+    n = len(paths)
+    all_hits = max(1, totals["all_hits"])
+    print(f"PDFs: {n}, token budget: {args.budget}")
+    print(f"{'':<28}{'legacy':>12}{'selected':>12}")
+    print(f"{'avg prompt tokens':<28}{totals['legacy_tokens'] / n:>12.0f}{totals['new_tokens'] / n:>12.0f}")
+    print(f"{'pricing-term recall':<28}{totals['legacy_hits'] / all_hits:>12.1%}{totals['new_hits'] / all_hits:>12.1%}")
+    if args.with_llm:
+        print(f"{'avg disclosed fields':<28}{totals['legacy_fields'] / n:>12.1f}{totals['new_fields'] / n:>12.1f}")
+    print(f"page selection time: {totals['select_seconds'] / n * 1000:.1f} ms/PDF")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark page selection against the 12k-character cut")
+    parser.add_argument("--corpus", required=True, help="Directory of agreement PDFs")
+    parser.add_argument("--budget", type=int, default=settings.PROMPT_TOKEN_BUDGET)
+    parser.add_argument("--with-llm", action="store_true", help="Also compare OpenAI field recovery")
+    asyncio.run(run(parser.parse_args()))
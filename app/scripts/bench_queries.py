@@ -0,0 +1,110 @@
+# app/scripts/bench_queries.py
+#
+# Query benchmark for the extracted_cards hot paths on a synthetic table.
+#
+# Loads --rows synthetic cards into a scratch database with none of the
+# secondary indexes, times the /data filters and the ingestion identity
+# lookup, then applies app.db.migrations.migrate() and times them again.
+#
+#   python -m app.scripts.bench_queries --rows 1000000
+#   python -m app.scripts.bench_queries --url mysql+pymysql://... --rows 1000000
+#
+# Point --url at a scratch database: the extracted_cards table there is dropped.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import MetaData, UniqueConstraint, create_engine, func, select
+
+from app.db.migrations import migrate
+from app.db.models import ExtractedCard
+
+QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
+
+
+def load_rows(engine, rows: int, chunk: int = 20000):
+    table = ExtractedCard.__table__
+    issuers = [f"Issuer {i}" for i in range(200)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, rows, chunk):
+            batch = []
+            for n in range(start, min(rows, start + chunk)):
+                batch.append({
+                    "issuer": random.choice(issuers),
+                    "card_name": f"Card {n // 40}",
+                    "quarter": QUARTERS[n % 4],
+                    "year": 2005 + (n // 4) % 20,
+                    "source_filename": f"card_{n}.pdf",
+                    "min_apr": "19.99%",
+                    "max_apr": "29.99%",
+                    "annual_fee": "$95",
+                    "extraction_date": now,
+                })
+            conn.execute(table.insert(), batch)
+
+
+def create_unindexed_table(engine):
+    """extracted_cards as it was before the indexes and unique key existed"""
+    bare = ExtractedCard.__table__.to_metadata(MetaData())
+    bare.constraints = {c for c in bare.constraints if not isinstance(c, UniqueConstraint)}
+    bare.indexes = set()
+    bare.drop(bind=engine, checkfirst=True)
+    bare.create(bind=engine)
+
+
+def timed(engine, stmt, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(stmt).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run_queries(engine, repeat: int):
+    t = ExtractedCard
+    queries = {
+        "/data year+quarter": select(t.id, t.issuer, t.card_name).where(t.year == 2020, t.quarter == "Q3"),
+        "/data year only": select(func.count()).select_from(t).where(t.year == 2020),
+        "identity lookup": select(t.id).where(
+            t.issuer == "Issuer 7", t.card_name == "Card 1234", t.quarter == "Q2",
+            t.year == 2010, t.source_filename == "card_49365.pdf",
+        ),
+    }
+    return {name: timed(engine, stmt, repeat) for name, stmt in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extracted_cards queries with and without indexes")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'finprintiq_query_bench.db')}")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    create_unindexed_table(engine)
+
+    started = time.perf_counter()
+    load_rows(engine, args.rows)
+    print(f"loaded {args.rows} rows in {time.perf_counter() - started:.1f} s")
+
+    before = run_queries(engine, args.repeat)
+    started = time.perf_counter()
+    migrate(engine)
+    print(f"migrate() built indexes in {time.perf_counter() - started:.1f} s")
+    after = run_queries(engine, args.repeat)
+
+    print(f"{'query':<22}{'no index (ms)':>16}{'indexed (ms)':>16}")
+    for name in before:
+        print(f"{name:<22}{before[name]:>16.1f}{after[name]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
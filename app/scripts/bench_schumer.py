@@ -0,0 +1,203 @@
+# app/scripts/bench_schumer.py
+#
+# Throughput and accuracy of the Schumer box parser (app.core.schumer) on a
+# fixture corpus. Each fixture is a PDF with a sidecar <name>.json holding the
+# expected values keyed like EXTRACTION_PROMPT ("Min APR (%)", "Annual Fee ($)", ...).
+#
+# Generate a synthetic corpus (ruled tables, unruled two-column boxes and
+# bulleted fee cells, with filler pages around the box), then benchmark it:
+#
+#   python -m app.scripts.bench_schumer --make-fixtures ./schumer_fixtures --count 200
+#   python -m app.scripts.bench_schumer --corpus ./schumer_fixtures
+#
+# Hand-labelled real agreements can be dropped into the same directory.
+
+import argparse
+import glob
+import json
+import os
+import random
+import time
+from collections import Counter
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import fitz  # PyMuPDF
+
+from app.core.schumer import FIELD_NAMES, parse_schumer_box
+
+FILLER = (
+    "This Agreement governs your credit card account. Please read it carefully and keep it "
+    "for your records. We may change the terms of this Agreement at any time subject to "
+    "applicable law. Notices will be sent to the address on file. "
+)
+LAYOUTS = ["table", "plain", "bulleted"]
+
+
+def _rate() -> float:
+    return round(random.choice([13.99, 16.24, 17.49, 19.99, 20.24, 21.74, 22.99, 24.49]) + random.choice([0, 0.25]), 2)
+
+
+def random_terms() -> dict:
+    low = _rate()
+    high = round(low + random.choice([6, 8, 10]), 2)
+    return {
+        "intro": random.random() < 0.5,
+        "low": low,
+        "high": high,
+        "penalty": 29.99,
+        "cash_apr": round(high + 1, 2),
+        "annual_fee": random.choice([0, 0, 39, 95, 250, 550]),
+        "late_fee": random.choice([29, 39, 40, 41]),
+        "fx": random.choice([0, 3]),
+        "ca_pct": 5,
+        "ca_min": 10,
+        "bt_pct": random.choice([3, 5]),
+        "bt_min": 5,
+        "min_interest": random.choice([0.5, 1.0, 2.0]),
+    }
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.2f}"
+
+
+def box_rows(t: dict) -> list:
+    purchase = f"{_fmt(t['low'])}% to {_fmt(t['high'])}%, based on your creditworthiness."
+    if t["intro"]:
+        purchase = f"0% intro APR for 15 months from account opening, then {purchase}"
+    return [
+        ("Annual Percentage Rate (APR) for Purchases", purchase),
+        ("APR for Balance Transfers", f"{_fmt(t['low'])}% to {_fmt(t['high'])}%."),
+        ("APR for Cash Advances", f"{_fmt(t['cash_apr'])}%. This APR will vary with the market."),
+        ("Penalty APR and When It Applies", f"Up to {_fmt(t['penalty'])}%. This APR may be applied if you make a late payment."),
+        ("Minimum Interest Charge", f"If you are charged interest, the charge will be no less than ${t['min_interest']:.2f}."),
+        ("Annual Fee", "None" if t["annual_fee"] == 0 else f"${t['annual_fee']}"),
+        ("Balance Transfer", f"Either ${t['bt_min']} or {t['bt_pct']}% of the amount of each transfer, whichever is greater."),
+        ("Cash Advance", f"Either ${t['ca_min']} or {t['ca_pct']}% of the amount of each cash advance, whichever is greater."),
+        ("Foreign Transaction", "None" if t["fx"] == 0 else f"{t['fx']}% of each transaction in U.S. dollars."),
+        ("Late Payment", f"Up to ${t['late_fee']}."),
+    ]
+
+
+def expected_fields(t: dict) -> dict:
+    return {
+        FIELD_NAMES["min_apr"]: f"{t['low']:g}%",
+        FIELD_NAMES["max_apr"]: f"{t['high']:g}%",
+        FIELD_NAMES["penalty_apr"]: f"{t['penalty']:g}%",
+        FIELD_NAMES["cash_advance_apr"]: f"{t['cash_apr']:g}%",
+        FIELD_NAMES["annual_fee"]: "None" if t["annual_fee"] == 0 else f"${t['annual_fee']}",
+        FIELD_NAMES["late_fee"]: f"${t['late_fee']}",
+        FIELD_NAMES["foreign_txn_fee"]: "None" if t["fx"] == 0 else f"{t['fx']}%",
+        FIELD_NAMES["cash_advance_fee"]: f"{t['ca_pct']}% (min ${t['ca_min']})",
+        FIELD_NAMES["balance_transfer_fee"]: f"{t['bt_pct']}% (min ${t['bt_min']})",
+        FIELD_NAMES["min_interest_charge"]: f"${t['min_interest']:g}",
+    }
+
+
+def draw_box(page, rows: list, layout: str):
+    page.insert_text((50, 60), "Interest Rates and Interest Charges", fontsize=12)
+    y = 80
+    if layout == "bulleted":
+        fees = rows[6:9]
+        rows = rows[:6] + [
+            ("Transaction Fees\n" + "\n".join(f"• {label}" for label, _ in fees),
+             "\n".join(f"• {value}" for _, value in fees)),
+        ] + rows[9:]
+    for label, value in rows:
+        height = 90 if "•" in label else 40
+        if layout != "plain":
+            page.draw_rect(fitz.Rect(50, y, 250, y + height))
+            page.draw_rect(fitz.Rect(250, y, 560, y + height))
+        # The base-14 fonts have no bullet glyph; a built-in CJK font does
+        font = "japan" if "•" in label else "helv"
+        page.insert_textbox(fitz.Rect(53, y + 2, 247, y + height - 2), label, fontsize=8, fontname=font)
+        page.insert_textbox(fitz.Rect(262, y + 2, 557, y + height - 2), value, fontsize=8, fontname=font)
+        y += height
+
+
+def make_fixtures(directory: str, count: int, seed: int):
+    random.seed(seed)
+    os.makedirs(directory, exist_ok=True)
+    for n in range(count):
+        terms = random_terms()
+        layout = LAYOUTS[n % len(LAYOUTS)]
+        doc = fitz.open()
+        cover = doc.new_page()
+        cover.insert_textbox(fitz.Rect(50, 50, 560, 300), f"Example Bank\nExample Rewards Card {n}\n\n" + FILLER * 3, fontsize=9)
+        draw_box(doc.new_page(), box_rows(terms), layout)
+        for _ in range(random.randint(1, 6)):
+            doc.new_page().insert_textbox(fitz.Rect(50, 50, 560, 780), FILLER * 12, fontsize=9)
+        base = os.path.join(directory, f"fixture_{n:04d}_{layout}")
+        doc.save(base + ".pdf")
+        doc.close()
+        with open(base + ".json", "w") as f:
+            json.dump(expected_fields(terms), f, indent=2)
+    print(f"wrote {count} fixtures to {directory}")
+
+
+def _norm(value) -> str:
+    return "".join(str(value).lower().split())
+
+
+def run(corpus: str):
+    paths = sorted(p for p in glob.glob(os.path.join(corpus, "**", "*.pdf"), recursive=True)
+                   if os.path.exists(os.path.splitext(p)[0] + ".json"))
+    if not paths:
+        raise SystemExit(f"No labelled PDFs (<name>.pdf + <name>.json) under {corpus}")
+
+    expected_total = resolved = correct = complete = 0
+    per_field = {name: Counter() for name in FIELD_NAMES.values()}
+    elapsed = 0.0
+    for path in paths:
+        with open(os.path.splitext(path)[0] + ".json") as f:
+            expected = {k: v for k, v in json.load(f).items() if k in per_field and v != "Not disclosed"}
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        started = time.perf_counter()
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            found = parse_schumer_box(doc)
+        finally:
+            doc.close()
+        elapsed += time.perf_counter() - started
+
+        expected_total += len(expected)
+        complete += all(field in found for field in expected)
+        for field, value in expected.items():
+            per_field[field]["expected"] += 1
+            if field not in found:
+                continue
+            resolved += 1
+            per_field[field]["resolved"] += 1
+            if _norm(found[field]) == _norm(value):
+                correct += 1
+                per_field[field]["correct"] += 1
+
+    n = len(paths)
+    print(f"PDFs: {n}")
+    print(f"throughput: {n / elapsed:.1f} PDFs/s ({elapsed / n * 1000:.1f} ms/PDF, single process)")
+    print(f"coverage: {resolved / max(1, expected_total):.1%} of labelled fields resolved locally")
+    print(f"precision: {correct / max(1, resolved):.1%} of resolved fields match the label")
+    print(f"PDFs with every numeric field resolved: {complete / n:.1%}")
+    print(f"{'field':<30}{'coverage':>10}{'precision':>11}")
+    for field, counts in per_field.items():
+        if counts["expected"]:
+            print(f"{field:<30}{counts['resolved'] / counts['expected']:>10.1%}"
+                  f"{counts['correct'] / max(1, counts['resolved']):>11.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Schumer box parser")
+    parser.add_argument("--corpus", help="Directory of labelled fixture PDFs")
+    parser.add_argument("--make-fixtures", metavar="DIR", help="Write a synthetic labelled corpus to DIR")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.make_fixtures:
+        make_fixtures(args.make_fixtures, args.count, args.seed)
+    if args.corpus:
+        run(args.corpus)
+    elif not args.make_fixtures:
+        parser.error("pass --corpus and/or --make-fixtures")
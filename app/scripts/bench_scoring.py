@@ -0,0 +1,122 @@
+# app/scripts/bench_scoring.py
+#
+# Time the scoring engine (app.core.scoring) on synthetic history: a full
+# rescore of N cards x Q quarters, and the incremental rescore after one new
+# quarter (only that quarter's rows plus TREND_WINDOW quarters of history).
+#
+#   python -m app.scripts.bench_scoring --cards 100000 --quarters 20
+#   python -m app.scripts.bench_scoring --cards 20000 --quarters 8 --db /tmp/scoring.db
+#
+# With --db the same is done end to end through SQLite (load, compute, bulk
+# UPDATE) on a fresh database at that path.
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def synthetic_history(cards: int, quarters: int, seed: int) -> pd.DataFrame:
+    from app.core.scoring import SCORE_COLUMNS, SCORE_COMPONENTS
+
+    rng = np.random.default_rng(seed)
+    rows = cards * quarters
+    card = np.repeat(np.arange(cards), quarters)
+    period = np.tile(np.arange(quarters), cards) + 2015 * 4
+    frame = pd.DataFrame({
+        "id": np.arange(1, rows + 1),
+        "issuer": pd.Series(card % 500).map("Issuer {}".format),
+        "card_name": pd.Series(card).map("Card {}".format),
+        "quarter": pd.Series(period % 4 + 1).map("Q{}".format),
+        "year": period // 4,
+    })
+    # Per-card level plus a drift and some quarter-to-quarter noise
+    level = rng.uniform(0.2, 0.8, cards)[card]
+    drift = rng.normal(0, 0.01, cards)[card] * (period - period.min())
+    for column, (_, best, worst) in SCORE_COMPONENTS.items():
+        share = np.clip(level + drift + rng.normal(0, 0.03, rows), 0, 1)
+        values = np.round(best + share * (worst - best), 2)
+        frame[column] = np.where(rng.random(rows) < 0.1, np.nan, values)
+    for column in SCORE_COLUMNS:
+        frame[column] = None
+    return frame
+
+
+def bench_memory(frame: pd.DataFrame):
+    from app.core.scoring import QUARTER_NUMBERS, TREND_WINDOW, compute_scores
+
+    started = time.perf_counter()
+    scores = compute_scores(frame)
+    full = time.perf_counter() - started
+    print(f"full rescore, {len(frame)} rows: {full:.2f}s ({len(frame) / full:,.0f} rows/s)")
+
+    period = frame["year"] * 4 + frame["quarter"].map(QUARTER_NUMBERS)
+    latest = period.max()
+    window = frame[period >= latest - TREND_WINDOW]
+    started = time.perf_counter()
+    incremental = compute_scores(window)
+    part = time.perf_counter() - started
+    new_rows = int((period == latest).sum())
+    same = incremental[period[window.index] == latest].fillna(-1).eq(scores[period == latest].fillna(-1)).all().all()
+    print(f"one new quarter, {new_rows} rows (+{len(window) - new_rows} history): {part:.2f}s, "
+          f"matches full rescore: {same}")
+    print(scores["grade"].value_counts().sort_index().to_dict())
+
+
+def bench_db(frame: pd.DataFrame, path: str):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.scoring import QUARTER_NUMBERS, period_of, score_cards
+    from app.db.models import Base, ExtractedCard
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    period = frame["year"] * 4 + frame["quarter"].map(QUARTER_NUMBERS)
+    latest = int(period.max())
+    old, new = frame[period < latest], frame[period == latest]
+    columns = [c for c in frame.columns if c in ExtractedCard.__table__.columns]
+    old[columns].assign(source_filename="bench.pdf").to_sql(
+        ExtractedCard.__tablename__, engine, if_exists="append", index=False, chunksize=20000
+    )
+    db = sessionmaker(bind=engine)()
+    started = time.perf_counter()
+    result = score_cards(db)
+    print(f"db full rescore: {result['rows']} rows, {result['updated']} written, {time.perf_counter() - started:.2f}s")
+
+    new[columns].assign(source_filename="bench.pdf").to_sql(
+        ExtractedCard.__tablename__, engine, if_exists="append", index=False, chunksize=20000
+    )
+    keys = list(zip(new["issuer"], new["card_name"]))
+    quarter = f"Q{latest % 4 + 1}"
+    started = time.perf_counter()
+    result = score_cards(db, keys, since=period_of(quarter, latest // 4))
+    print(f"db new quarter: {result['rows']} rows, {result['updated']} written, {time.perf_counter() - started:.2f}s")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full and incremental card scoring")
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--quarters", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", help="Also run end to end against a fresh SQLite database at this path")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    frame = synthetic_history(args.cards, args.quarters, args.seed)
+    print(f"generated {len(frame)} rows in {time.perf_counter() - started:.1f}s")
+    bench_memory(frame)
+    if args.db:
+        bench_db(frame, args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# app/scripts/llm_batch.py
+#
+# Offline extraction for non-urgent quarterly backfills through the provider's
+# batch API: submit an archive as one batch job, poll it, ingest the results.
+#
+#   python -m app.scripts.llm_batch submit agreements.zip --quarter Q1 --year 2024
+#   python -m app.scripts.llm_batch status <batch_id>
+#   python -m app.scripts.llm_batch ingest <batch_id>
+#   python -m app.scripts.llm_batch run agreements.zip --quarter Q1 --year 2024 [--poll-seconds 60]
+#
+# Set LLM_BASE_URL to run against app.scripts.llm_stub_server instead of OpenAI.
+
+import argparse
+import asyncio
+
+from app.core.llm_batch import batch_status, ingest_batch, submit_zip_batch, wait_for_batch
+from app.db.database import init_db
+
+
+async def submit(args) -> str:
+    batch_id, counts = await submit_zip_batch(args.zip, args.quarter, args.year)
+    print(f"{counts['files']} files: {counts['cached']} from cache, {counts['submitted']} submitted, "
+          f"{counts['unreadable']} unreadable")
+    if batch_id:
+        print(f"batch id: {batch_id}")
+    return batch_id
+
+
+async def ingest(batch_id: str):
+    result = await ingest_batch(batch_id)
+    print(f"✅ Ingested {result['written']} of {result['documents']} documents ({result['failed']} failed).")
+
+
+async def main(args):
+    init_db()
+    if args.command == "submit":
+        await submit(args)
+    elif args.command == "status":
+        print(await batch_status(args.batch_id))
+    elif args.command == "ingest":
+        await ingest(args.batch_id)
+    elif args.command == "run":
+        batch_id = await submit(args)
+        if not batch_id:
+            return
+        status = await wait_for_batch(batch_id, args.poll_seconds)
+        if status["status"] != "completed":
+            raise SystemExit(f"Batch {batch_id} ended as {status['status']}")
+        await ingest(batch_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline batch extraction")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("submit", "run"):
+        command = commands.add_parser(name)
+        command.add_argument("zip", help="ZIP archive of agreement PDFs")
+        command.add_argument("--quarter", required=True)
+        command.add_argument("--year", type=int, required=True)
+        if name == "run":
+            command.add_argument("--poll-seconds", type=float, default=60.0)
+    for name in ("status", "ingest"):
+        commands.add_parser(name).add_argument("batch_id")
+    asyncio.run(main(parser.parse_args()))
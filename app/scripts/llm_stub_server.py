@@ -0,0 +1,256 @@
+# app/scripts/llm_stub_server.py
+#
+# Local stand-in for the OpenAI API, for tests and benchmarks of the LLM stage
+# without network access or cost. Serves the endpoints OpenAIProvider uses:
+#
+#   POST /v1/chat/completions            single and packed (multi-document) prompts
+#   POST /v1/files, GET /v1/files/{id}/content
+#   POST /v1/batches, GET /v1/batches/{id}
+#   GET  /stats, POST /stats/reset       request/document/token counters
+#
+# Answers are deterministic: Issuer and Card Name are the first two lines of
+# the document, every other requested field is "Not disclosed".
+#
+# Chat completions can be made to misbehave like the real API under load:
+# random 429s/500s, a server-side requests-per-minute limit (429 with
+# Retry-After once exceeded) and jittered latency. --rate-malformed makes a
+# share of answers look like a model's slips (code fences, trailing commas,
+# prose around the object, a cut-off answer, a missing field) to exercise
+# app.core.structured's repairs and the per-field re-ask.
+#
+#   python -m app.scripts.llm_stub_server --port 8900 --latency-ms 400
+#   python -m app.scripts.llm_stub_server --rate-429 0.2 --rpm-limit 300 --latency-jitter-ms 200
+#   python -m app.scripts.llm_stub_server --rate-malformed 0.3
+#   LLM_BASE_URL=http://127.0.0.1:8900/v1 uvicorn app.main:app
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import deque
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+app = FastAPI()
+config = {
+    "latency_ms": 0.0, "latency_jitter_ms": 0.0, "latency_per_1k_tokens_ms": 0.0, "batch_delay": 0.0,
+    "rate_429": 0.0, "rate_500": 0.0, "rpm_limit": 0, "rate_malformed": 0.0,
+}
+stats = {
+    "requests": 0, "documents": 0, "prompt_tokens": 0, "rejected_429": 0, "rejected_500": 0, "max_in_flight": 0,
+    "malformed": 0,
+}
+_accepted = deque()  # times of accepted chat completions in the last 60 s, for --rpm-limit
+_in_flight = 0
+files: Dict[str, Dict] = {}
+batches: Dict[str, Dict] = {}
+
+_DOCUMENT = re.compile(r"^=== Document (\d+) ===$", re.M)
+_PAGE = re.compile(r"^--- Page \d+ ---$", re.M)
+
+
+def requested_fields(prompt: str) -> List[str]:
+    return re.findall(r"^- (.+)$", prompt.split("\n\n")[0], re.M)
+
+
+def answer_document(text: str, fields: List[str]) -> Dict[str, str]:
+    lines = [line.strip() for line in _PAGE.sub("", text).splitlines() if line.strip()]
+    answer = {field: "Not disclosed" for field in fields}
+    if "Issuer" in answer and lines:
+        answer["Issuer"] = lines[0]
+    if "Card Name" in answer and len(lines) > 1:
+        answer["Card Name"] = lines[1]
+    return answer
+
+
+def answer_prompt(prompt: str) -> Dict:
+    fields = requested_fields(prompt)
+    parts = _DOCUMENT.split(prompt)
+    if len(parts) > 1:
+        # parts = [instructions, "1", text1, "2", text2, ...]
+        stats["documents"] += len(parts) // 2
+        return {parts[i]: answer_document(parts[i + 1], fields) for i in range(1, len(parts), 2)}
+    stats["documents"] += 1
+    body = prompt.split("\n\n", 2)[-1]
+    return answer_document(body, fields)
+
+
+def malformed(answer: Dict) -> str:
+    """The answer serialized the way a model sometimes gets it wrong"""
+    stats["malformed"] += 1
+    text = json.dumps(answer, indent=2)
+    kind = random.choice(["fence", "trailing_comma", "prose", "truncated", "missing_field"])
+    if kind == "fence":
+        return f"```json\n{text}\n```"
+    if kind == "trailing_comma":
+        return text[:-2] + ",\n}"
+    if kind == "prose":
+        return f"Here is the extracted data:\n{text}\nLet me know if you need anything else."
+    if kind == "truncated":
+        return text[:random.randint(len(text) // 2, len(text) - 2)]
+    if answer:
+        answer = dict(answer)
+        answer.pop(random.choice(list(answer)))
+    return json.dumps(answer)
+
+
+def completion(messages: List[Dict], model: str) -> Dict:
+    prompt = messages[-1]["content"]
+    tokens = len(prompt) // 4 + 1
+    stats["requests"] += 1
+    stats["prompt_tokens"] += tokens
+    answer = answer_prompt(prompt)
+    content = malformed(answer) if random.random() < config["rate_malformed"] else json.dumps(answer)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": tokens, "completion_tokens": 50, "total_tokens": tokens + 50},
+    }
+
+
+def _error(status: int, message: str, retry_after: float = 0) -> JSONResponse:
+    headers = {"retry-after": f"{retry_after:.2f}"} if retry_after else {}
+    kind = "rate_limit_exceeded" if status == 429 else "server_error"
+    return JSONResponse({"error": {"message": message, "type": kind, "code": kind}}, status_code=status, headers=headers)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    global _in_flight
+    body = await request.json()
+    now = time.monotonic()
+    while _accepted and _accepted[0] <= now - 60:
+        _accepted.popleft()
+    if config["rpm_limit"] and len(_accepted) >= config["rpm_limit"]:
+        stats["rejected_429"] += 1
+        return _error(429, "Rate limit reached for requests per min", retry_after=_accepted[0] + 60 - now)
+    if random.random() < config["rate_429"]:
+        stats["rejected_429"] += 1
+        return _error(429, "Rate limit reached (injected)")
+    if random.random() < config["rate_500"]:
+        stats["rejected_500"] += 1
+        return _error(500, "Internal error (injected)")
+    _accepted.append(now)
+
+    tokens = len(body["messages"][-1]["content"]) // 4 + 1
+    delay = config["latency_ms"] + random.uniform(0, config["latency_jitter_ms"])
+    delay += config["latency_per_1k_tokens_ms"] * tokens / 1000
+    _in_flight += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], _in_flight)
+    try:
+        await asyncio.sleep(delay / 1000)
+    finally:
+        _in_flight -= 1
+    return completion(body["messages"], body.get("model", "stub"))
+
+
+@app.post("/v1/files")
+async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    content = await file.read()
+    file_id = f"file-{uuid.uuid4().hex}"
+    files[file_id] = {"content": content.decode("utf-8"), "filename": file.filename, "purpose": purpose}
+    return _file_object(file_id)
+
+
+def _file_object(file_id: str) -> Dict:
+    f = files[file_id]
+    return {
+        "id": file_id, "object": "file", "bytes": len(f["content"]), "created_at": int(time.time()),
+        "filename": f["filename"], "purpose": f["purpose"], "status": "processed",
+    }
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return PlainTextResponse(files[file_id]["content"])
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    body = await request.json()
+    if body["input_file_id"] not in files:
+        raise HTTPException(status_code=404, detail="No such file")
+    output = []
+    for line in files[body["input_file_id"]]["content"].splitlines():
+        item = json.loads(line)
+        output.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": item["custom_id"],
+            "response": {"status_code": 200, "body": completion(item["body"]["messages"], item["body"].get("model", "stub"))},
+            "error": None,
+        }))
+    output_id = f"file-{uuid.uuid4().hex}"
+    files[output_id] = {"content": "\n".join(output), "filename": "output.jsonl", "purpose": "batch_output"}
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    batches[batch_id] = {
+        "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "input_file_id": body["input_file_id"],
+        "completion_window": body["completion_window"], "created_at": int(time.time()),
+        "ready_at": time.time() + config["batch_delay"], "output_file_id": output_id, "total": len(output),
+    }
+    return _batch_object(batch_id)
+
+
+def _batch_object(batch_id: str) -> Dict:
+    b = batches[batch_id]
+    done = time.time() >= b["ready_at"]
+    return {
+        "id": b["id"], "object": "batch", "endpoint": b["endpoint"], "input_file_id": b["input_file_id"],
+        "completion_window": b["completion_window"], "created_at": b["created_at"],
+        "status": "completed" if done else "in_progress",
+        "output_file_id": b["output_file_id"] if done else None, "error_file_id": None,
+        "request_counts": {"total": b["total"], "completed": b["total"] if done else 0, "failed": 0},
+    }
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="No such batch")
+    return _batch_object(batch_id)
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    for key in stats:
+        stats[key] = 0
+    _accepted.clear()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for extraction tests")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed latency per chat completion")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0, help="Extra random latency up to this")
+    parser.add_argument("--latency-per-1k-tokens-ms", type=float, default=0.0)
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="Seconds before a batch job completes")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Share of chat completions answered with 429")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="Share of chat completions answered with 500")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="429 with Retry-After beyond this many requests/min")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="Share of answers with broken/incomplete JSON")
+    args = parser.parse_args()
+    config.update(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                  latency_per_1k_tokens_ms=args.latency_per_1k_tokens_ms, batch_delay=args.batch_delay,
+                  rate_429=args.rate_429, rate_500=args.rate_500, rpm_limit=args.rpm_limit,
+                  rate_malformed=args.rate_malformed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
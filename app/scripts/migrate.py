@@ -0,0 +1,30 @@
+# app/scripts/migrate.py
+#
+# Apply schema changes (new tables, columns, indexes, unique keys) to an
+# existing database. Safe to run repeatedly, e.g. as a release step.
+#
+#   python -m app.scripts.migrate [--dry-run]
+
+import argparse
+
+from app.db.database import engine
+from app.db.migrations import migrate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the database schema to match the models")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the planned changes")
+    args = parser.parse_args()
+
+    changes = migrate(engine, dry_run=args.dry_run)
+    if not changes:
+        print("✅ Schema is up to date.")
+        return
+    for change in changes:
+        print(("would " if args.dry_run else "") + change)
+    if not args.dry_run:
+        print(f"✅ Applied {len(changes)} schema changes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# app/scripts/score_cards.py
+#
+# Recompute base_score, trend_bonus, volatility_score, volatility_penalty,
+# final_score and grade (app.core.scoring) for extracted cards. Ingestion
+# rescoring only covers the cards it wrote; run this after changing the
+# scoring rules, after backfill_numeric, or to score an existing database.
+#
+#   python -m app.scripts.score_cards [--since-year 2024 --since-quarter Q1] [--chunk-size 5000]
+
+import argparse
+import time
+
+from app.core.scoring import period_of, score_cards
+from app.db.database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every card (or every card from a quarter on)")
+    parser.add_argument("--since-year", type=int, default=0, help="Only rescore this quarter and later")
+    parser.add_argument("--since-quarter", default="Q1")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per UPDATE batch and commit")
+    args = parser.parse_args()
+
+    since = period_of(args.since_quarter, args.since_year) if args.since_year else None
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        result = score_cards(db, since=since, chunk_size=args.chunk_size)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error during scoring: {e}")
+        raise
+    finally:
+        db.close()
+    print(f"✅ Scored {result['rows']} rows, {result['updated']} changed, in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
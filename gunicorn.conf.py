@@ -0,0 +1,24 @@
+# gunicorn.conf.py
+#
+# Loaded by gunicorn from the working directory (see Procfile). Workers write
+# their Prometheus metrics to PROMETHEUS_MULTIPROC_DIR so /metrics can add up
+# all of them (app.core.metrics).
+
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/finprintiq-metrics")
+
+
+def on_starting(server):
+    # Files of a previous master would be summed in as well
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges (in-flight requests, open streams) of a worker that is gone
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
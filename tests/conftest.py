@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Settings require these; the tests never reach OpenAI or a real database
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.name_index import NameIndex
+from app.db.external_models import Card, ExternalBase, Issuer
+from app.db.models import Base, ExtractedCard
+from app.scripts import backfill_ids
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cards.db'}")
+    Base.metadata.create_all(engine)
+    ExternalBase.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Issuer), [{"issuer_id": 1, "name": "JPMorgan Chase Bank, N.A."}])
+        conn.execute(insert(Card), [{"card_id": 10, "name": "Chase Freedom Unlimited", "issuer_id": 1}])
+    monkeypatch.setattr(backfill_ids, "SessionLocal", sessionmaker(bind=engine))
+    index = NameIndex()
+    monkeypatch.setattr(backfill_ids, "get_name_index", lambda: index)
+    yield engine
+    engine.dispose()
+
+
+def add_card(engine, card_name, issuer_id=None, card_id=None):
+    with engine.begin() as conn:
+        return conn.execute(insert(ExtractedCard).values(
+            issuer="Chase", card_name=card_name, quarter="Q1", year=2024,
+            source_filename=f"{card_name}.pdf", issuer_id=issuer_id, card_id=card_id,
+        )).inserted_primary_key[0]
+
+
+def ids(engine, row_id):
+    with engine.connect() as conn:
+        return tuple(conn.execute(
+            select(ExtractedCard.issuer_id, ExtractedCard.card_id).where(ExtractedCard.id == row_id)
+        ).one())
+
+
+def test_backfill_fills_missing_ids_and_keeps_existing_card_ids(engine):
+    matched = add_card(engine, "Freedom Unlimited")
+    hand_set = add_card(engine, "Mystery Card", card_id=99)
+    unknown = add_card(engine, "Mystery Card 2")
+
+    stats = backfill_ids.backfill_ids()
+    assert ids(engine, matched) == (1, 10)
+    assert ids(engine, hand_set) == (1, 99)
+    assert ids(engine, unknown) == (1, None)
+    assert (stats["matched"], stats["issuer_only"], stats["updated"]) == (1, 2, 3)
+
+
+def test_dry_run_writes_nothing(engine):
+    row_id = add_card(engine, "Freedom Unlimited")
+    assert backfill_ids.backfill_ids(dry_run=True)["updated"] == 1
+    assert ids(engine, row_id) == (None, None)
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.db import crud
+from app.db.models import Base, ExtractedCard
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(settings, "RESOLVE_CARD_IDS", False)
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    yield session
+    session.close()
+
+
+def record(**fields):
+    base = {
+        "issuer": "Capital One", "card_name": "Venture", "quarter": "Q1", "year": 2024,
+        "source_filename": "venture.pdf", "min_apr": "19.99%", "issuer_id": None, "card_id": None,
+    }
+    base.update(fields)
+    return base
+
+
+def stored(db):
+    db.expire_all()
+    return db.query(ExtractedCard).one()
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_reingest_keeps_ids_it_cannot_resolve(db, monkeypatch, bulk):
+    if not bulk:
+        monkeypatch.setattr(crud, "_bulk_upsert_statement", lambda db, records: None)
+    assert crud.upsert_cards(db, [record(issuer_id=2, card_id=21)]) == []
+
+    assert crud.upsert_cards(db, [record(min_apr="20.99%")]) == []
+    card = stored(db)
+    assert (card.issuer_id, card.card_id, card.min_apr) == (2, 21, "20.99%")
+
+    # A resolved ID still replaces the stored one
+    assert crud.upsert_cards(db, [record(issuer_id=2, card_id=22)]) == []
+    assert (stored(db).issuer_id, stored(db).card_id) == (2, 22)
@@ -0,0 +1,47 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.core import extractor
+
+
+def crash_once(marker):
+    # Runs in the pool: the first call kills its worker process like a MuPDF crash would
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "text", {}
+
+
+def always_crash(marker):
+    os._exit(1)
+
+
+@pytest.fixture
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(extractor.settings, "PDF_WORKERS", 1)
+    extractor._pdf_pool = None
+    yield
+    if extractor._pdf_pool is not None:
+        extractor._pdf_pool.shutdown()
+        extractor._pdf_pool = None
+
+
+def test_pool_is_rebuilt_after_worker_dies(fresh_pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(extractor, "prepare_document", crash_once)
+    marker = str(tmp_path / "crashed")
+    assert asyncio.run(extractor.extract_pdf_text(marker)) == ("text", {})
+    assert os.path.exists(marker)
+
+
+def test_file_that_keeps_crashing_fails_but_leaves_a_working_pool(fresh_pool, tmp_path, monkeypatch):
+    monkeypatch.setattr(extractor, "prepare_document", always_crash)
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(extractor.extract_pdf_text(str(tmp_path / "marker")))
+    assert extractor._pdf_pool is None
+
+    monkeypatch.setattr(extractor, "prepare_document", crash_once)
+    open(tmp_path / "marker", "w").close()
+    assert asyncio.run(extractor.extract_pdf_text(str(tmp_path / "marker"))) == ("text", {})
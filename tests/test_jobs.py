@@ -0,0 +1,99 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import jobs
+from app.core.config import settings
+from app.db.models import Base
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(jobs, "SessionLocal", sessionmaker(bind=engine))
+    yield
+    engine.dispose()
+
+
+def finished_job(upload_id, states, status=jobs.JOB_COMPLETED):
+    """A job that ran on worker "a" and left its files in ``states``"""
+    jobs.create_job(upload_id, "/tmp/x.zip", "Q1", 2024, owner="a")
+    jobs.register_files(upload_id, list(states))
+    for member, state in states.items():
+        jobs.set_file_state(upload_id, [member], state, "boom" if state == jobs.FILE_FAILED else None)
+    jobs.finish_job(upload_id, status, owner="a")
+
+
+def test_pending_job_is_claimed_once():
+    jobs.create_job("j1", "/tmp/x.zip", "Q1", 2024, owner=None)
+    assert jobs.get_job("j1")["status"] == jobs.JOB_PENDING
+    claimed = jobs.claim_jobs(limit=2, owner="a")
+    assert [job["upload_id"] for job in claimed] == ["j1"]
+    assert claimed[0]["owner"] == "a"
+    assert jobs.claim_jobs(owner="b") == []
+    assert jobs.claim_job("j1", owner="b") is None
+
+
+def test_stale_job_moves_to_another_worker(monkeypatch):
+    jobs.create_job("j1", "/tmp/x.zip", "Q1", 2024, owner="a")
+    assert jobs.claim_jobs(owner="b") == []
+    monkeypatch.setattr(settings, "JOB_STALE_SECONDS", -1)
+    assert jobs.claim_job("j1", owner="b")["owner"] == "b"
+    # The old owner notices on its next heartbeat and cannot finish the job
+    assert not jobs.heartbeat("j1", owner="a")
+    jobs.finish_job("j1", jobs.JOB_COMPLETED, owner="a")
+    assert jobs.get_job("j1")["status"] == jobs.JOB_RUNNING
+    assert jobs.heartbeat("j1", owner="b")
+
+
+def test_released_job_is_queued_again():
+    jobs.create_job("j1", "/tmp/x.zip", "Q1", 2024, owner="a")
+    jobs.release_job("j1", owner="a")
+    job = jobs.get_job("j1")
+    assert (job["status"], job["owner"]) == (jobs.JOB_PENDING, None)
+    assert jobs.active_upload_ids() == ["j1"]
+
+
+def test_register_files_keys_by_basename():
+    jobs.create_job("j1", "/tmp/x.zip", "Q1", 2024)
+    assert jobs.register_files("j1", ["a/card.pdf", "b/card.pdf", "other.pdf"]) == 2
+    assert jobs.register_files("j1", ["a/card.pdf", "new.pdf"]) == 1
+    assert jobs.file_states("j1") == {"a/card.pdf": "pending", "other.pdf": "pending", "new.pdf": "pending"}
+
+
+def test_retry_requeues_only_failed_files():
+    finished_job("j1", {"a.pdf": jobs.FILE_WRITTEN, "b.pdf": jobs.FILE_FAILED, "c.pdf": jobs.FILE_FAILED})
+    assert jobs.get_job("j1")["failed_files"] == [
+        {"filename": "b.pdf", "error": "boom"}, {"filename": "c.pdf", "error": "boom"},
+    ]
+    assert jobs.retry_failed("j1") == 2
+    job = jobs.get_job("j1")
+    assert (job["status"], job["owner"]) == (jobs.JOB_PENDING, None)
+    assert job["files"] == {jobs.FILE_WRITTEN: 1, jobs.FILE_PENDING: 2}
+    assert job["failed_files"] == []
+    assert jobs.claim_jobs(owner="b")[0]["upload_id"] == "j1"
+
+
+def test_retry_picks_up_unfinished_files_of_failed_job():
+    finished_job("j1", {"a.pdf": jobs.FILE_WRITTEN, "b.pdf": jobs.FILE_LLM}, status=jobs.JOB_FAILED)
+    assert jobs.retry_failed("j1") == 1
+    assert jobs.get_job("j1")["status"] == jobs.JOB_PENDING
+
+
+def test_retry_leaves_fully_written_job_alone():
+    finished_job("j1", {"a.pdf": jobs.FILE_WRITTEN, "b.pdf": jobs.FILE_WRITTEN})
+    assert jobs.retry_failed("j1") == 0
+    job = jobs.get_job("j1")
+    assert (job["status"], job["owner"]) == (jobs.JOB_COMPLETED, "a")
+    assert jobs.active_upload_ids() == []
+
+
+def test_retry_endpoint_refuses_fully_written_job():
+    finished_job("j1", {"a.pdf": jobs.FILE_WRITTEN})
+    response = TestClient(app).post("/jobs/j1/retry")
+    assert response.status_code == 409
+    assert jobs.get_job("j1")["status"] == jobs.JOB_COMPLETED
+    assert TestClient(app).post("/jobs/missing/retry").status_code == 404
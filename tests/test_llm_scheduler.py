@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.core.llm import LLMProvider, LLMScheduler
+
+MESSAGES = [{"role": "user", "content": "extract"}]
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://llm/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def server_error():
+    response = httpx.Response(503, request=httpx.Request("POST", "http://llm/v1/chat/completions"))
+    return openai.InternalServerError("unavailable", response=response, body=None)
+
+
+class FakeProvider(LLMProvider):
+    """Answers "ok", or raises the queued errors first, one per call"""
+
+    model = "fake"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def complete(self, messages, response_format=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def scheduler(provider, initial=2, maximum=4, retries=3, rpm=0, tpm=0, backoff=0.001):
+    llm = LLMScheduler(
+        provider, rpm=rpm, tpm=tpm, initial_concurrency=initial, max_concurrency=maximum, max_retries=retries,
+        timeout=5, backoff_base=backoff, backoff_max=backoff, completion_tokens=0,
+    )
+    llm.estimate_tokens = lambda messages: 100
+    return llm
+
+
+def complete_many(llm, count):
+    async def run():
+        return await asyncio.gather(*(llm.complete(MESSAGES) for _ in range(count)))
+    return asyncio.run(run())
+
+
+def test_concurrency_grows_by_one_per_window_of_successes():
+    llm = scheduler(FakeProvider(), initial=2, maximum=4)
+    complete_many(llm, 2)
+    assert llm.limit == 3
+    complete_many(llm, 3)
+    assert llm.limit == 4
+    complete_many(llm, 20)
+    assert llm.limit == 4
+
+
+def test_rate_limit_halves_concurrency_and_is_retried():
+    provider = FakeProvider([rate_limit_error(retry_after=0)])
+    llm = scheduler(provider, initial=4, maximum=4)
+    assert complete_many(llm, 1) == ["ok"]
+    assert llm.limit == 2
+    assert (llm.rate_limited, llm.retries, llm.failures) == (1, 1, 0)
+    assert provider.calls == 2
+
+
+def test_one_decrease_per_burst_of_rate_limits():
+    llm = scheduler(FakeProvider(), initial=8, maximum=8, backoff=60)
+
+    async def burst():
+        for _ in range(3):
+            await llm._acquire(100)
+        for _ in range(3):
+            await llm._release(100, ok=False, rate_limited=True, retry_after=0)
+    asyncio.run(burst())
+    assert llm.limit == 4
+    assert llm.rate_limited == 3
+
+
+def test_concurrency_never_drops_below_one():
+    llm = scheduler(FakeProvider(), initial=1, maximum=4, backoff=0)
+
+    async def limited():
+        await llm._acquire(100)
+        await llm._release(100, ok=False, rate_limited=True, retry_after=0)
+    asyncio.run(limited())
+    assert llm.limit == 1
+
+
+def test_transient_errors_give_up_after_max_retries():
+    provider = FakeProvider([server_error() for _ in range(5)])
+    llm = scheduler(provider, retries=2)
+    with pytest.raises(openai.InternalServerError):
+        complete_many(llm, 1)
+    assert provider.calls == 3
+    assert (llm.retries, llm.failures, llm.in_flight) == (2, 1, 0)
+
+
+def test_permanent_errors_are_not_retried():
+    provider = FakeProvider([ValueError("bad request")])
+    llm = scheduler(provider)
+    with pytest.raises(ValueError):
+        complete_many(llm, 1)
+    assert provider.calls == 1
+    assert llm.retries == 0
+
+
+def test_budgets_hold_requests_back():
+    llm = scheduler(FakeProvider(), initial=4, maximum=4, rpm=2)
+    llm._started.extend([(0.0, 100), (0.0, 100)])
+    assert llm._wait_time(100, 30.0) == pytest.approx(30.0)
+    assert llm._wait_time(100, 61.0) == 0
+
+    llm = scheduler(FakeProvider(), initial=4, maximum=4, tpm=250)
+    llm._started.extend([(0.0, 100), (10.0, 100)])
+    assert llm._wait_time(100, 20.0) == pytest.approx(40.0)
+    assert llm._wait_time(50, 20.0) == 0
+    # Alone, a request larger than the whole budget still runs
+    assert scheduler(FakeProvider(), tpm=250)._wait_time(1000, 0.0) == 0
+
+
+def test_full_window_waits_for_a_release():
+    llm = scheduler(FakeProvider(), initial=1, maximum=1)
+    llm.in_flight = 1
+    assert llm._wait_time(100, 0.0) is None
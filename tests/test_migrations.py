@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.db.migrations import _widen_to_text_ddl, migrate
+from app.db.models import ExtractedCard
+
+CASH_ADVANCE_APR = ExtractedCard.__table__.c.cash_advance_apr
+
+
+def engine_for(dialect):
+    return SimpleNamespace(dialect=dialect)
+
+
+def test_cash_advance_apr_is_widened_on_postgresql():
+    ddl = _widen_to_text_ddl(engine_for(postgresql.dialect()), "extracted_cards", CASH_ADVANCE_APR)
+    assert ddl == (
+        "ALTER TABLE extracted_cards ALTER COLUMN cash_advance_apr TYPE VARCHAR(50) "
+        "USING cash_advance_apr::VARCHAR(50)"
+    )
+
+
+def test_cash_advance_apr_is_widened_on_mysql():
+    ddl = _widen_to_text_ddl(engine_for(mysql.dialect()), "extracted_cards", CASH_ADVANCE_APR)
+    assert ddl == "ALTER TABLE extracted_cards MODIFY COLUMN cash_advance_apr VARCHAR(50) NULL"
+
+
+def test_sqlite_keeps_its_column_affinity():
+    assert _widen_to_text_ddl(engine_for(sqlite.dialect()), "extracted_cards", CASH_ADVANCE_APR) is None
+
+
+def test_migrate_brings_an_old_table_up_to_date():
+    engine = create_engine("sqlite://")
+    old = MetaData()
+    Table(
+        "extracted_cards", old,
+        Column("id", Integer, primary_key=True),
+        *(Column(name, String(255)) for name in ("issuer", "card_name", "quarter", "source_filename")),
+        Column("year", Integer),
+        Column("cash_advance_apr", Integer),
+    )
+    old.create_all(engine)
+
+    changes = migrate(engine)
+    assert "add column extracted_cards.purchase_apr_min" in changes
+    assert "create unique index uq_extracted_cards_identity" in changes
+    columns = {c["name"] for c in inspect(engine).get_columns("extracted_cards")}
+    assert set(ExtractedCard.__table__.columns.keys()) <= columns
+    assert migrate(engine) == []
@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.core.name_index import NameIndex, normalize_name
+from app.db.external_models import Card, ExternalBase, Issuer
+
+ISSUERS = {1: "JPMorgan Chase Bank, N.A.", 2: "Capital One", 3: "U.S. Bank", 4: "Citibank"}
+CARDS = {
+    10: (1, "Chase Freedom Unlimited"), 11: (1, "Chase Sapphire Preferred"), 12: (1, "Chase Sapphire Reserve"),
+    20: (2, "Quicksilver Rewards"), 21: (2, "Venture Rewards"), 22: (2, "Platinum"),
+    30: (3, "Altitude Go Visa Signature"), 31: (3, "Cash+ Visa Signature"),
+    40: (4, "Double Cash"), 41: (4, "Premier"),
+}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    ExternalBase.metadata.create_all(engine)
+    session = Session(engine)
+    session.execute(insert(Issuer), [{"issuer_id": i, "name": n} for i, n in ISSUERS.items()])
+    session.execute(insert(Card), [{"card_id": c, "name": n, "issuer_id": i} for c, (i, n) in CARDS.items()])
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def index(db):
+    index = NameIndex()
+    index.refresh(db, force=True)
+    return index
+
+
+def test_normalize_name():
+    assert normalize_name("Capital One®, N.A.") == "capital one na"
+    assert normalize_name("Barclays Bank Delaware & Co.") == "barclays bank delaware and co"
+    assert normalize_name(None) == ""
+
+
+@pytest.mark.parametrize("issuer, card, expected", [
+    ("JPMorgan Chase Bank, N.A.", "Chase Freedom Unlimited", (1, 10)),
+    ("Chase", "Freedom Unlimited®", (1, 10)),
+    ("CHASE BANK USA", "Chase Sapphire Preferred® Credit Card", (1, 11)),
+    ("Capital One, N.A.", "Capital One Venture Rewards Credit Card", (2, 21)),
+    ("U.S. Bank National Association", "U.S. Bank Altitude® Go Visa Signature® Card", (3, 30)),
+    ("Citibank, N.A.", "Citi Premier Card", (4, 41)),
+    ("Chase", "Sapphire Prefered", (1, 11)),
+    ("Capitol One", "Quicksilver Rewards", (2, 20)),
+])
+def test_resolves_names_as_extraction_returns_them(index, issuer, card, expected):
+    assert index.resolve(issuer, card) == expected
+
+
+def test_gold_classic_prefers_the_closest_card(index, db):
+    db.execute(insert(Card), [{"card_id": 50, "name": "Gold", "issuer_id": 4},
+                              {"card_id": 51, "name": "Gold Classic", "issuer_id": 4}])
+    db.commit()
+    index.refresh(db, force=True)
+    assert index.resolve("Citibank", "Gold Classic") == (4, 51)
+    assert index.resolve("Citibank", "Gold") == (4, 50)
+
+
+def test_unknown_card_keeps_the_issuer(index):
+    assert index.resolve("Capital One", "Spark Cash Plus") == (2, None)
+
+
+def test_unknown_or_undisclosed_issuer_resolves_to_nothing(index):
+    assert index.resolve("Bank of Nowhere", "Platinum") == (None, None)
+    assert index.resolve("Not disclosed", "Platinum") == (None, None)
+    assert index.resolve("", "Platinum") == (None, None)
+
+
+def test_refresh_picks_up_new_rows(index, db, monkeypatch):
+    monkeypatch.setattr(settings, "NAME_INDEX_REFRESH_SECONDS", 0.0)
+    assert index.resolve("Discover Bank", "Discover it Cash Back") == (None, None)
+    db.execute(insert(Issuer), [{"issuer_id": 5, "name": "Discover Bank"}])
+    db.execute(insert(Card), [{"card_id": 60, "name": "Discover it Cash Back", "issuer_id": 5}])
+    db.commit()
+    index.refresh(db)
+    assert index.resolve("Discover Bank", "Discover it Cash Back") == (5, 60)
+
+
+def test_resolve_records_sets_ids_in_place(index, db):
+    records = [{"issuer": "Chase", "card_name": "Sapphire Reserve"}, {"issuer": "Nobody", "card_name": "X"}]
+    index.resolve_records(db, records)
+    assert (records[0]["issuer_id"], records[0]["card_id"]) == (1, 12)
+    assert (records[1]["issuer_id"], records[1]["card_id"]) == (None, None)
+
+
+def test_resolve_records_keeps_ids_it_cannot_match(index, db):
+    records = [{"issuer": "Chase", "card_name": "Unknown Card", "issuer_id": 1, "card_id": 99}]
+    index.resolve_records(db, records)
+    assert (records[0]["issuer_id"], records[0]["card_id"]) == (1, 99)
+
+
+def test_missing_tables_leave_records_untouched():
+    engine = create_engine("sqlite://")
+    index = NameIndex()
+    records = [{"issuer": "Chase", "card_name": "Sapphire Reserve", "issuer_id": 7, "card_id": 8}]
+    with Session(engine) as db:
+        index.resolve_records(db, records)
+    assert not index.available
+    assert (records[0]["issuer_id"], records[0]["card_id"]) == (7, 8)
@@ -0,0 +1,58 @@
+import math
+
+import pandas as pd
+import pytest
+
+from app.core.normalize import _parse_texts, normalize_records
+
+
+def parse(text, unit):
+    row = _parse_texts(pd.Series([text]), unit).iloc[0]
+    return tuple(None if math.isnan(v) else v for v in (row["min"], row["max"], row["intro"]))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$95", (95.0, 95.0, None)),
+    ("$1,000", (1000.0, 1000.0, None)),
+    ("$0 intro annual fee, $95 after that", (95.0, 95.0, 0.0)),
+    ("$95 (waived the first year)", (95.0, 95.0, 0.0)),
+    ("Annual fee waived for first year, then $95", (95.0, 95.0, 0.0)),
+    ("None", (0.0, 0.0, None)),
+    ("No annual fee", (0.0, 0.0, None)),
+    ("Not disclosed", (None, None, None)),
+    ("", (None, None, None)),
+])
+def test_dollar_amounts(text, expected):
+    assert parse(text, "$") == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("19.99%–29.99% variable", (19.99, 29.99, None)),
+    ("0% intro APR for 15 months, then 19.99%", (19.99, 19.99, 0.0)),
+    ("19.99% after the intro period", (19.99, 19.99, None)),
+    ("Prime + 14.74%", (None, None, None)),
+    ("Prime Rate plus 14.74%", (None, None, None)),
+    ("14.74% above the U.S. Prime Rate", (None, None, None)),
+    ("Prime + 14.74% (currently 22.24%)", (22.24, 22.24, None)),
+    ("3% of each transfer, waived for the first 60 days", (3.0, 3.0, 0.0)),
+    ("5% (min $10)", (5.0, 5.0, None)),
+    ("0%", (0.0, 0.0, None)),
+])
+def test_percentages(text, expected):
+    assert parse(text, "%") == expected
+
+
+def test_normalize_records_sets_columns_in_place():
+    records = [
+        {"annual_fee": "$95 (waived the first year)", "min_apr": "Prime + 14.74%", "max_apr": "Not disclosed"},
+        {"annual_fee": "$0", "min_apr": "18.24%", "max_apr": "29.24%", "late_fee": "Up to $40"},
+    ]
+    normalize_records(records)
+    assert records[0]["annual_fee_usd"] == 95.0
+    assert records[0]["annual_fee_intro_usd"] == 0.0
+    assert records[0]["purchase_apr_min"] is None
+    assert records[0]["purchase_apr_max"] is None
+    assert records[1]["annual_fee_usd"] == 0.0
+    assert (records[1]["purchase_apr_min"], records[1]["purchase_apr_max"]) == (18.24, 29.24)
+    assert records[1]["late_fee_usd"] == 40.0
+    assert records[1]["cash_advance_apr_min"] is None
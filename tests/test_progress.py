@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.core import progress
+from app.db.models import Base
+
+
+@pytest.fixture
+def db_store(tmp_path, monkeypatch):
+    # A file database so every thread sees the same rows
+    engine = create_engine(f"sqlite:///{tmp_path / 'progress.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(progress, "SessionLocal", sessionmaker(bind=engine))
+    yield progress.DatabaseProgressStore()
+    engine.dispose()
+
+
+@pytest.fixture(params=["memory", "db"])
+def store(request):
+    if request.param == "memory":
+        return progress.MemoryProgressStore()
+    return request.getfixturevalue("db_store")
+
+
+def test_every_write_bumps_seq(store):
+    store.create("job", {"status": "processing", "progress": 0})
+    assert store.get("job")["seq"] == 1
+    state = store.update("job", {"progress": 50})
+    assert state["seq"] == 2
+    assert store.get("job") == {"status": "processing", "progress": 50, "seq": 2}
+
+
+def test_update_of_unknown_job_returns_none(store):
+    assert store.update("missing", {"progress": 1}) is None
+    assert store.get("missing") is None
+
+
+def test_concurrent_updates_are_not_lost(store):
+    store.create("job", {"status": "processing"})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: store.update("job", {f"k{i}": i}), range(200)))
+    state = store.get("job")
+    assert state["seq"] == 201
+    assert all(state[f"k{i}"] == i for i in range(200))
+
+
+def test_late_write_does_not_reopen_finished_job(store):
+    store.create("job", {"status": "processing", "progress": 90})
+    store.update("job", {"status": "completed", "progress": 100})
+    state = store.update("job", {"status": "processing", "progress": 95})
+    assert state["status"] == "completed"
+    assert store.get("job") == {"status": "completed", "progress": 100, "seq": 2}
+    # A terminal write still lands, and a retry starts over through create()
+    assert store.update("job", {"status": "failed"})["seq"] == 3
+    store.create("job", {"status": "queued"})
+    assert store.get("job") == {"status": "queued", "seq": 1}
+
+
+def test_database_store_pushes_only_where_it_can_listen(db_store, monkeypatch):
+    # SQLite has no LISTEN/NOTIFY; other workers' jobs are polled
+    assert not db_store.pushes_across_workers
+
+    class Dialect:
+        name, driver = "postgresql", "psycopg"
+
+    class Notification:
+        def __init__(self, payload):
+            self.payload = payload
+
+    class DBAPIConnection:
+        autocommit = False
+        executed = []
+
+        def cursor(self):
+            return self
+
+        def execute(self, sql):
+            self.executed.append(sql)
+
+        def notifies(self):
+            yield Notification("job-1")
+            yield Notification("job-2")
+
+    class Connection:
+        dbapi_connection = DBAPIConnection()
+
+        def detach(self):
+            pass
+
+        def close(self):
+            pass
+
+    class Engine:
+        dialect = Dialect()
+
+        def raw_connection(self):
+            return Connection()
+
+    monkeypatch.setattr(progress, "SessionLocal", sessionmaker(bind=Engine()))
+    store = progress.DatabaseProgressStore()
+    assert store.pushes_across_workers
+    published = []
+    monkeypatch.setattr(store.notifier, "publish", published.append)
+    store._listen()
+    listening = Connection.dbapi_connection
+    assert listening.autocommit and listening.executed == ["LISTEN finprintiq_progress"]
+    assert published == ["job-1", "job-2"]
+
+
+@pytest.fixture
+def served_store(monkeypatch):
+    """The store behind /progress"""
+    store = progress.MemoryProgressStore()
+    monkeypatch.setattr(main, "progress_store", store)
+    return store
+
+
+@pytest.fixture
+def client(served_store):
+    return TestClient(main.app)
+
+
+def events(body: str):
+    """(id, state) of each data event in an SSE body"""
+    found = []
+    for block in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "data" in lines:
+            found.append((int(lines["id"]), json.loads(lines["data"])))
+    return found
+
+
+def test_stream_sends_the_state_with_its_seq_as_event_id(client, served_store):
+    store = served_store
+    store.create("job", {"status": "processing", "progress": 50})
+    store.update("job", {"status": "completed", "progress": 100})
+    response = client.get("/progress/job")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert events(response.text) == [(2, {"status": "completed", "progress": 100, "seq": 2})]
+
+
+def test_stream_resumes_after_last_event_id(client, served_store):
+    served_store.create("job", {"status": "completed"})
+    # The client already has the final event: nothing is repeated
+    assert events(client.get("/progress/job", headers={"Last-Event-ID": "1"}).text) == []
+    assert events(client.get("/progress/job", headers={"Last-Event-ID": "0"}).text)[0][0] == 1
+    assert events(client.get("/progress/job", headers={"Last-Event-ID": "junk"}).text)[0][0] == 1
+
+
+def test_stream_follows_a_running_job_until_it_finishes(client, served_store):
+    store = served_store
+    store.create("job", {"status": "processing", "progress": 0})
+
+    def finish_later():
+        time.sleep(0.2)
+        store.update("job", {"progress": 50})
+        store.update("job", {"status": "completed", "progress": 100})
+
+    threading.Thread(target=finish_later).start()
+    started = time.monotonic()
+    found = events(client.get("/progress/job").text)
+    assert found[0][0] == 1 and found[-1] == (3, {"status": "completed", "progress": 100, "seq": 3})
+    assert [seq for seq, _ in found] == sorted(set(seq for seq, _ in found))
+    # Woken by the notifier, not by the poll or heartbeat timeout
+    assert time.monotonic() - started < 1.5
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/progress/missing").status_code == 404
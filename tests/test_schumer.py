@@ -0,0 +1,50 @@
+import fitz
+import pytest
+
+from app.core.schumer import parse_schumer_box, parse_value
+from app.scripts.bench_schumer import LAYOUTS, box_rows, draw_box, expected_fields
+
+TERMS = {
+    "intro": True, "low": 19.24, "high": 29.24, "penalty": 29.99, "cash_apr": 30.24, "annual_fee": 95,
+    "late_fee": 40, "fx": 3, "ca_pct": 5, "ca_min": 10, "bt_pct": 3, "bt_min": 5, "min_interest": 0.5,
+}
+
+
+@pytest.mark.parametrize("kind, text, expected", [
+    ("percent_range", "19.24% to 29.24%, based on your creditworthiness.", ["19.24%", "29.24%"]),
+    ("percent_range", "0% intro APR for 15 months, then 19.24% to 29.24%.", ["19.24%", "29.24%"]),
+    ("percent_range", "20.49%. This APR will vary with the market.", ["20.49%", "20.49%"]),
+    ("percent", "Up to 29.99%. This APR may be applied if you make a late payment.", "29.99%"),
+    ("dollar", "$95", "$95"),
+    ("dollar", "$0 intro annual fee for the first year, then $95.", "$95"),
+    ("dollar", "Up to $40.", "$40"),
+    ("dollar", "None", "None"),
+    ("dollar", "No less than $0.50.", "$0.5"),
+    ("fee", "Either $10 or 5% of the amount of each cash advance, whichever is greater.", "5% (min $10)"),
+    ("fee", "3% of each transaction in U.S. dollars.", "3%"),
+    ("fee", "None", "None"),
+    ("fee", "See your statement", None),
+    ("percent", "", None),
+])
+def test_parse_value(kind, text, expected):
+    assert parse_value(kind, text) == expected
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_parse_schumer_box(layout):
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 60), "Cardmember Agreement. Please read carefully.")
+    draw_box(doc.new_page(), box_rows(TERMS), layout)
+    try:
+        assert parse_schumer_box(doc) == expected_fields(TERMS)
+    finally:
+        doc.close()
+
+
+def test_pages_without_a_box_yield_nothing():
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 60), "Late Payment fees and the Annual Fee are described elsewhere. $40")
+    try:
+        assert parse_schumer_box(doc) == {}
+    finally:
+        doc.close()
@@ -0,0 +1,85 @@
+import math
+
+import pandas as pd
+import pytest
+
+from app.core.scoring import SCORE_COMPONENTS, base_scores, compute_scores
+
+
+def frame(rows):
+    """Cards with the given purchase_apr_min and nothing else disclosed; 22.5% scores 50, 17.5% scores 70"""
+    records = []
+    for i, (issuer, card_name, quarter, year, apr) in enumerate(rows, start=1):
+        record = {column: None for column in SCORE_COMPONENTS}
+        record.update(id=i, issuer=issuer, card_name=card_name, quarter=quarter, year=year, purchase_apr_min=apr)
+        records.append(record)
+    return pd.DataFrame(records)
+
+
+def test_base_score_is_the_weighted_mean_of_disclosed_columns():
+    cards = pd.DataFrame([
+        {**{c: None for c in SCORE_COMPONENTS}, "purchase_apr_min": 10.0, "annual_fee_usd": 550.0},
+        {**{c: None for c in SCORE_COMPONENTS}, "annual_fee_usd": 0.0, "foreign_txn_fee_pct": 6.0},
+        {c: None for c in SCORE_COMPONENTS},
+    ])
+    scores = base_scores(cards)
+    assert scores[0] == round((25 * 100 + 20 * 0) / 45)
+    assert scores[1] == round((20 * 100 + 10 * 0) / 30)  # out-of-range values clip to 0
+    assert math.isnan(scores[2])
+
+
+def test_first_quarter_has_no_trend_or_volatility():
+    scores = compute_scores(frame([("A Bank", "Gold", "Q1", 2024, 22.5)]))
+    row = scores.iloc[0]
+    assert (row["base_score"], row["trend_bonus"], row["volatility_score"], row["final_score"]) == (50, 0, 0, 50)
+    assert row["grade"] == "C"
+
+
+def test_improvement_earns_a_capped_trend_bonus_minus_volatility():
+    scores = compute_scores(frame([
+        ("A Bank", "Gold", "Q1", 2024, 22.5),
+        ("A Bank", "Gold", "Q2", 2024, 17.5),
+    ]))
+    latest = scores.iloc[1]
+    assert latest["base_score"] == 70
+    assert latest["trend_bonus"] == 10  # half of the 20-point gain
+    assert latest["volatility_score"] == 10  # std dev of 50 and 70
+    assert latest["volatility_penalty"] == 5
+    assert latest["final_score"] == 75
+    assert latest["grade"] == "B"
+
+
+def test_skipped_quarters_and_other_cards_are_handled_apart():
+    scores = compute_scores(frame([
+        ("A Bank", "Gold", "Q1", 2024, 17.5),
+        ("A Bank", "Gold", "Q4", 2024, 22.5),      # three quarters later, still within the window
+        ("B Bank", "Gold", "Q4", 2024, 17.5),      # another issuer's card has no history
+        ("A Bank", "Gold", "Q4", 2025, 22.5),      # four quarters after Q4 2024, Q1 2024 is out of the window
+    ]))
+    assert scores.iloc[1]["trend_bonus"] == -10
+    assert scores.iloc[2]["trend_bonus"] == 0
+    assert scores.iloc[3]["trend_bonus"] == 0
+
+
+def test_latest_extraction_of_a_quarter_is_the_history():
+    scores = compute_scores(frame([
+        ("A Bank", "Gold", "Q1", 2024, 35.0),
+        ("A Bank", "Gold", "Q1", 2024, 22.5),      # re-extraction of the same quarter replaces the first
+        ("A Bank", "Gold", "Q2", 2024, 22.5),
+    ]))
+    assert scores.iloc[2]["trend_bonus"] == 0
+
+
+@pytest.mark.parametrize("card_name", ["Not disclosed", None])
+def test_cards_without_a_name_get_no_history(card_name):
+    scores = compute_scores(frame([
+        ("A Bank", card_name, "Q1", 2024, 22.5),
+        ("A Bank", card_name, "Q2", 2024, 17.5),
+    ]))
+    assert scores.iloc[1]["trend_bonus"] == 0
+    assert scores.iloc[1]["final_score"] == 70
+
+
+def test_rows_without_numbers_get_no_score():
+    scores = compute_scores(frame([("A Bank", "Gold", "Q1", 2024, None)]))
+    assert scores.iloc[0][["base_score", "final_score", "grade"]].isna().all()
@@ -0,0 +1,78 @@
+import pytest
+
+from app.core.structured import field_schema, load_json, parse_fields, validate_fields
+
+FIELDS = ["Issuer", "Card Name", "Annual Fee"]
+
+
+def test_clean_json_needs_no_repair():
+    data, failed, repairs = parse_fields('{"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$95"}', FIELDS)
+    assert data == {"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$95"}
+    assert failed == []
+    assert repairs == 0
+
+
+@pytest.mark.parametrize("content", [
+    '```json\n{"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$95"}\n```',
+    'Here you go: {"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$95"} Hope this helps.',
+    '{"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$95",}',
+    '{“Issuer”: “A Bank”, “Card Name”: “Gold”, “Annual Fee”: “$95”}',
+])
+def test_common_slips_are_repaired(content):
+    data, failed, repairs = parse_fields(content, FIELDS)
+    assert data == {"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$95"}
+    assert failed == []
+    assert repairs > 0
+
+
+def test_truncated_answer_keeps_complete_pairs_only():
+    data, failed, repairs = parse_fields('{"Issuer": "A Bank", "Card Name": "Gold", "Annual Fee": "$9', FIELDS)
+    assert data == {"Issuer": "A Bank", "Card Name": "Gold"}
+    assert failed == ["Annual Fee"]
+    assert repairs > 0
+
+
+def test_nulls_and_numbers_are_repaired_locally():
+    data, failed, _ = parse_fields('{"Issuer": "A Bank", "Card Name": null, "Annual Fee": 95}', FIELDS)
+    assert data == {"Issuer": "A Bank", "Card Name": "Not disclosed", "Annual Fee": "95"}
+    assert failed == []
+
+
+def test_missing_and_malformed_fields_fail():
+    data, failed = validate_fields({"Issuer": "A Bank", "Card Name": [1, 2]}, FIELDS)
+    assert data == {"Issuer": "A Bank"}
+    assert failed == ["Card Name", "Annual Fee"]
+    assert validate_fields(["not", "an", "object"], FIELDS) == ({}, FIELDS)
+
+
+def test_lists_and_objects_are_kept_for_clean_field():
+    data, failed = validate_fields({"Issuer": "A", "Card Name": ["Gold", "Platinum"], "Annual Fee": {"Gold": "$95"}}, FIELDS)
+    assert data["Card Name"] == ["Gold", "Platinum"]
+    assert data["Annual Fee"] == {"Gold": "$95"}
+    assert failed == []
+
+
+def test_answer_without_json_is_a_failure_not_a_repair():
+    data, failed, repairs = parse_fields("Sorry, I cannot read this document.", FIELDS)
+    assert data == {}
+    assert failed == FIELDS
+    assert repairs == 0
+
+
+def test_salvaged_pairs_count_as_a_repair():
+    data, failed, repairs = parse_fields('{"Issuer": "A Bank", "Card Name": "Gold" "Annual Fee": }}}', FIELDS)
+    assert data == {"Issuer": "A Bank", "Card Name": "Gold"}
+    assert failed == ["Annual Fee"]
+    assert repairs == 1
+
+
+def test_load_json_raises_when_nothing_parses():
+    with pytest.raises(ValueError):
+        load_json("no json here")
+
+
+def test_field_schema_requires_every_field():
+    schema = field_schema(FIELDS, {"Issuer": "Bank name"})
+    assert schema["required"] == FIELDS
+    assert schema["additionalProperties"] is False
+    assert schema["properties"]["Issuer"] == {"type": "string", "description": "Bank name"}
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.core import jobs
+from app.core.config import settings
+from app.core.progress import MemoryProgressStore
+from app.db.models import Base
+
+FORM = {"quarter": "Q1", "year": "2024"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(jobs, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(main, "progress_store", MemoryProgressStore())
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 1000)
+    # Only queue the job, so nothing starts extracting
+    monkeypatch.setattr(settings, "INGEST_IN_WEB", False)
+    yield TestClient(main.app)
+    engine.dispose()
+
+
+def chunked_form(payload: bytes, boundary="b0undary"):
+    """A multipart body sent without Content-Length, in small chunks"""
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="quarter"\r\n\r\nQ1\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="year"\r\n\r\n2024\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="zip_file"; filename="cards.zip"\r\n'
+        "Content-Type: application/zip\r\n\r\n"
+    ).encode()
+    body = head + payload + f"\r\n--{boundary}--\r\n".encode()
+    headers = {"content-type": f"multipart/form-data; boundary={boundary}"}
+    return headers, (body[i:i + 100] for i in range(0, len(body), 100))
+
+
+def upload_dirs():
+    return os.listdir(settings.UPLOAD_DIR) if os.path.isdir(settings.UPLOAD_DIR) else []
+
+
+def test_archive_is_written_to_the_job_directory(client):
+    payload = os.urandom(1000)
+    response = client.post("/upload", data=FORM, files={"zip_file": ("cards.zip", payload)})
+    assert response.status_code == 200
+    upload_id = response.json()["upload_id"]
+    with open(os.path.join(settings.UPLOAD_DIR, upload_id, "cards.zip"), "rb") as f:
+        assert f.read() == payload
+    job = jobs.get_job(upload_id)
+    assert (job["quarter"], job["year"], job["status"]) == ("Q1", 2024, jobs.JOB_PENDING)
+    assert main.progress_store.get(upload_id)["status"] == "queued"
+
+
+def test_streamed_body_without_content_length(client):
+    payload = os.urandom(900)
+    headers, chunks = chunked_form(payload)
+    response = client.post("/upload", headers=headers, content=chunks)
+    assert response.status_code == 200
+    with open(os.path.join(settings.UPLOAD_DIR, response.json()["upload_id"], "cards.zip"), "rb") as f:
+        assert f.read() == payload
+
+
+def test_declared_oversized_body_is_refused_before_reading(client):
+    response = client.post("/upload", data=FORM, files={"zip_file": ("cards.zip", b"x" * 100_000)})
+    assert response.status_code == 413
+    assert main.progress_store._jobs == {}
+    assert upload_dirs() == []
+
+
+def test_archive_over_the_limit_is_cut_off_while_streaming(client):
+    headers, chunks = chunked_form(b"x" * 1001)
+    response = client.post("/upload", headers=headers, content=chunks)
+    assert response.status_code == 413
+    assert upload_dirs() == []
+    [state] = main.progress_store._jobs.values()
+    assert state["status"] == "failed"
+
+
+@pytest.mark.parametrize("data, files", [
+    ({"quarter": "Q1"}, {"zip_file": ("cards.zip", b"x")}),
+    ({"quarter": "Q1", "year": "soon"}, {"zip_file": ("cards.zip", b"x")}),
+    (FORM, {"other": ("cards.zip", b"x")}),
+])
+def test_incomplete_form_is_rejected(client, data, files):
+    response = client.post("/upload", data=data, files=files)
+    assert response.status_code == 400
+    assert upload_dirs() == []